@@ -0,0 +1,94 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmarks inset against a MappedSortedSet of md5 hashes.
+
+  PYTHONPATH=. python benchmarks/operands_benchmark.py --entries 10000000
+
+Reports the time to build the set file, its size, and lookups per second for
+hits and misses, through both the set and a compiled "md5 inset :iocs" filter.
+With --compare the same lookups are run against a frozenset, which shows the
+per-process memory the mapped set avoids.
+"""
+
+import argparse
+import hashlib
+import os
+import resource
+import shutil
+import tempfile
+import timeit
+
+from objectfilter import objectfilter
+from objectfilter import operands
+
+
+def _Hashes(start, count):
+  for i in xrange(start, start + count):
+    yield hashlib.md5(str(i)).hexdigest()
+
+
+def _Rate(function, values):
+  start = timeit.default_timer()
+  for value in values:
+    function(value)
+  return len(values) / (timeit.default_timer() - start)
+
+
+def _MaxRSSMegabytes():
+  return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--entries", type=int, default=10000000)
+  parser.add_argument("--lookups", type=int, default=100000)
+  parser.add_argument("--compare", action="store_true",
+                      help="Also benchmark a frozenset of the same values.")
+  args = parser.parse_args()
+
+  temp_dir = tempfile.mkdtemp()
+  try:
+    path = os.path.join(temp_dir, "md5.set")
+    start = timeit.default_timer()
+    operands.BuildMappedSet(path, _Hashes(0, args.entries))
+    print "Built %d entries in %.1fs, %.1f MB on disk." % (
+        args.entries, timeit.default_timer() - start,
+        os.path.getsize(path) / 1024.0 / 1024.0)
+
+    iocs = operands.MappedSortedSet(path)
+    hits = list(_Hashes(args.entries // 2, args.lookups))
+    misses = list(_Hashes(args.entries, args.lookups))
+    print "MappedSortedSet: %.0f hits/s, %.0f misses/s" % (
+        _Rate(iocs.__contains__, hits), _Rate(iocs.__contains__, misses))
+
+    compiled = objectfilter.Parser("md5 inset :iocs").Parse().Compile(
+        objectfilter.DictFilterImplementation, {"iocs": iocs})
+    records = [{"md5": value} for value in hits + misses]
+    print "Compiled filter: %.0f records/s" % _Rate(compiled.Matches, records)
+    print "Max RSS: %.1f MB" % _MaxRSSMegabytes()
+
+    if args.compare:
+      before = _MaxRSSMegabytes()
+      values = frozenset(_Hashes(0, args.entries))
+      print "frozenset: %.0f hits/s, %.0f misses/s, +%.1f MB RSS" % (
+          _Rate(values.__contains__, hits),
+          _Rate(values.__contains__, misses), _MaxRSSMegabytes() - before)
+  finally:
+    shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,334 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Aggregation of the objects matching a filter, in a single pass.
+
+  results = Aggregate(compiled_filter, objects,
+                      ["count", "sum(size)", "approx_distinct(user)"],
+                      group_by=["host"])
+  => {("web1",): {"count": 10, "sum(size)": 4096,
+                  "approx_distinct(user)": 3}, ...}
+
+Objects are filtered and aggregated as they are read. Paths read by the filter
+are not expanded again for aggregation, see the expansions module.
+
+Aggregates are written as function(path). The functions are:
+  count: The number of matching objects, or of values of path if given.
+  sum, min, max: Over every value of path. sum ignores non-numeric values.
+  distinct: The number of distinct values of path.
+  approx_distinct: An estimate of distinct, with a HyperLogLog sketch of
+    fixed size for paths with many values.
+
+Groups are keyed by a tuple with a value for each group_by path: its value,
+a tuple of its values if it has several, or None if it has none. Memory is
+bounded by max_groups. Objects of further groups are aggregated under OTHER.
+"""
+
+import math
+import re
+
+import expansions
+import objectfilter
+
+
+class Error(objectfilter.Error):
+  """Base module exception."""
+
+
+class InvalidAggregateError(Error):
+  """An aggregate is malformed or uses an unknown function."""
+
+
+class _Other(object):
+  def __repr__(self):
+    return "OTHER"
+
+
+# The key of the group holding objects beyond max_groups.
+OTHER = _Other()
+
+
+def _IsNumber(value):
+  return isinstance(value, (int, long, float)) and not isinstance(value, bool)
+
+
+def _Hashable(value):
+  """Returns value, or its repr if it can't be used as a dict key."""
+  try:
+    hash(value)
+    return value
+  except TypeError:
+    return repr(value)
+
+
+class Aggregator(object):
+  """Accumulates the values of a path for one group."""
+
+  # Whether the aggregator needs the values of a path.
+  needs_path = True
+
+  def Add(self, values):
+    """Adds the values expanded for a matching object."""
+    raise NotImplementedError
+
+  def Result(self):
+    raise NotImplementedError
+
+
+class Count(Aggregator):
+  needs_path = False
+
+  def __init__(self):
+    self.count = 0
+
+  def Add(self, values):
+    self.count += 1 if values is None else len(values)
+
+  def Result(self):
+    return self.count
+
+
+class Sum(Aggregator):
+  def __init__(self):
+    self.total = 0
+
+  def Add(self, values):
+    for value in values:
+      if _IsNumber(value):
+        self.total += value
+
+  def Result(self):
+    return self.total
+
+
+class Min(Aggregator):
+  def __init__(self):
+    self.result = None
+
+  def Add(self, values):
+    for value in values:
+      if self.result is None or value < self.result:
+        self.result = value
+
+  def Result(self):
+    return self.result
+
+
+class Max(Aggregator):
+  def __init__(self):
+    self.result = None
+
+  def Add(self, values):
+    for value in values:
+      if self.result is None or value > self.result:
+        self.result = value
+
+  def Result(self):
+    return self.result
+
+
+class Distinct(Aggregator):
+  def __init__(self):
+    self.values = set()
+
+  def Add(self, values):
+    for value in values:
+      self.values.add(_Hashable(value))
+
+  def Result(self):
+    return len(self.values)
+
+
+_MASK64 = (1 << 64) - 1
+
+
+def _Mix64(value):
+  """Spreads the bits of hash(value) over 64 bits."""
+  h = hash(_Hashable(value)) & _MASK64
+  h ^= h >> 33
+  h = (h * 0xff51afd7ed558ccd) & _MASK64
+  h ^= h >> 33
+  h = (h * 0xc4ceb9fe1a85ec53) & _MASK64
+  h ^= h >> 33
+  return h
+
+
+class HyperLogLog(object):
+  """Estimates the number of distinct values in 2**precision bytes."""
+
+  def __init__(self, precision=12):
+    if not 4 <= precision <= 16:
+      raise ValueError("precision must be between 4 and 16.")
+    self.precision = precision
+    self.size = 1 << precision
+    self.registers = bytearray(self.size)
+
+  def Add(self, value):
+    h = _Mix64(value)
+    index = h >> (64 - self.precision)
+    rest = (h << self.precision) & _MASK64
+    rank = 1
+    while rank <= 64 - self.precision and not rest & (1 << 63):
+      rank += 1
+      rest <<= 1
+    if rank > self.registers[index]:
+      self.registers[index] = rank
+
+  def Estimate(self):
+    size = self.size
+    alpha = 0.7213 / (1 + 1.079 / size)
+    estimate = alpha * size * size / sum(2.0 ** -register
+                                         for register in self.registers)
+    zeros = sum(1 for register in self.registers if not register)
+    if estimate <= 2.5 * size and zeros:
+      estimate = size * math.log(float(size) / zeros)
+    return int(round(estimate))
+
+
+class ApproxDistinct(Aggregator):
+  def __init__(self):
+    self.sketch = HyperLogLog()
+
+  def Add(self, values):
+    for value in values:
+      self.sketch.Add(value)
+
+  def Result(self):
+    return self.sketch.Estimate()
+
+
+AGGREGATORS = {"count": Count,
+               "sum": Sum,
+               "min": Min,
+               "max": Max,
+               "distinct": Distinct,
+               "approx_distinct": ApproxDistinct,
+              }
+
+_AGGREGATE_RE = re.compile(r"^\s*(\w+)\s*(?:\(\s*([\w.]*)\s*\))?\s*$")
+
+
+def ParseAggregate(aggregate):
+  """Returns the (aggregator class, path) of an aggregate like "sum(size)".
+
+  Raises:
+    InvalidAggregateError: If the aggregate is malformed.
+  """
+  match = _AGGREGATE_RE.match(aggregate)
+  if not match or match.group(1).lower() not in AGGREGATORS:
+    raise InvalidAggregateError("Invalid aggregate %r." % aggregate)
+  aggregator_cls = AGGREGATORS[match.group(1).lower()]
+  path = match.group(2) or None
+  if path is None and aggregator_cls.needs_path:
+    raise InvalidAggregateError("%s needs a path." % aggregate)
+  return aggregator_cls, path
+
+
+class Aggregation(object):
+  """Filters objects and aggregates the matching ones as they are added.
+
+  Attributes:
+    filter: The copy of the filter sharing its expansions.
+    cache: The ExpansionCache of filter.
+    seen: The number of objects added.
+    matched: The number of objects that matched the filter.
+  """
+
+  def __init__(self, filter_, aggregates, group_by=(), max_groups=10000,
+               filter_implementation=None):
+    """Constructor.
+
+    Args:
+      filter_: A compiled filter.
+      aggregates: A list of aggregates like "count" or "max(size)".
+      group_by: A list of paths to group objects by.
+      max_groups: The maximum number of groups kept in memory.
+      filter_implementation: The implementation filter_ was compiled with. Its
+        value expander reads the paths when no node of filter_ has one.
+
+    Raises:
+      InvalidAggregateError: If an aggregate is malformed.
+    """
+    self.aggregates = [(aggregate, ParseAggregate(aggregate))
+                       for aggregate in aggregates]
+    self.group_by = list(group_by)
+    self.max_groups = max_groups
+    self.filter, self.cache = expansions.CachingCopy(filter_,
+                                                     filter_implementation)
+    self.groups = {}
+    self.seen = 0
+    self.matched = 0
+
+  def _GroupKey(self, obj):
+    key = []
+    for path in self.group_by:
+      values = [_Hashable(value) for value in self.cache.Expand(obj, path)]
+      if not values:
+        key.append(None)
+      elif len(values) == 1:
+        key.append(values[0])
+      else:
+        key.append(tuple(values))
+    return tuple(key)
+
+  def _Group(self, key):
+    group = self.groups.get(key)
+    if group is None:
+      if len(self.groups) >= self.max_groups and key is not OTHER:
+        return self._Group(OTHER)
+      group = self.groups[key] = [aggregator_cls() for _, (aggregator_cls, _)
+                                  in self.aggregates]
+    return group
+
+  def Add(self, obj):
+    """Aggregates obj if it matches the filter. Returns whether it matched."""
+    self.seen += 1
+    self.cache.Clear()
+    try:
+      if not self.filter.Matches(obj):
+        return False
+      self.matched += 1
+      group = self._Group(self._GroupKey(obj))
+      for aggregator, (_, (_, path)) in zip(group, self.aggregates):
+        if path is None:
+          aggregator.Add(None)
+        else:
+          aggregator.Add(self.cache.Values(obj, path))
+      return True
+    finally:
+      self.cache.Clear()
+
+  def Results(self):
+    """Returns a dict of group key to a dict of aggregate to its result."""
+    results = {}
+    for key, group in self.groups.iteritems():
+      results[key] = dict((aggregate, aggregator.Result()) for
+                          (aggregate, _), aggregator in
+                          zip(self.aggregates, group))
+    return results
+
+
+def Aggregate(filter_, objects, aggregates, group_by=(), max_groups=10000,
+              filter_implementation=None):
+  """Filters objects and returns the aggregates of the matching ones.
+
+  See Aggregation for the arguments. Returns Aggregation.Results().
+  """
+  aggregation = Aggregation(filter_, aggregates, group_by=group_by,
+                            max_groups=max_groups,
+                            filter_implementation=filter_implementation)
+  for obj in objects:
+    aggregation.Add(obj)
+  return aggregation.Results()
@@ -0,0 +1,263 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Evaluating filters over batches of objects with selection vectors.
+
+Filter.Matches() evaluates every operator of a query for one object before
+moving to the next. BatchFilter evaluates each operator over a whole batch
+instead. The selection vector, the list of positions in the batch still
+being considered, shrinks as it goes:
+
+  - AND runs each child on the positions that passed the previous ones.
+  - OR runs each child on the positions no previous child matched.
+
+The children of AND and OR are reordered after every batch by their measured
+cost per object and selectivity, so cheap and selective conditions run first
+and the expensive ones see fewer objects:
+
+  batch_filter = BatchFilter(compiled_filter)
+  for obj in batch_filter.Filter(objects, batch_size=1024):
+    ...
+
+Batches can also be columns: a dict of path to the list of values of that
+path for every object, like the columns of a table. None is a missing
+value, as with DictFilterImplementation:
+
+  batch_filter.SelectColumns({"name": ["a", "b"], "size": [10, None]})
+  => [0]
+
+Results are the same as calling Matches() on each object.
+"""
+
+import itertools
+import timeit
+
+import objectfilter
+
+
+class Error(objectfilter.Error):
+  """Base module exception."""
+
+
+class _Rows(object):
+  """A batch of objects."""
+
+  def __init__(self, objects):
+    self.objects = objects
+
+  def __len__(self):
+    return len(self.objects)
+
+  def Select(self, filter_, selection):
+    matches = filter_.Matches
+    objects = self.objects
+    return [index for index in selection if matches(objects[index])]
+
+
+class _Columns(object):
+  """A batch of objects given as a dict of path to the values of the path."""
+
+  def __init__(self, columns, size=None):
+    if size is None:
+      size = max([len(column) for column in columns.itervalues()] or [0])
+    self.columns = columns
+    self.size = size
+
+  def __len__(self):
+    return self.size
+
+  def Select(self, filter_, selection):
+    if isinstance(filter_, objectfilter.IdentityFilter):
+      return list(selection)
+    if isinstance(filter_, objectfilter.FalseFilter):
+      return []
+    if not isinstance(filter_, objectfilter.GenericBinaryOperator):
+      raise Error("%s can not be evaluated on columns." %
+                  filter_.__class__.__name__)
+    operate = filter_.Operate
+    # The result for objects without values, like Matches() gives.
+    missing = operate([])
+    column = self.columns.get(filter_.left_operand)
+    if column is None:
+      return list(selection) if missing else []
+    # Shorter columns have no values for the last objects.
+    length = len(column)
+    return [index for index in selection
+            if (missing if index >= length or column[index] is None else
+                operate([column[index]]))]
+
+
+class PlanNode(object):
+  """A node of a batch plan, with statistics of its evaluations.
+
+  Attributes:
+    filter: The compiled filter node.
+    children: The child PlanNodes of AND and OR nodes.
+    evaluated: The number of objects the node was evaluated on.
+    selected: The number of those that matched.
+    seconds: The time spent evaluating the node.
+  """
+
+  def __init__(self, filter_, children=None):
+    self.filter = filter_
+    self.children = children or []
+    self.evaluated = 0
+    self.selected = 0
+    self.seconds = 0.0
+
+  def Cost(self):
+    """Returns the average seconds spent per object."""
+    if not self.evaluated:
+      return 0.0
+    return self.seconds / self.evaluated
+
+  def Selectivity(self):
+    """Returns the fraction of objects that matched, 0.5 before any."""
+    if not self.evaluated:
+      return 0.5
+    return float(self.selected) / self.evaluated
+
+  def Select(self, batch, selection):
+    """Returns the positions of selection whose objects match the node."""
+    start = timeit.default_timer()
+    result = self._Select(batch, selection)
+    self.seconds += timeit.default_timer() - start
+    self.evaluated += len(selection)
+    self.selected += len(result)
+    return result
+
+  def _Select(self, batch, selection):
+    return batch.Select(self.filter, selection)
+
+  def ToDict(self):
+    return {"filter": str(self.filter),
+            "evaluated": self.evaluated,
+            "selected": self.selected,
+            "seconds": self.seconds,
+            "children": [child.ToDict() for child in self.children]}
+
+
+class _AndNode(PlanNode):
+  """Runs each child on the positions selected by the previous ones."""
+
+  adaptive = True
+
+  def Order(self):
+    """Returns the children in evaluation order."""
+    if not self.adaptive:
+      return self.children
+    # Cheap children that discard many objects first.
+    return sorted(self.children, key=lambda child: (
+        child.Cost() / max(1.0 - child.Selectivity(), 1e-9)))
+
+  def _Select(self, batch, selection):
+    for child in self.Order():
+      if not selection:
+        break
+      selection = child.Select(batch, selection)
+    return selection
+
+
+class _OrNode(PlanNode):
+  """Runs each child on the positions no previous child matched."""
+
+  adaptive = True
+
+  def Order(self):
+    """Returns the children in evaluation order."""
+    if not self.adaptive:
+      return self.children
+    # Cheap children that match many objects first.
+    return sorted(self.children, key=lambda child: (
+        child.Cost() / max(child.Selectivity(), 1e-9)))
+
+  def _Select(self, batch, selection):
+    if not self.children:
+      return list(selection)
+    matched = []
+    remaining = selection
+    for child in self.Order():
+      if not remaining:
+        break
+      selected = child.Select(batch, remaining)
+      if selected:
+        matched.extend(selected)
+        selected = set(selected)
+        remaining = [index for index in remaining if index not in selected]
+    matched.sort()
+    return matched
+
+
+def Plan(filter_, adaptive=True):
+  """Returns the PlanNode tree of a compiled filter."""
+  if isinstance(filter_, objectfilter.AndFilter):
+    node_cls = _AndNode
+  elif isinstance(filter_, objectfilter.OrFilter):
+    node_cls = _OrNode
+  else:
+    return PlanNode(filter_)
+  node = node_cls(filter_, [Plan(child, adaptive) for child in filter_.args])
+  node.adaptive = adaptive
+  return node
+
+
+class BatchFilter(object):
+  """Evaluates a compiled filter over batches of objects.
+
+  Attributes:
+    plan: The root PlanNode, holding the statistics of every node.
+  """
+
+  def __init__(self, filter_, adaptive=True):
+    """Constructor.
+
+    Args:
+      filter_: A compiled filter.
+      adaptive: Whether to reorder the children of AND and OR by their
+        measured cost and selectivity. Otherwise they run in query order.
+    """
+    self.filter = filter_
+    self.plan = Plan(filter_, adaptive)
+
+  def Select(self, objects):
+    """Returns the positions of the objects of a list that match."""
+    return self.plan.Select(_Rows(objects), range(len(objects)))
+
+  def SelectColumns(self, columns, size=None):
+    """Returns the positions of the objects given as columns that match.
+
+    Args:
+      columns: A dict of path to the list of values of the path for every
+        object. None is a missing value, as are the positions past the end
+        of columns shorter than size.
+      size: The number of objects, by default the length of the longest
+        column.
+
+    Raises:
+      Error: If the filter has nodes that can't be evaluated on columns,
+        like contexts.
+    """
+    batch = _Columns(columns, size)
+    return self.plan.Select(batch, range(len(batch)))
+
+  def Filter(self, objects, batch_size=1024):
+    """Yields the objects of an iterable that match, one batch at a time."""
+    objects = iter(objects)
+    while True:
+      batch = list(itertools.islice(objects, batch_size))
+      if not batch:
+        return
+      for index in self.Select(batch):
+        yield batch[index]
@@ -0,0 +1,226 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Bloom filter prefiltering of objects against a set of rules.
+
+Most objects match none of the rules in an IOC rule set, yet every rule still
+evaluates its equalities in full. A rule like
+
+  name is "evil.exe" and size > 10
+
+can only match objects that have the value "evil.exe" under "name".
+RuleSetPrefilter collects, for every path, the literals of the Equals and
+InSet operators that rules require and stores them in one Bloom filter per
+path. An object whose expanded values are in none of these Bloom filters can
+not match any rule and is rejected before any rule runs:
+
+  prefilter = RuleSetPrefilter(compiled_rules, error_rate=0.001)
+  for obj in objects:
+    for rule in prefilter.Matches(obj):
+      ...
+
+If some rule requires no such literal, every object may match it and the
+prefilter lets everything through.
+"""
+
+import math
+
+import objectfilter
+import operands
+
+
+class BloomFilter(object):
+  """A Bloom filter of hashable values.
+
+  Values are hashed with hash(), so values that compare equal, like 1 and 1.0,
+  are found regardless of which was added.
+  """
+
+  # Mixed with values to derive a second, independent hash.
+  _SALT = 0x5bd1e995
+
+  def __init__(self, capacity, error_rate=0.01):
+    """Constructor.
+
+    Args:
+      capacity: The number of values expected to be added.
+      error_rate: The false positive rate at capacity.
+    """
+    if not 0 < error_rate < 1:
+      raise ValueError("error_rate must be between 0 and 1.")
+    capacity = max(capacity, 1)
+    self.num_bits = max(8, int(math.ceil(
+        -capacity * math.log(error_rate) / math.log(2) ** 2)))
+    self.num_hashes = max(1, int(round(
+        float(self.num_bits) / capacity * math.log(2))))
+    self.bits = bytearray((self.num_bits + 7) // 8)
+    self.count = 0
+
+  def _Indexes(self, value):
+    first = hash(value)
+    second = hash((value, self._SALT)) | 1
+    for i in xrange(self.num_hashes):
+      yield (first + i * second) % self.num_bits
+
+  def Add(self, value):
+    for index in self._Indexes(value):
+      self.bits[index >> 3] |= 1 << (index & 7)
+    self.count += 1
+
+  def __contains__(self, value):
+    for index in self._Indexes(value):
+      if not self.bits[index >> 3] & (1 << (index & 7)):
+        return False
+    return True
+
+  def MemoryUsage(self):
+    """Returns the size of the bit array in bytes."""
+    return len(self.bits)
+
+
+# Values whose hash is consistent with their equality. Values of other types
+# may define __eq__ without a matching __hash__ and are never rejected.
+_HASHABLE_TYPES = (basestring, int, long, float)
+
+
+# Operands whose membership is their equality with one of the values they
+# iterate over.
+_CONTAINER_TYPES = (list, tuple, set, frozenset, operands.SortedArraySet)
+
+
+def _Literals(filter_):
+  """Returns the hashable literals of an Equals or InSet operand or None."""
+  operand = filter_.right_operand
+  # InSet tests strings for substrings, so only containers are sets of literals.
+  if (isinstance(operand, _HASHABLE_TYPES) and
+      not isinstance(filter_, objectfilter.InSet)):
+    return [operand]
+  if isinstance(operand, _CONTAINER_TYPES):
+    if all(isinstance(value, _HASHABLE_TYPES) for value in operand):
+      return list(operand)
+  return None
+
+
+def Requirements(filter_):
+  """Returns the literals that an object must have to match filter_.
+
+  Args:
+    filter_: A compiled filter.
+
+  Returns:
+    A list of (path, value_expander, literals) alternatives. An object can only
+    match if, for at least one alternative, a value expanded from path is one
+    of the literals. None if there's no such requirement.
+  """
+  if isinstance(filter_, objectfilter.AndFilter):
+    best = None
+    for child in filter_.args:
+      requirement = Requirements(child)
+      if requirement is not None and (best is None or
+                                      len(requirement) < len(best)):
+        best = requirement
+    return best
+
+  if isinstance(filter_, objectfilter.OrFilter):
+    if not filter_.args:
+      return None
+    alternatives = []
+    for child in filter_.args:
+      requirement = Requirements(child)
+      if requirement is None:
+        return None
+      alternatives.extend(requirement)
+    return alternatives
+
+  if isinstance(filter_, objectfilter.Context):
+    requirement = Requirements(filter_.condition)
+    if requirement is None:
+      return None
+    separator = objectfilter.ValueExpander.FIELD_SEPARATOR
+    return [(separator.join([filter_.context, path]), expander, literals)
+            for path, expander, literals in requirement]
+
+  # Operators with typed literals compare converted values.
+  if (isinstance(filter_, (objectfilter.Equals, objectfilter.InSet)) and
+      not filter_.coerce):
+    literals = _Literals(filter_)
+    if literals is not None:
+      return [(filter_.left_operand, filter_.value_expander, literals)]
+  return None
+
+
+class RuleSetPrefilter(object):
+  """Rejects objects that can not match any rule of a rule set.
+
+  Attributes:
+    rules: The compiled rules.
+    blooms: A dict of (value expander class, path) to BloomFilter.
+    enabled: False if some rule has no requirement, so nothing is rejected.
+    checked: The number of objects checked.
+    rejected: The number of objects rejected by the Bloom filters.
+  """
+
+  def __init__(self, rules, error_rate=0.01):
+    """Constructor.
+
+    Args:
+      rules: A list of compiled filters.
+      error_rate: The false positive rate of each per-path Bloom filter.
+    """
+    self.rules = list(rules)
+    self.blooms = {}
+    self.expanders = {}
+    self.enabled = bool(self.rules)
+    self.checked = 0
+    self.rejected = 0
+
+    literals_by_path = {}
+    for rule in self.rules:
+      requirement = Requirements(rule)
+      if requirement is None:
+        self.enabled = False
+        return
+      for path, expander, literals in requirement:
+        key = (expander.__class__, path)
+        self.expanders[key] = expander
+        literals_by_path.setdefault(key, set()).update(literals)
+
+    for key, literals in literals_by_path.items():
+      bloom = BloomFilter(len(literals), error_rate)
+      for literal in literals:
+        bloom.Add(literal)
+      self.blooms[key] = bloom
+
+  def MayMatch(self, obj):
+    """Whether obj may match a rule. False means no rule matches obj."""
+    if not self.enabled:
+      return True
+    self.checked += 1
+    for key, bloom in self.blooms.iteritems():
+      for value in self.expanders[key].Expand(obj, key[1]):
+        if not isinstance(value, _HASHABLE_TYPES) or value in bloom:
+          return True
+    self.rejected += 1
+    return False
+
+  def Matches(self, obj):
+    """Returns the rules that obj matches."""
+    if not self.MayMatch(obj):
+      return []
+    return [rule for rule in self.rules if rule.Matches(obj)]
+
+  def MemoryUsage(self):
+    """Returns the total size in bytes of the Bloom filters."""
+    return sum(bloom.MemoryUsage() for bloom in self.blooms.values())
@@ -0,0 +1,196 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Canonical forms and fingerprints of parsed queries.
+
+Queries that are spelled differently often mean the same:
+
+  a is 1 and b is 2
+  (b == 2) AND a equals 1.0
+
+Canonicalize() rewrites a parsed query into a normal form, which compiles to
+an equivalent filter:
+
+  - Operator aliases, like is, equals and ==, become a single name.
+  - Nested AND and OR expressions are flattened, and their operands sorted
+    and deduplicated.
+  - Floats with integral values become integers for operators comparing
+    numbers, like == and inset. Others, like regexp and contains, may use
+    their text.
+  - Lists of set operators, like inset and incidr, are sorted and
+    deduplicated.
+
+Fingerprint() returns a hash of the canonical form, so caches and rule sets
+can key on what a query means rather than on how it's written:
+
+  Fingerprint(Parser("a is 1 and b is 2").Parse()) == \\
+      Fingerprint(Parser("(b == 2) AND a equals 1.0").Parse())
+
+Typed literals are compared by value, so date("2013-01-01") and
+date("2013-01-01T00:00:00") have the same fingerprint. Paths and strings are
+case sensitive.
+"""
+
+import binascii
+import hashlib
+import json
+
+import lexer
+import literals
+import objectfilter
+
+
+# Version of the canonical form. Fingerprints change when it does.
+CANONICAL_VERSION = 2
+
+# The canonical name of every operator in OP2FN: the first of its aliases.
+OPERATOR_NAMES = {}
+for _name in sorted(objectfilter.OP2FN):
+  OPERATOR_NAMES.setdefault(objectfilter.OP2FN[_name], _name)
+del _name
+
+# Operators whose list arguments are sets, so their order doesn't matter.
+_SET_OPERATORS = objectfilter.SET_OPERATORS + (objectfilter.InCIDR,)
+
+# Operators comparing numbers by value, so that 1.0 and 1 mean the same.
+_NUMERIC_OPERATORS = (objectfilter.Equals, objectfilter.NotEquals,
+                      objectfilter.Less, objectfilter.LessEqual,
+                      objectfilter.Greater, objectfilter.GreaterEqual,
+                      objectfilter.InSet, objectfilter.NotInSet)
+
+_BINARY_OPERATORS = {"and": "and", "&&": "and", "or": "or", "||": "or"}
+
+
+def OperatorName(operator):
+  """Returns the canonical name of an operator."""
+  operator = operator.lower()
+  operator_cls = objectfilter.OP2FN.get(operator)
+  if operator_cls is None:
+    return operator
+  return OPERATOR_NAMES[operator_cls]
+
+
+def _ArgToData(arg):
+  if isinstance(arg, bool) or arg is None:
+    return arg
+  if isinstance(arg, (int, long, float, unicode)):
+    return arg
+  if isinstance(arg, str):
+    try:
+      return arg.decode("ascii")
+    except UnicodeError:
+      return {"bytes": binascii.hexlify(arg)}
+  if isinstance(arg, (list, tuple)):
+    return {"list": [_ArgToData(item) for item in arg]}
+  if isinstance(arg, objectfilter.Parameter):
+    return {"parameter": arg.name}
+  if isinstance(arg, literals.TypedLiteral):
+    return {"literal": arg.name, "value": arg.value}
+  return {"object": repr(arg)}
+
+
+def ToData(expression):
+  """Returns the canonical form of a query as nested lists and dicts.
+
+  The data has the layout of serialization.ToData(), except that typed
+  literals store their value instead of their text, and byte strings that
+  are ASCII are unicode. expression must be canonical already.
+  """
+  if isinstance(expression, objectfilter.IdentityExpression):
+    return ["identity"]
+  if isinstance(expression, objectfilter.ContextExpression):
+    return ["context", expression.attribute,
+            [ToData(arg) for arg in expression.args]]
+  if isinstance(expression, lexer.BinaryExpression):
+    return ["binary", expression.operator,
+            [ToData(arg) for arg in expression.args]]
+  return ["expression", expression.attribute, expression.operator,
+          [_ArgToData(arg) for arg in expression.args]]
+
+
+def _Dumps(data):
+  return json.dumps(data, sort_keys=True, separators=(",", ":"))
+
+
+def _CanonicalArg(arg):
+  if isinstance(arg, float) and arg.is_integer():
+    return int(arg)
+  if isinstance(arg, (list, tuple)):
+    return [_CanonicalArg(item) for item in arg]
+  return arg
+
+
+def _SortedSet(items):
+  """Returns items sorted by their canonical data, without duplicates."""
+  unique = {}
+  for item in items:
+    unique.setdefault(_Dumps(_ArgToData(item)), item)
+  return [unique[key] for key in sorted(unique)]
+
+
+def Canonicalize(expression):
+  """Returns a canonical copy of a parsed query. See the module docstring."""
+  if isinstance(expression, objectfilter.IdentityExpression):
+    return objectfilter.IdentityExpression()
+  if isinstance(expression, objectfilter.ContextExpression):
+    result = objectfilter.ContextExpression(expression.attribute)
+    result.args = [Canonicalize(arg) for arg in expression.args]
+    return result
+  if isinstance(expression, lexer.BinaryExpression):
+    operator = expression.operator.lower()
+    operator = _BINARY_OPERATORS.get(operator, operator)
+    operands = {}
+    for arg in expression.args:
+      arg = Canonicalize(arg)
+      if (isinstance(arg, lexer.BinaryExpression) and
+          arg.operator == operator):
+        nested = arg.args
+      else:
+        nested = [arg]
+      for operand in nested:
+        operands.setdefault(_Dumps(ToData(operand)), operand)
+    if len(operands) == 1 and operator in ("and", "or"):
+      return operands.values()[0]
+    result = objectfilter.BinaryExpression(operator)
+    result.args = [operands[key] for key in sorted(operands)]
+    return result
+  result = objectfilter.BasicExpression()
+  result.SetAttribute(expression.attribute)
+  result.SetOperator(OperatorName(expression.operator))
+  operator_cls = objectfilter.OP2FN.get(result.operator, object)
+  args = expression.args
+  if issubclass(operator_cls, _NUMERIC_OPERATORS):
+    args = [_CanonicalArg(arg) for arg in args]
+  if issubclass(operator_cls, _SET_OPERATORS):
+    args = [_SortedSet(arg) if isinstance(arg, list) else arg
+            for arg in args]
+  result.args = args
+  return result
+
+
+def Fingerprint(expression):
+  """Returns a stable fingerprint of what a query means.
+
+  Args:
+    expression: A parsed query, or a query string to parse.
+
+  Returns:
+    The hex SHA-256 of the canonical form of the query. Equivalent spellings
+    of a query have the same fingerprint, in any process or version of Python.
+  """
+  if isinstance(expression, basestring):
+    expression = objectfilter.Parser(expression).Parse()
+  data = _Dumps([CANONICAL_VERSION, ToData(Canonicalize(expression))])
+  return hashlib.sha256(data).hexdigest()
@@ -0,0 +1,311 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Command line tool to filter JSONL and CSV files with a query.
+
+  objectfilter "name is 'evil.exe' and size > 100" audit.jsonl
+  objectfilter --count --workers 8 "user is 'root'" huge.jsonl
+  objectfilter --fields name,size "size > 100" files.csv
+
+Input files are memory-mapped. Large files are split at record boundaries into
+chunks which are filtered by a pool of worker processes. Matches are written to
+stdout in input order: the raw record, or the selected --fields. CSV records
+must not contain newlines inside quoted fields.
+
+Records that can't be decoded are skipped. Their number is written to stderr
+and the exit status is 1. Invalid queries exit with status 2.
+"""
+
+import argparse
+import collections
+import csv
+import json
+import mmap
+import multiprocessing
+import os
+import StringIO
+import sys
+import timeit
+
+import jsonl
+import lexer
+import objectfilter
+import projection
+
+
+IMPLEMENTATIONS = {
+    "dict": objectfilter.DictFilterImplementation,
+    "attribute": objectfilter.BaseFilterImplementation,
+    "lowercase": objectfilter.LowercaseAttributeFilterImplementation,
+    }
+
+# Everything a worker needs to filter a chunk. It is sent to every worker.
+_Job = collections.namedtuple(
+    "_Job", ["query", "implementation", "format", "fields", "count",
+             "infer_types", "header"])
+
+# A byte range of an input file.
+_Chunk = collections.namedtuple("_Chunk", ["job", "path", "start", "end"])
+
+
+class _AttributeRecord(object):
+  """Exposes the keys of a decoded record as attributes."""
+
+  def __init__(self, record):
+    for key, value in record.items():
+      setattr(self, key, _ToAttributes(value))
+
+
+def _ToAttributes(value):
+  if isinstance(value, dict):
+    return _AttributeRecord(value)
+  if isinstance(value, list):
+    return [_ToAttributes(item) for item in value]
+  return value
+
+
+def _InferType(value):
+  """Converts CSV strings that look like numbers into numbers."""
+  for cast in (int, float):
+    try:
+      return cast(value)
+    except ValueError:
+      pass
+  return value
+
+
+class _ChunkFilter(object):
+  """Filters the records of a chunk according to a job."""
+
+  def __init__(self, job):
+    self.job = job
+    implementation = IMPLEMENTATIONS[job.implementation]
+    self.filter = objectfilter.Parser(job.query).Parse().Compile(
+        implementation)
+    self.expander = implementation.FILTERS["ValueExpander"]()
+    self.wrap = job.implementation != "dict"
+
+  def Decode(self, line):
+    if self.job.format == "csv":
+      values = next(csv.reader([line]))
+      record = dict(zip(self.job.header, values))
+      if self.job.infer_types:
+        record = dict((key, _InferType(value))
+                      for key, value in record.items())
+    else:
+      record = json.loads(line)
+    if self.wrap:
+      record = _ToAttributes(record)
+    return record
+
+  def Project(self, line):
+    """Returns the output for a matching line."""
+    if not self.job.fields:
+      return line.rstrip("\r\n") + "\n"
+    record = self.Decode(line)
+    values = [projection.Collapse(list(self.expander.Expand(record, path)))
+              for path in self.job.fields]
+    if self.job.format == "csv":
+      out = StringIO.StringIO()
+      csv.writer(out, lineterminator="\n").writerow(
+          ["" if value is None else value for value in values])
+      return out.getvalue()
+    return json.dumps(collections.OrderedDict(zip(self.job.fields,
+                                                  values))) + "\n"
+
+  def Run(self, buffer):
+    """Filters buffer.
+
+    Returns:
+      A tuple of (output lines, number of records, number of matches, number
+      of records that could not be decoded).
+    """
+    records = buffer.count("\n")
+    if buffer and not buffer.endswith("\n"):
+      records += 1
+    jsonl_filter = jsonl.JSONLFilter(self.filter, decoder=self.Decode,
+                                     skip_invalid=True)
+    if self.job.format == "csv":
+      # CSV quoting makes literals unreliable.
+      jsonl_filter.clauses = []
+      jsonl_filter.anchor = None
+    output = []
+    matches = 0
+    for line in jsonl_filter.FilterBuffer(buffer):
+      matches += 1
+      if not self.job.count:
+        output.append(self.Project(line))
+    return output, records, matches, jsonl_filter.invalid
+
+
+# Compiled filters of this worker process, by job.
+_chunk_filters = {}
+
+
+def _FilterChunk(chunk):
+  chunk_filter = _chunk_filters.get(chunk.job)
+  if chunk_filter is None:
+    chunk_filter = _chunk_filters[chunk.job] = _ChunkFilter(chunk.job)
+  with open(chunk.path, "rb") as fd:
+    buffer = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+      data = buffer[chunk.start:chunk.end]
+    finally:
+      buffer.close()
+  return chunk_filter.Run(data)
+
+
+def _ReadHeader(path):
+  """Returns the CSV header of path and the offset where records start."""
+  with open(path, "rb") as fd:
+    line = fd.readline()
+  return tuple(next(csv.reader([line]), [])), len(line)
+
+
+def _SplitFile(path, start, chunk_size):
+  """Returns (start, end) ranges of path that end at record boundaries."""
+  size = os.path.getsize(path)
+  if size <= start:
+    return []
+  ranges = []
+  with open(path, "rb") as fd:
+    buffer = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+      while start < size:
+        end = min(start + chunk_size, size)
+        if end < size:
+          newline = buffer.find("\n", end - 1)
+          end = size if newline == -1 else newline + 1
+        ranges.append((start, end))
+        start = end
+    finally:
+      buffer.close()
+  return ranges
+
+
+def _GuessFormat(path):
+  if path.lower().endswith(".csv"):
+    return "csv"
+  return "jsonl"
+
+
+def _ParseArguments(argv):
+  parser = argparse.ArgumentParser(
+      description="Filters JSONL or CSV records with an objectfilter query.")
+  parser.add_argument("query", help="The filter query.")
+  parser.add_argument("files", nargs="+", help="Input files, - for stdin.")
+  parser.add_argument("--format", choices=["jsonl", "csv"],
+                      help="Input format. Guessed from the file extension by "
+                      "default.")
+  parser.add_argument("--implementation", choices=sorted(IMPLEMENTATIONS),
+                      default="dict",
+                      help="The filter implementation. attribute and "
+                      "lowercase expose record keys as attributes.")
+  parser.add_argument("--fields",
+                      help="Comma separated paths to output instead of the "
+                      "whole record.")
+  parser.add_argument("--count", action="store_true",
+                      help="Only print the number of matches.")
+  parser.add_argument("--workers", type=int,
+                      default=multiprocessing.cpu_count(),
+                      help="Number of worker processes.")
+  parser.add_argument("--chunk-size", type=int, default=16 * 1024 * 1024,
+                      help="Bytes of input handled by a worker at a time.")
+  parser.add_argument("--no-infer-types", dest="infer_types",
+                      action="store_false",
+                      help="Keep CSV values as strings instead of converting "
+                      "numbers.")
+  parser.add_argument("--stats", action="store_true",
+                      help="Print throughput statistics to stderr.")
+  return parser.parse_args(argv)
+
+
+def main(argv=None, stdout=None, stderr=None):
+  """Runs the tool and returns its exit code."""
+  stdout = stdout or sys.stdout
+  stderr = stderr or sys.stderr
+  args = _ParseArguments(argv)
+  try:
+    expression = objectfilter.Parser(args.query).Parse()
+    if not isinstance(expression, lexer.Expression):
+      # The parser gives up on some malformed queries without raising.
+      raise objectfilter.ParseError("Unable to parse %r." % args.query)
+    expression.Compile(IMPLEMENTATIONS[args.implementation])
+  # Operators reject malformed operands, like regular expressions, with a
+  # ValueError.
+  except (objectfilter.Error, ValueError) as e:
+    stderr.write("Invalid query: %s\n" % e)
+    return 2
+  fields = tuple(args.fields.split(",")) if args.fields else None
+
+  start_time = timeit.default_timer()
+  pool = None
+  if args.workers > 1:
+    pool = multiprocessing.Pool(args.workers)
+  records = matches = invalid = 0
+  try:
+    for path in args.files:
+      file_format = args.format or _GuessFormat(path)
+      if path == "-":
+        data = sys.stdin.read()
+        header = None
+        if file_format == "csv":
+          first_line, _, data = data.partition("\n")
+          header = tuple(next(csv.reader([first_line]), []))
+        job = _Job(args.query, args.implementation, file_format, fields,
+                   args.count, args.infer_types, header)
+        results = [_ChunkFilter(job).Run(data)]
+      else:
+        header, offset = None, 0
+        if file_format == "csv":
+          header, offset = _ReadHeader(path)
+        job = _Job(args.query, args.implementation, file_format, fields,
+                   args.count, args.infer_types, header)
+        chunks = [_Chunk(job, path, start, end) for start, end in
+                  _SplitFile(path, offset, args.chunk_size)]
+        if pool:
+          results = pool.imap(_FilterChunk, chunks)
+        else:
+          results = (_FilterChunk(chunk) for chunk in chunks)
+
+      if header and not args.count:
+        out = StringIO.StringIO()
+        csv.writer(out, lineterminator="\n").writerow(fields or header)
+        stdout.write(out.getvalue())
+      for output, chunk_records, chunk_matches, chunk_invalid in results:
+        records += chunk_records
+        matches += chunk_matches
+        invalid += chunk_invalid
+        for line in output:
+          stdout.write(line)
+  finally:
+    if pool:
+      pool.close()
+      pool.join()
+
+  if args.count:
+    stdout.write("%d\n" % matches)
+  if args.stats:
+    elapsed = timeit.default_timer() - start_time
+    stderr.write("%d records, %d matches in %.3fs: %.0f records/s\n" % (
+        records, matches, elapsed, records / elapsed if elapsed else 0))
+  if invalid:
+    stderr.write("Skipped %d malformed records.\n" % invalid)
+    return 1
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,264 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Scatter-gather evaluation of filters over sharded objects.
+
+A Cluster starts a worker process per shard of objects. Every request sends
+the parsed query, serialized with serialization.ToJSON(), to all workers, so
+the query is parsed once and every shard evaluates exactly the same filter.
+The results of the workers are merged as they arrive:
+
+  with Cluster([shard1, shard2, shard3]) as cluster:
+    for obj in cluster.Filter("name is 'evil.exe'"):
+      ...
+    cluster.Count("size > 100")
+    cluster.TopK("size > 100", ["-size"], 10)
+
+Shards are lists of objects, or callables returning them, which are loaded by
+the worker. Messages are JSON documents sent over pipes, so objects must be
+serializable to JSON, like the dicts matched with DictFilterImplementation.
+
+Every request has an id that the workers echo in their replies, so replies
+left unread by an earlier request are told apart and dropped. A Filter()
+whose results are still being read when another request is sent raises
+InterruptedRequestError when it is read further.
+"""
+
+import itertools
+import json
+import multiprocessing
+
+import objectfilter
+import ordering
+import serialization
+
+
+class Error(objectfilter.Error):
+  """Base module exception."""
+
+
+class WorkerError(Error):
+  """A worker failed to evaluate a request."""
+
+
+class InterruptedRequestError(Error):
+  """A later request was sent before every reply of a request was read."""
+
+
+def _Send(connection, message):
+  connection.send_bytes(json.dumps(message))
+
+
+def _Reply(connection, request, message):
+  """Sends a reply to request, tagged with the id of the request."""
+  message["id"] = request.get("id")
+  _Send(connection, message)
+
+
+def _Receive(connection):
+  return json.loads(connection.recv_bytes())
+
+
+def _Evaluate(request, objects, filter_implementation, connection):
+  """Evaluates a request on the objects of a shard and sends the results."""
+  expression = serialization.FromJSON(request["filter"])
+  compiled = expression.Compile(filter_implementation,
+                                request.get("parameters"))
+  operation = request["operation"]
+  if operation == "count":
+    _Reply(connection, request, {"count": sum(1 for obj in objects
+                                              if compiled.Matches(obj))})
+  elif operation == "filter":
+    batch = []
+    for obj in objects:
+      if compiled.Matches(obj):
+        batch.append(obj)
+        if len(batch) >= request["batch_size"]:
+          _Reply(connection, request, {"batch": batch})
+          batch = []
+    _Reply(connection, request, {"batch": batch, "done": True})
+  elif operation == "topk":
+    _Reply(connection, request, {"objects": ordering.Sort(
+        compiled, objects, request["order_by"], limit=request["limit"],
+        reduction=request.get("reduction"),
+        filter_implementation=filter_implementation)})
+  else:
+    raise Error("Unknown operation %r." % operation)
+
+
+def _Worker(connection, shard, filter_implementation):
+  """Serves requests for a shard until it is told to stop."""
+  objects = list(shard() if callable(shard) else shard)
+  while True:
+    request = _Receive(connection)
+    if request["operation"] == "stop":
+      break
+    try:
+      _Evaluate(request, objects, filter_implementation, connection)
+    except Exception as e:
+      _Reply(connection, request,
+             {"error": "%s: %s" % (e.__class__.__name__, e)})
+  connection.close()
+
+
+class Cluster(object):
+  """Evaluates filters on shards of objects held by worker processes."""
+
+  def __init__(self, shards, filter_implementation=None, batch_size=1000):
+    """Constructor.
+
+    Args:
+      shards: A list of shards, each a list of objects or a callable
+        returning one.
+      filter_implementation: The implementation workers compile filters with.
+        DictFilterImplementation by default.
+      batch_size: The number of matching objects a worker sends at a time.
+    """
+    self.shards = shards
+    self.filter_implementation = (filter_implementation or
+                                  objectfilter.DictFilterImplementation)
+    self.batch_size = batch_size
+    self.workers = []
+    self._request_ids = itertools.count()
+    # The id of the last request sent.
+    self._request_id = None
+
+  def Start(self):
+    for shard in self.shards:
+      connection, worker_connection = multiprocessing.Pipe()
+      process = multiprocessing.Process(
+          target=_Worker,
+          args=(worker_connection, shard, self.filter_implementation))
+      process.daemon = True
+      process.start()
+      worker_connection.close()
+      self.workers.append((process, connection))
+
+  def Stop(self):
+    for process, connection in self.workers:
+      try:
+        _Send(connection, {"operation": "stop"})
+      except (IOError, EOFError):
+        pass
+      connection.close()
+      process.join()
+    self.workers = []
+
+  def __enter__(self):
+    self.Start()
+    return self
+
+  def __exit__(self, *_):
+    self.Stop()
+
+  def _Scatter(self, operation, query, parameters=None, **kwargs):
+    """Sends a request to every worker and returns its id."""
+    if isinstance(query, basestring):
+      query = objectfilter.Parser(query).Parse()
+    self._request_id = next(self._request_ids)
+    request = {"id": self._request_id,
+               "operation": operation,
+               "filter": serialization.ToJSON(query),
+               "parameters": parameters}
+    request.update(kwargs)
+    for _, connection in self.workers:
+      _Send(connection, request)
+    return self._request_id
+
+  def _Gather(self, request_id, finished):
+    """Yields (connection, reply) as workers reply, until all are finished.
+
+    Replies to other requests are dropped.
+
+    Args:
+      request_id: The id of the request to read the replies of.
+      finished: A function of a reply that returns whether it is the last
+        reply of its worker.
+
+    Raises:
+      WorkerError: If a worker replies with an error. The remaining replies
+        are read before raising, so the cluster can serve more requests.
+      InterruptedRequestError: If another request was sent before every
+        reply was read. Its replies are read by that request.
+    """
+    pending = [connection for _, connection in self.workers]
+    errors = []
+    while pending:
+      ready = [connection for connection in pending if connection.poll()]
+      if not ready:
+        pending[0].poll(0.05)
+        continue
+      for connection in ready:
+        reply = _Receive(connection)
+        if reply.get("id") != request_id:
+          continue
+        if "error" in reply:
+          errors.append(reply["error"])
+          pending.remove(connection)
+          continue
+        if finished(reply):
+          pending.remove(connection)
+        if not errors:
+          yield connection, reply
+          # A request sent meanwhile reads the replies left to this one.
+          if request_id != self._request_id:
+            raise InterruptedRequestError(
+                "Request %d was interrupted by request %d." %
+                (request_id, self._request_id))
+    if errors:
+      raise WorkerError("; ".join(errors))
+
+  def Filter(self, query, parameters=None):
+    """Yields the objects of every shard that match query.
+
+    Args:
+      query: A query string or a parsed query.
+      parameters: A dict of bind parameter values, serializable to JSON.
+    """
+    request_id = self._Scatter("filter", query, parameters,
+                               batch_size=self.batch_size)
+    replies = self._Gather(request_id, lambda reply: reply.get("done"))
+    try:
+      for _, reply in replies:
+        for obj in reply["batch"]:
+          yield obj
+    finally:
+      # Read the rest of the replies if the caller stopped early.
+      for _ in replies:
+        pass
+
+  def Count(self, query, parameters=None):
+    """Returns the number of objects of every shard that match query."""
+    request_id = self._Scatter("count", query, parameters)
+    return sum(reply["count"] for _, reply in
+               self._Gather(request_id, lambda reply: True))
+
+  def TopK(self, query, order_by, limit, parameters=None, reduction=None):
+    """Returns the first limit matching objects sorted by order_by.
+
+    Every worker sends its own first limit objects, which are merged here.
+    See ordering.Sort for order_by and reduction.
+    """
+    request_id = self._Scatter("topk", query, parameters, order_by=order_by,
+                               limit=limit, reduction=reduction)
+    replies = dict(self._Gather(request_id, lambda reply: True))
+    # Merge in shard order, so ties keep the order of the shards.
+    top = ordering.TopK(objectfilter.IdentityFilter(), order_by, limit=limit,
+                        reduction=reduction,
+                        filter_implementation=self.filter_implementation)
+    for _, connection in self.workers:
+      for obj in replies[connection]["objects"]:
+        top.Add(obj)
+    return top.Results()
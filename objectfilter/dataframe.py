@@ -0,0 +1,257 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Compilation of parsed queries into vectorized pandas boolean masks.
+
+Running Matches on every row of a DataFrame is slow. Instead, the AST returned
+by Parser.Parse() can be compiled into column operations:
+
+  mask_filter = Compile(Parser("size > 10 and name contains 'exe'").Parse())
+  matching = mask_filter.Filter(frame)
+
+Each path maps to the column with the same name, so a dotted path such as
+"hash.md5" refers to the column "hash.md5" (the naming used by
+pandas.json_normalize). Null values (None or NaN) and missing columns behave
+like missing keys do in DictFilterImplementation.
+
+The resulting mask is the same as evaluating DictFilterImplementation on each
+row. Values that can not be handled with vectorized operations, like lists in
+object columns, are evaluated one by one with the operator's own semantics.
+Context expressions are evaluated row by row.
+
+pandas is an optional dependency, only needed to use this module.
+"""
+
+import lexer
+import objectfilter
+import operands
+import utils
+
+try:
+  import pandas
+except ImportError:
+  pandas = None
+
+
+class Error(objectfilter.Error):
+  """Base module exception."""
+
+
+def _IsString(value):
+  return isinstance(value, basestring)
+
+
+class _Operation(object):
+  """Computes the mask of a single operator over a column."""
+
+  def __init__(self, expression, parameters=None):
+    arguments = [expression.attribute] + expression.BindArgs(parameters)
+    operator_cls = objectfilter.OP2FN.get(expression.operator.lower())
+    if operator_cls is None:
+      raise objectfilter.ParseError("Unknown operator %s provided." %
+                                    expression.operator)
+    self.path = expression.attribute
+    self.operand = arguments[1]
+    self.operator = operator_cls(
+        arguments=arguments, value_expander=objectfilter.DictValueExpander)
+    # The result for a row where the path has no value.
+    self.missing = self.operator.Operate([])
+
+  def _Elementwise(self, column, rows=None, operator=None):
+    """Evaluates the operator on every value of column, one at a time."""
+    if operator is None:
+      operator = self.operator
+    missing = operator.Operate([])
+    present = column.notnull()
+    if rows is None:
+      rows = present
+    else:
+      rows = rows & present
+    result = pandas.Series(missing, index=column.index)
+    result[rows] = column[rows].map(lambda x: operator.Operate([x]))
+    return result.astype(bool)
+
+  def _Vectorized(self, column, present):
+    """Returns the mask for present values or None if not vectorizable."""
+    operator, operand = self.operator, self.operand
+    if operator.coerce:
+      # Values are converted one by one for typed literals.
+      return None
+    if isinstance(operator, (objectfilter.Equals, objectfilter.NotEquals,
+                             objectfilter.Less, objectfilter.LessEqual,
+                             objectfilter.Greater, objectfilter.GreaterEqual)):
+      # pandas compares containers element by element, not as one value.
+      if isinstance(operand, (list, tuple, dict, set, frozenset,
+                              operands.SortedArraySet)):
+        return None
+    if isinstance(operator, (objectfilter.Equals, objectfilter.NotEquals)):
+      return present & (column == operand)
+    if isinstance(operator, objectfilter.Less):
+      return present & (column < operand)
+    if isinstance(operator, objectfilter.LessEqual):
+      return present & (column <= operand)
+    if isinstance(operator, objectfilter.Greater):
+      return present & (column > operand)
+    if isinstance(operator, objectfilter.GreaterEqual):
+      return present & (column >= operand)
+    if isinstance(operator, (objectfilter.Contains,
+                             objectfilter.NotContains)):
+      if not _IsString(operand):
+        return None
+      if column.dtype != object:
+        # Numbers never contain strings.
+        return pandas.Series(False, index=column.index)
+      contained = column.str.contains(operand, regex=False)
+      # Non-string values (lists, etc.) are resolved one by one. Both
+      # operators are evaluated as Contains, __call__ negates NotContains.
+      others = present & contained.isnull()
+      result = contained.fillna(False).astype(bool)
+      if others.any():
+        contains = objectfilter.Contains(
+            arguments=operator.args,
+            value_expander=objectfilter.DictValueExpander)
+        result[others] = self._Elementwise(column, others, contains)[others]
+      return result.astype(bool)
+    if isinstance(operator, (objectfilter.InSet, objectfilter.NotInSet)):
+      if isinstance(operand, (set, frozenset, operands.SortedArraySet)):
+        operand = list(operand)
+      if not isinstance(operand, list):
+        return None
+      if column.dtype == object and column[present].map(
+          lambda x: not _IsString(x) and hasattr(x, "__iter__")).any():
+        return None
+      return present & column.isin(operand)
+    if isinstance(operator, objectfilter.Regexp):
+      strings = column[present].map(utils.SmartUnicode)
+      result = pandas.Series(False, index=column.index)
+      result[present] = strings.str.contains(operator.compiled_re.pattern,
+                                             regex=True)
+      return result.astype(bool)
+    return None
+
+  def __call__(self, frame):
+    if self.path not in frame.columns:
+      return pandas.Series(self.missing, index=frame.index)
+    column = frame[self.path]
+    present = column.notnull()
+    try:
+      result = self._Vectorized(column, present)
+    except TypeError:
+      result = None
+    if result is None:
+      return self._Elementwise(column)
+    if isinstance(self.operator, (objectfilter.NotEquals,
+                                  objectfilter.NotContains,
+                                  objectfilter.NotInSet)):
+      return ~result
+    return result
+
+
+def _RowToDict(row):
+  """Returns a row as a dict without its null values."""
+  result = {}
+  for key, value in row.iteritems():
+    if value is None:
+      continue
+    try:
+      if pandas.isnull(value):
+        continue
+    except (TypeError, ValueError):
+      pass
+    result[key] = value
+  return result
+
+
+class _RowByRow(object):
+  """Evaluates an expression with DictFilterImplementation on every row."""
+
+  def __init__(self, expression, parameters=None):
+    self.filter = expression.Compile(objectfilter.DictFilterImplementation,
+                                     parameters)
+
+  def __call__(self, frame):
+    if not len(frame):
+      return pandas.Series(False, index=frame.index)
+    return frame.apply(lambda row: self.filter.Matches(_RowToDict(row)),
+                       axis=1).astype(bool)
+
+
+class _Boolean(object):
+  """Combines the masks of its operands with & or |."""
+
+  def __init__(self, is_and, operands):
+    self.is_and = is_and
+    self.operands = operands
+
+  def __call__(self, frame):
+    result = None
+    for operand in self.operands:
+      mask = operand(frame)
+      if result is None:
+        result = mask
+      elif self.is_and:
+        result = result & mask
+      else:
+        result = result | mask
+    return result
+
+
+def _CompileExpression(expression, parameters):
+  if isinstance(expression, objectfilter.IdentityExpression):
+    return lambda frame: pandas.Series(True, index=frame.index)
+  if isinstance(expression, objectfilter.ContextExpression):
+    return _RowByRow(expression, parameters)
+  if isinstance(expression, lexer.BinaryExpression):
+    operator = expression.operator.lower()
+    if operator in ("and", "&&"):
+      is_and = True
+    elif operator in ("or", "||"):
+      is_and = False
+    else:
+      raise objectfilter.ParseError("Invalid binary operator %s" % operator)
+    return _Boolean(is_and, [_CompileExpression(arg, parameters)
+                             for arg in expression.args])
+  return _Operation(expression, parameters)
+
+
+class DataFrameFilter(object):
+  """A query compiled into operations over the columns of a DataFrame."""
+
+  def __init__(self, expression, parameters=None):
+    if pandas is None:
+      raise Error("pandas is required to filter DataFrames.")
+    self.expression = expression
+    self._mask = _CompileExpression(expression, parameters)
+
+  def Mask(self, frame):
+    """Returns a boolean Series, True for the rows that match."""
+    return self._mask(frame)
+
+  def Filter(self, frame):
+    """Returns the rows of frame that match."""
+    return frame[self.Mask(frame)]
+
+
+def Compile(expression, parameters=None):
+  """Compiles the AST returned by Parser.Parse() into a DataFrameFilter.
+
+  Args:
+    expression: The AST returned by Parser.Parse().
+    parameters: A dict of values for the bind parameters of expression.
+
+  Returns:
+    A DataFrameFilter.
+  """
+  return DataFrameFilter(expression, parameters)
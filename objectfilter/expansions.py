@@ -0,0 +1,142 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Sharing value expansions between a filter and the stages after it.
+
+Stages that run after a filter, like aggregation or projection, often need
+the same paths the filter already expanded to match an object. CachingCopy()
+returns a copy of a compiled filter whose nodes expand values through a
+single ExpansionCache. After the copy evaluates an object, the cache holds
+every expansion it made, so later stages read them without walking the paths
+again:
+
+  shared, cache = CachingCopy(compiled_filter, filter_implementation)
+  for obj in objects:
+    cache.Clear()
+    if shared.Matches(obj):
+      sizes = cache.Expand(obj, "size")
+"""
+
+import objectfilter
+
+
+class Error(objectfilter.Error):
+  """Base module exception."""
+
+
+class MissingValueExpanderError(Error):
+  """There's no value expander to expand paths with."""
+
+
+def _IsIterator(value):
+  """Whether value is consumed by iterating it, like a generator."""
+  try:
+    return iter(value) is value
+  except TypeError:
+    return False
+
+
+class ExpansionCache(object):
+  """A value expander that remembers the expansions of the current object.
+
+  Expansions are keyed by the identity of the expanded object and the path.
+  Entries keep a reference to their object, so its id() can't be reused by
+  another object while the entry exists. Expansions with iterators among their
+  values are not cached, since iterating them again would yield nothing.
+
+  Attributes:
+    value_expander: The value expander used on cache misses, or None if paths
+      can't be expanded.
+    hits: The number of expansions answered from the cache.
+    misses: The number of expansions made by value_expander.
+  """
+
+  def __init__(self, value_expander):
+    self.value_expander = value_expander
+    self.entries = {}
+    self.hits = 0
+    self.misses = 0
+
+  def Expand(self, obj, path):
+    """Returns an iterator over the values of path in obj.
+
+    Raises:
+      MissingValueExpanderError: If there's no value expander.
+    """
+    if not isinstance(path, basestring):
+      path = objectfilter.ValueExpander.FIELD_SEPARATOR.join(path)
+    key = (id(obj), path)
+    entry = self.entries.get(key)
+    if entry is not None and entry[0] is obj:
+      self.hits += 1
+      return iter(entry[1])
+    if self.value_expander is None:
+      raise MissingValueExpanderError(
+          "No value expander to expand %r. Pass the filter implementation."
+          % path)
+    self.misses += 1
+    values = list(self.value_expander.Expand(obj, path))
+    if not any(_IsIterator(value) for value in values):
+      self.entries[key] = (obj, values)
+    return iter(values)
+
+  def Values(self, obj, path):
+    """Returns the list of values of path in obj."""
+    return list(self.Expand(obj, path))
+
+  def Clear(self):
+    """Forgets every expansion, usually before evaluating the next object."""
+    self.entries.clear()
+
+
+def _FindValueExpander(filter_):
+  if filter_.value_expander is not None:
+    return filter_.value_expander
+  for child in filter_.Children():
+    value_expander = _FindValueExpander(child)
+    if value_expander is not None:
+      return value_expander
+  return None
+
+
+def _Rebind(filter_, cache):
+  children = [_Rebind(child, cache) for child in filter_.Children()]
+  node = filter_.CopyWithChildren(children)
+  if node.value_expander is not None:
+    node.value_expander = cache
+  return node
+
+
+def CachingCopy(filter_, filter_implementation=None, value_expander=None):
+  """Returns a copy of filter_ that expands values through an ExpansionCache.
+
+  Args:
+    filter_: A compiled filter.
+    filter_implementation: The implementation filter_ was compiled with.
+    value_expander: The value expander instance to use on cache misses. By
+      default, the one of the first node of filter_ that has one, or a new one
+      of filter_implementation if no node has one, like for an empty query.
+
+  Returns:
+    A tuple of (filter copy, ExpansionCache). filter_ is left untouched. If
+    there's no value expander, the cache raises MissingValueExpanderError when
+    it is asked to expand a path.
+  """
+  if value_expander is None:
+    value_expander = _FindValueExpander(filter_)
+  if value_expander is None and filter_implementation is not None:
+    value_expander = filter_implementation.FILTERS["ValueExpander"]()
+  cache = ExpansionCache(value_expander)
+  return _Rebind(filter_, cache), cache
@@ -0,0 +1,186 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Instrumented evaluation of compiled filters (EXPLAIN / EXPLAIN ANALYZE).
+
+Instrument() returns a copy of a compiled filter where every node is wrapped
+with counters. The original filter is left untouched, so evaluating it costs
+exactly what it did before.
+
+  compiled_filter = Parser("size > 10 and name contains 'exe'").Parse().Compile(
+      LowercaseAttributeFilterImplementation)
+  explained = Instrument(compiled_filter)
+  explained.Filter(objects)
+  print explained.Render()
+
+For every node the following is recorded:
+  calls: how many times the node was evaluated.
+  passes: how many of those evaluations returned True.
+  short_circuits: evaluations that returned before evaluating every child or
+    consuming every expanded value.
+  values: how many values were expanded for the node's path.
+  time: cumulative wall time spent in the node, including its children.
+"""
+
+import json
+import timeit
+
+import objectfilter
+
+
+class NodeStats(object):
+  """Counters for a single node of an instrumented filter."""
+
+  def __init__(self):
+    self.calls = 0
+    self.passes = 0
+    self.short_circuits = 0
+    self.values = 0
+    self.time = 0.0
+
+  def ToDict(self):
+    return {"calls": self.calls,
+            "passes": self.passes,
+            "short_circuits": self.short_circuits,
+            "values": self.values,
+            "time": self.time}
+
+
+class _CountingExpansion(object):
+  """Iterates an expansion, counting values and noting when it is exhausted."""
+
+  def __init__(self, values, stats):
+    self.values = values
+    self.stats = stats
+    self.exhausted = False
+
+  def __iter__(self):
+    for value in self.values:
+      self.stats.values += 1
+      yield value
+    self.exhausted = True
+
+
+class _CountingValueExpander(object):
+  """Wraps a value expander instance to count the values it yields."""
+
+  def __init__(self, value_expander, stats):
+    self.value_expander = value_expander
+    self.stats = stats
+    self.last_expansion = None
+
+  def Expand(self, obj, path):
+    self.last_expansion = _CountingExpansion(
+        self.value_expander.Expand(obj, path), self.stats)
+    return iter(self.last_expansion)
+
+
+class InstrumentedFilter(objectfilter.Filter):
+  """Evaluates a filter node and records statistics about the evaluation."""
+
+  def __init__(self, node, children=None):
+    super(InstrumentedFilter, self).__init__()
+    self.node = node
+    self.children = children or []
+    self.stats = NodeStats()
+
+  def Matches(self, obj):
+    stats = self.stats
+    stats.calls += 1
+    counting_expander = None
+    if isinstance(self.node.value_expander, _CountingValueExpander):
+      counting_expander = self.node.value_expander
+      counting_expander.last_expansion = None
+    calls_before = [child.stats.calls for child in self.children]
+
+    start = timeit.default_timer()
+    result = self.node.Matches(obj)
+    stats.time += timeit.default_timer() - start
+
+    if result:
+      stats.passes += 1
+    # A Context without sub-objects skips its condition without short
+    # circuiting, so only And and Or count skipped children.
+    if isinstance(self.node, (objectfilter.AndFilter, objectfilter.OrFilter)):
+      for child, calls in zip(self.children, calls_before):
+        if child.stats.calls == calls:
+          stats.short_circuits += 1
+          break
+    elif (not self.children and counting_expander and
+          counting_expander.last_expansion):
+      if not counting_expander.last_expansion.exhausted:
+        stats.short_circuits += 1
+    return result
+
+  def Label(self):
+    """Returns a one-line description of the wrapped node."""
+    node = self.node
+    if isinstance(node, objectfilter.Context):
+      return "%s(%s)" % (node.__class__.__name__, node.context)
+    if isinstance(node, objectfilter.BinaryOperator):
+      return "%s(%s, %r)" % (node.__class__.__name__, node.left_operand,
+                             node.right_operand)
+    return node.__class__.__name__
+
+  def ToDict(self):
+    """Returns the statistics of this node and its children as a dict."""
+    result = {"node": self.Label()}
+    result.update(self.stats.ToDict())
+    result["children"] = [child.ToDict() for child in self.children]
+    return result
+
+  def ToJSON(self, **kwargs):
+    """Returns the statistics tree serialized as JSON."""
+    return json.dumps(self.ToDict(), **kwargs)
+
+  def Render(self, depth=0):
+    """Returns the statistics tree as indented text, one node per line."""
+    stats = self.stats
+    lines = ["%s%s  calls=%d passes=%d short_circuits=%d values=%d "
+             "time=%.3fms" % ("  " * depth, self.Label(), stats.calls,
+                              stats.passes, stats.short_circuits,
+                              stats.values, stats.time * 1000)]
+    for child in self.children:
+      lines.append(child.Render(depth + 1))
+    return "\n".join(lines)
+
+  def __str__(self):
+    return self.Render()
+
+
+def Instrument(filter_):
+  """Returns an instrumented copy of a compiled filter.
+
+  Args:
+    filter_: A compiled filter, as returned by Compile().
+
+  Returns:
+    An InstrumentedFilter wrapping a copy of filter_'s tree.
+  """
+  children = [Instrument(child) for child in filter_.Children()]
+  node = filter_.CopyWithChildren(children)
+  wrapper = InstrumentedFilter(node, children)
+  if node.value_expander is not None:
+    node.value_expander = _CountingValueExpander(node.value_expander,
+                                                 wrapper.stats)
+  return wrapper
+
+
+def Explain(filter_, objects):
+  """Evaluates filter_ on every object and returns the instrumented tree."""
+  instrumented = Instrument(filter_)
+  for obj in objects:
+    instrumented.Matches(obj)
+  return instrumented
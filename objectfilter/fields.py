@@ -0,0 +1,107 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Loading only the fields of a record that a filter reads.
+
+Both parsed expressions and compiled filters report the paths they read with
+GetPaths(), with paths under a context prefixed by the context path:
+
+  Parser("@imported_dlls(name is 'a.dll')").Parse().GetPaths()
+  => set(["imported_dlls.name"])
+
+Loaders that build expensive objects can use these paths to deserialise only
+what is needed. For dicts, ProjectingLoader trims records down to the needed
+subtree before they are evaluated:
+
+  loader = ProjectingLoader(compiled_filter.GetPaths())
+  for line in lines:
+    if compiled_filter.Matches(loader.Load(json.loads(line))):
+      ...
+"""
+
+import objectfilter
+
+
+# Marks a path that ends at this node of a path tree.
+LEAF = None
+
+
+def PathTree(paths):
+  """Builds a nested dict of path components from a set of dotted paths.
+
+  Args:
+    paths: An iterable of dotted paths.
+
+  Returns:
+    A dict of path component to either LEAF, if a path ends there, or the dict
+    of the components below it.
+  """
+  tree = {}
+  for path in paths:
+    components = path.split(objectfilter.ValueExpander.FIELD_SEPARATOR)
+    node = tree
+    for component in components[:-1]:
+      child = node.get(component, {})
+      if child is LEAF:
+        break
+      node = node.setdefault(component, child)
+    else:
+      node[components[-1]] = LEAF
+  return tree
+
+
+def TrimRecord(record, tree):
+  """Returns a copy of record with only the keys present in tree.
+
+  Lists are trimmed element by element. Dicts reached in the middle of a path
+  are kept whole, since DictValueExpander yields them as values.
+
+  Args:
+    record: A dict.
+    tree: A path tree, as returned by PathTree().
+
+  Returns:
+    A new dict. Values that are not trimmed are shared with record.
+  """
+  result = {}
+  for key, subtree in tree.iteritems():
+    if key not in record:
+      continue
+    value = record[key]
+    if subtree is not LEAF and isinstance(value, list):
+      value = [TrimRecord(item, subtree) if isinstance(item, dict) else item
+               for item in value]
+    result[key] = value
+  return result
+
+
+class ProjectingLoader(object):
+  """Trims dict records to the paths read by a set of filters."""
+
+  def __init__(self, paths, decoder=None):
+    """Constructor.
+
+    Args:
+      paths: The paths to keep, usually from GetPaths() of one or more filters.
+      decoder: An optional callable to decode raw records into dicts.
+    """
+    self.tree = PathTree(paths)
+    self.decoder = decoder
+
+  def Load(self, record):
+    """Decodes record if there's a decoder and returns it trimmed."""
+    if self.decoder:
+      record = self.decoder(record)
+    return TrimRecord(record, self.tree)
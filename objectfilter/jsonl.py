@@ -0,0 +1,249 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Streaming filtering of JSON-lines data with byte-level prefiltering.
+
+Decoding every line is usually the most expensive part of filtering a JSONL
+file, even though most lines do not match. A compiled filter often requires
+some literal to appear in a matching line: "name is 'evil.exe'" can only match
+lines that contain the bytes evil.exe. JSONLFilter derives these literals from
+the Equals and Contains operands of the filter and uses them to reject lines
+before decoding them.
+
+  compiled_filter = Parser(query).Parse().Compile(DictFilterImplementation)
+  jsonl_filter = JSONLFilter(compiled_filter)
+  with open("out.jsonl", "wb") as out:
+    jsonl_filter.Write(jsonl_filter.FilterFile("audit.jsonl"), out)
+
+Matching lines are yielded as the raw bytes read, so they can be written out
+without being serialised again.
+
+Only literals made of printable ASCII characters other than '"', '\\', '/',
+'<', '>' and '&' are used, since JSON encoders write those unescaped. HTML-safe
+encoders, like Go's encoding/json, escape '<', '>' and '&' as \u003c and so on.
+"""
+
+import json
+import mmap
+import os
+
+import objectfilter
+
+
+class Error(objectfilter.Error):
+  """Base module exception."""
+
+
+def _SafeLiteral(value):
+  """Returns value as bytes if it always appears verbatim in JSON, or None."""
+  if isinstance(value, unicode):
+    try:
+      value = value.encode("ascii")
+    except UnicodeError:
+      return None
+  if not isinstance(value, str) or not value:
+    return None
+  for character in value:
+    if character < " " or character > "~" or character in "\"\\/<>&":
+      return None
+  return value
+
+
+def _BestClause(clauses):
+  """Returns the clause rejecting the most lines: fewest, longest literals."""
+  return min(clauses, key=lambda clause: (len(clause),
+                                          -min(len(x) for x in clause)))
+
+
+def RequiredLiterals(filter_):
+  """Returns the literals that every line matching filter_ must contain.
+
+  Args:
+    filter_: A compiled filter.
+
+  Returns:
+    A list of clauses. Each clause is a tuple of byte strings, at least one of
+    which appears in every matching line.
+  """
+  if isinstance(filter_, objectfilter.AndFilter):
+    clauses = []
+    for child in filter_.args:
+      clauses.extend(RequiredLiterals(child))
+    return clauses
+
+  if isinstance(filter_, objectfilter.OrFilter):
+    if not filter_.args:
+      return []
+    literals = []
+    for child in filter_.args:
+      child_clauses = RequiredLiterals(child)
+      if not child_clauses:
+        return []
+      literals.extend(_BestClause(child_clauses))
+    return [tuple(sorted(set(literals)))]
+
+  if isinstance(filter_, objectfilter.Context):
+    return RequiredLiterals(filter_.condition)
+
+  if isinstance(filter_, (objectfilter.Equals, objectfilter.Contains)):
+    literal = _SafeLiteral(filter_.right_operand)
+    if literal is not None:
+      return [(literal,)]
+  return []
+
+
+class JSONLFilter(object):
+  """Filters JSON lines, decoding only those that pass the prefilter.
+
+  Attributes:
+    filter: The compiled filter.
+    clauses: The literals required in matching lines, see RequiredLiterals.
+    lines: The number of lines seen.
+    decoded: The number of lines that passed the prefilter and were decoded.
+    matched: The number of lines that matched the filter.
+    invalid: The number of lines skipped because they could not be decoded.
+  """
+
+  def __init__(self, filter_, decoder=json.loads, skip_invalid=False):
+    """Constructor.
+
+    Args:
+      filter_: A compiled filter, usually with DictFilterImplementation.
+      decoder: A callable that decodes a line into the object to match.
+      skip_invalid: Whether lines the decoder rejects with a ValueError are
+        counted and skipped. They raise the ValueError otherwise.
+    """
+    self.filter = filter_
+    self.decoder = decoder
+    self.skip_invalid = skip_invalid
+    self.clauses = RequiredLiterals(filter_)
+    # A literal that must appear in every match, used to skip through buffers.
+    self.anchor = None
+    anchors = [clause[0] for clause in self.clauses if len(clause) == 1]
+    if anchors:
+      self.anchor = max(anchors, key=len)
+    self.lines = 0
+    self.decoded = 0
+    self.matched = 0
+    self.invalid = 0
+
+  def Prefilter(self, line):
+    """Whether line may match, judging only by the literals it contains."""
+    for clause in self.clauses:
+      for literal in clause:
+        if literal in line:
+          break
+      else:
+        return False
+    return True
+
+  def _Match(self, line):
+    self.decoded += 1
+    try:
+      obj = self.decoder(line)
+    except ValueError:
+      if not self.skip_invalid:
+        raise
+      self.invalid += 1
+      return False
+    if self.filter.Matches(obj):
+      self.matched += 1
+      return True
+    return False
+
+  def FilterLines(self, lines):
+    """Yields the lines of an iterable, like a file object, that match."""
+    for line in lines:
+      self.lines += 1
+      if not line.strip() or not self.Prefilter(line):
+        continue
+      if self._Match(line):
+        yield line
+
+  def _CandidateLines(self, buffer):
+    """Yields (start, end) of the lines of buffer that contain the anchor."""
+    size = len(buffer)
+    position = 0
+    while position < size:
+      found = buffer.find(self.anchor, position)
+      if found == -1:
+        return
+      start = buffer.rfind("\n", 0, found) + 1
+      end = buffer.find("\n", found)
+      if end == -1:
+        end = size
+      yield start, end
+      position = end + 1
+
+  def _AllLines(self, buffer):
+    """Yields (start, end) of every line of buffer."""
+    size = len(buffer)
+    position = 0
+    while position < size:
+      end = buffer.find("\n", position)
+      if end == -1:
+        end = size
+      yield position, end
+      position = end + 1
+
+  def FilterBuffer(self, buffer):
+    """Yields the matching lines of a string or memory-mapped buffer.
+
+    When the filter has an anchor literal, lines without it are skipped
+    without being copied out of the buffer, so they are not counted in lines.
+
+    Args:
+      buffer: A str or mmap holding newline separated JSON documents.
+
+    Yields:
+      The raw matching lines, including their trailing newline if present.
+    """
+    if self.anchor:
+      spans = self._CandidateLines(buffer)
+    else:
+      spans = self._AllLines(buffer)
+    for start, end in spans:
+      self.lines += 1
+      line = buffer[start:end]
+      if not line.strip() or not self.Prefilter(line):
+        continue
+      if self._Match(line):
+        yield buffer[start:end + 1]
+
+  def FilterFile(self, path):
+    """Memory-maps the file at path and yields its matching lines."""
+    with open(path, "rb") as fd:
+      if not os.fstat(fd.fileno()).st_size:
+        return
+      buffer = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+      try:
+        for line in self.FilterBuffer(buffer):
+          yield line
+      finally:
+        buffer.close()
+
+  def Write(self, lines, out):
+    """Writes raw lines to the file object out, one per line.
+
+    Returns:
+      The number of lines written.
+    """
+    count = 0
+    for line in lines:
+      out.write(line)
+      if not line.endswith("\n"):
+        out.write("\n")
+      count += 1
+    return count
@@ -17,6 +17,7 @@
 
 import logging
 import re
+import tracing
 import utils
 
 
@@ -93,16 +94,13 @@ class Lexer(object):
       if token.state_regex and not token.state_regex.match(current_state):
         continue
 
-      if self.verbose:
-        logging.debug("%s: Trying to match %r with %r",
-                      self.state, self.buffer[:10], token.re_str)
-
       # Try to match the rule
       m = token.regex.match(self.buffer)
       if not m: continue
 
-      if self.verbose:
-        logging.debug("%s matched %s", token.re_str, m.group(0))
+      if tracing.tracer:
+        tracing.tracer(tracing.PARSE_TOKEN, state=current_state,
+                       regex=token.re_str, string=m.group(0))
 
       # The match consumes the data off the buffer (the handler can put it back
       # if it likes)
@@ -112,9 +110,6 @@ class Lexer(object):
 
       next_state = token.next_state
       for action in token.actions:
-        if self.verbose:
-          logging.debug("Calling %s with %s", action, m.group(0))
-
         # Is there a callback to handle this action?
         cb = getattr(self, action, self.Default)
 
@@ -257,7 +252,13 @@ class Expression(object):
   def PrintTree(self, depth=""):
     return "%s %s" % (depth, self)
 
-  def Compile(self, filter_implemention):
+  def GetPaths(self):
+    """Returns the set of attribute paths this expression reads."""
+    if self.attribute:
+      return set([self.attribute])
+    return set()
+
+  def Compile(self, filter_implemention, parameters=None):
     """Given a filter implementation, compile this expression."""
     raise NotImplementedError("%s does not implement Compile." %
                               self.__class__.__name__)
@@ -290,6 +291,12 @@ class BinaryExpression(Expression):
 
     return result
 
+  def GetPaths(self):
+    paths = set()
+    for part in self.args:
+      paths.update(part.GetPaths())
+    return paths
+
   def Compile(self, filter_implemention):
     """Compile the binary expression into a filter object."""
     operator = self.operator.lower()
@@ -403,8 +410,6 @@ class SearchParser(Lexer):
       return self.InsertArg(string=self.string)
 
   def StoreAttribute(self, string="", **_):
-    logging.debug("Storing attribute %r", string)
-
     try:
       self.current_expression.SetAttribute(string)
     except AttributeError:
@@ -413,13 +418,10 @@ class SearchParser(Lexer):
     return "OPERATOR"
 
   def StoreOperator(self, string="", **_):
-    logging.debug("Storing operator %r", string)
     self.current_expression.SetOperator(string)
 
   def InsertArg(self, string="", **_):
     """Insert an arg to the current expression."""
-    logging.debug("Storing Argument %s", string)
-
     # This expression is complete
     if self.current_expression.AddArg(string):
       self.stack.append(self.current_expression)
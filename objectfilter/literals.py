@@ -0,0 +1,349 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Typed literals for timestamps, durations, IP addresses and CIDR ranges.
+
+Queries can write these literals as arguments:
+
+  mtime after date("2013-01-01T00:00:00Z")
+  uptime > duration("1h30m")
+  src_ip is ip("10.0.0.1")
+  dst_ip incidr [cidr("10.0.0.0/8"), cidr("fe80::/10")]
+
+Literals are converted once, when parsed, to integers: microseconds since the
+epoch for dates, microseconds for durations and 128 bit integers for IP
+addresses, with IPv4 addresses mapped into the IPv6 space. CIDR ranges become
+intervals of those integers, and sets of them a CIDRSet.
+
+An operator with a typed literal operand converts the values of the object to
+the same encoding with the literal's Coerce() before comparing them. Values
+that can't be converted are treated as missing.
+"""
+
+import bisect
+import calendar
+import datetime
+import re
+import socket
+
+
+_MICROSECONDS = 1000000
+
+
+class TypedLiteral(object):
+  """A literal argument converted to an integer encoding when parsed.
+
+  Attributes:
+    text: The literal as written in the query.
+    value: The encoded value.
+  """
+
+  # The name used in queries, like date("...").
+  name = None
+
+  def __init__(self, text):
+    """Constructor.
+
+    Raises:
+      ValueError: If text is not a valid literal of this type.
+    """
+    self.text = text
+    self.value = self.Parse(text)
+
+  @classmethod
+  def Parse(cls, text):
+    """Returns the encoded value of text or raises ValueError."""
+    raise NotImplementedError
+
+  @classmethod
+  def Coerce(cls, value):
+    """Returns the encoding of a value of an object or None."""
+    if isinstance(value, basestring):
+      try:
+        return cls.Parse(value)
+      except ValueError:
+        return None
+    return None
+
+  def __eq__(self, other):
+    return (isinstance(other, TypedLiteral) and self.name == other.name and
+            self.value == other.value)
+
+  def __ne__(self, other):
+    return not self == other
+
+  def __hash__(self):
+    return hash((self.name, self.value))
+
+  def __repr__(self):
+    return "%s(%r)" % (self.name, self.text)
+
+
+_DATE_RE = re.compile(
+    r"^(\d{4})-(\d\d)-(\d\d)"
+    r"(?:[T ](\d\d):(\d\d)(?::(\d\d)(?:\.(\d{1,6}))?)?)?"
+    r"(Z|[+-]\d\d:?\d\d)?$")
+
+
+class Date(TypedLiteral):
+  """A point in time, as microseconds since the epoch in UTC.
+
+  Written as an ISO 8601 date, optionally with a time and a UTC offset, like
+  "2013-01-01", "2013-01-01T10:30:00Z" or "2013-01-01 10:30:00.5+02:00".
+  Times without an offset are in UTC.
+
+  Object values can be strings in the same format, datetime and date objects,
+  with naive datetimes taken as UTC, or numbers of seconds since the epoch.
+  """
+
+  name = "date"
+
+  @classmethod
+  def Parse(cls, text):
+    match = _DATE_RE.match(text.strip())
+    if not match:
+      raise ValueError("%r is not a valid date." % text)
+    (year, month, day, hour, minute, second,
+     fraction, offset) = match.groups()
+    moment = datetime.datetime(int(year), int(month), int(day),
+                               int(hour or 0), int(minute or 0),
+                               int(second or 0),
+                               int((fraction or "0").ljust(6, "0")))
+    result = cls._FromDatetime(moment)
+    if offset and offset != "Z":
+      sign = -1 if offset[0] == "-" else 1
+      digits = offset[1:].replace(":", "")
+      minutes = int(digits[:2]) * 60 + int(digits[2:])
+      result -= sign * minutes * 60 * _MICROSECONDS
+    return result
+
+  @classmethod
+  def _FromDatetime(cls, moment):
+    offset = moment.utcoffset()
+    if offset is not None:
+      moment = moment.replace(tzinfo=None) - offset
+    return (calendar.timegm(moment.timetuple()) * _MICROSECONDS +
+            moment.microsecond)
+
+  @classmethod
+  def Coerce(cls, value):
+    if isinstance(value, datetime.datetime):
+      return cls._FromDatetime(value)
+    if isinstance(value, datetime.date):
+      return calendar.timegm(value.timetuple()) * _MICROSECONDS
+    if isinstance(value, (int, long, float)) and not isinstance(value, bool):
+      return int(value * _MICROSECONDS)
+    return super(Date, cls).Coerce(value)
+
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(us|ms|s|m|h|d|w)")
+_DURATION_UNITS = {"us": 1,
+                   "ms": 1000,
+                   "s": _MICROSECONDS,
+                   "m": 60 * _MICROSECONDS,
+                   "h": 3600 * _MICROSECONDS,
+                   "d": 86400 * _MICROSECONDS,
+                   "w": 7 * 86400 * _MICROSECONDS}
+
+
+class Duration(TypedLiteral):
+  """A length of time in microseconds.
+
+  Written as a sequence of numbers with units, like "90s", "1h30m" or "1.5d".
+  The units are us, ms, s, m, h, d and w.
+
+  Object values can be strings in the same format, timedelta objects or
+  numbers of seconds.
+  """
+
+  name = "duration"
+
+  @classmethod
+  def Parse(cls, text):
+    text = text.strip()
+    position = 0
+    total = 0
+    for match in _DURATION_RE.finditer(text):
+      if text[position:match.start()].strip():
+        break
+      total += float(match.group(1)) * _DURATION_UNITS[match.group(2)]
+      position = match.end()
+    if not position or text[position:].strip():
+      raise ValueError("%r is not a valid duration." % text)
+    return int(total)
+
+  @classmethod
+  def Coerce(cls, value):
+    if isinstance(value, datetime.timedelta):
+      return ((value.days * 86400 + value.seconds) * _MICROSECONDS +
+              value.microseconds)
+    if isinstance(value, (int, long, float)) and not isinstance(value, bool):
+      return int(value * _MICROSECONDS)
+    return super(Duration, cls).Coerce(value)
+
+
+# IPv4 addresses are mapped to ::ffff:a.b.c.d.
+_IPV4_MAPPED = 0xffff << 32
+_IPV4_PREFIX = 96
+
+
+def _PackedToInt(packed):
+  result = 0
+  for character in packed:
+    result = (result << 8) | ord(character)
+  return result
+
+
+class IPAddress(TypedLiteral):
+  """An IPv4 or IPv6 address as a 128 bit integer.
+
+  Object values can be strings or, for IPv4, integers below 2**32.
+  """
+
+  name = "ip"
+
+  @classmethod
+  def Parse(cls, text):
+    text = text.strip()
+    try:
+      if ":" in text:
+        return _PackedToInt(socket.inet_pton(socket.AF_INET6, text))
+      return _IPV4_MAPPED | _PackedToInt(socket.inet_pton(socket.AF_INET,
+                                                          text))
+    except (socket.error, UnicodeError):
+      raise ValueError("%r is not a valid IP address." % text)
+
+  @classmethod
+  def Coerce(cls, value):
+    if isinstance(value, (int, long)) and not isinstance(value, bool):
+      if 0 <= value < 2 ** 32:
+        return _IPV4_MAPPED | value
+      return None
+    return super(IPAddress, cls).Coerce(value)
+
+
+class CIDR(TypedLiteral):
+  """A range of IP addresses, as an inclusive (first, last) interval.
+
+  Written as an address and a prefix length, like "10.0.0.0/8" or
+  "fe80::/10". Host bits of the address are ignored and an address without
+  a prefix length is a range of one address.
+
+  Object values are coerced as IP addresses.
+  """
+
+  name = "cidr"
+
+  @classmethod
+  def Parse(cls, text):
+    address, _, prefix = text.strip().partition("/")
+    start = IPAddress.Parse(address)
+    if ":" in address:
+      maximum, extra = 128, 0
+    else:
+      maximum, extra = 32, _IPV4_PREFIX
+    if not prefix:
+      length = maximum
+    elif prefix.isdigit() and int(prefix) <= maximum:
+      length = int(prefix)
+    else:
+      raise ValueError("%r is not a valid CIDR range." % text)
+    host_bits = 128 - extra - length
+    start = start >> host_bits << host_bits
+    return (start, start + (1 << host_bits) - 1)
+
+  @classmethod
+  def Coerce(cls, value):
+    return IPAddress.Coerce(value)
+
+
+class CIDRSet(object):
+  """A set of IP address ranges for membership tests.
+
+  Ranges are merged into sorted, disjoint intervals which are searched with
+  bisect, so lookups take logarithmic time in the number of ranges.
+  """
+
+  def __init__(self, ranges):
+    """Constructor.
+
+    Args:
+      ranges: An iterable of CIDR literals, strings like "10.0.0.0/8" or
+        (first, last) tuples of encoded addresses.
+
+    Raises:
+      ValueError: If a range is not valid.
+    """
+    intervals = []
+    for item in ranges:
+      if isinstance(item, CIDR):
+        intervals.append(item.value)
+      elif isinstance(item, basestring):
+        intervals.append(CIDR.Parse(item))
+      else:
+        first, last = item
+        intervals.append((first, last))
+    intervals.sort()
+    self.starts = []
+    self.ends = []
+    for first, last in intervals:
+      if self.ends and first <= self.ends[-1] + 1:
+        self.ends[-1] = max(self.ends[-1], last)
+      else:
+        self.starts.append(first)
+        self.ends.append(last)
+
+  def __contains__(self, value):
+    index = bisect.bisect_right(self.starts, value) - 1
+    return index >= 0 and value <= self.ends[index]
+
+  def __iter__(self):
+    return iter(zip(self.starts, self.ends))
+
+  def __len__(self):
+    return len(self.starts)
+
+  def __repr__(self):
+    return "CIDRSet(%d ranges)" % len(self)
+
+
+# Typed literals by the name used in queries.
+TYPES = dict((cls.name, cls) for cls in (Date, Duration, IPAddress, CIDR))
+
+
+def Unwrap(operand):
+  """Converts an operand with typed literals to its encoding.
+
+  Args:
+    operand: A typed literal, a list of typed literals of the same type or any
+      other operand.
+
+  Returns:
+    A tuple of (operand, coerce). A literal becomes its value, a list of
+    literals the list of their values and CIDR ranges a CIDRSet. coerce is the
+    function that converts object values, or None if operand has no typed
+    literals.
+  """
+  if isinstance(operand, CIDR):
+    return CIDRSet([operand]), operand.Coerce
+  if isinstance(operand, TypedLiteral):
+    return operand.value, operand.Coerce
+  if (isinstance(operand, (list, tuple)) and operand and
+      isinstance(operand[0], TypedLiteral) and
+      all(type(item) is type(operand[0]) for item in operand)):
+    if isinstance(operand[0], CIDR):
+      return CIDRSet(operand), CIDR.Coerce
+    return [item.value for item in operand], operand[0].Coerce
+  return operand, None
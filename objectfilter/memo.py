@@ -0,0 +1,193 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Memoizing the conditions of contexts for shared sub-objects.
+
+A context evaluates its condition on every sub-object of every object. When
+objects share sub-objects, like processes loading the same dll objects, the
+condition is evaluated again for each parent. A ContextMemo remembers the
+result of each condition for each sub-object for the length of a batch:
+
+  compiled, memo = MemoizingCopy(compiled_filter)
+  with memo:
+    matching = [process for process in processes if compiled.Matches(process)]
+  memo.stats.HitRate()
+
+Sub-objects are recognized by identity, or by the value of a key function
+for sub-objects that are equal without being the same object. Sub-objects
+supporting weak references are not kept alive by the memo, and their results
+are forgotten when they are collected, so a new object reusing their id never
+gets them. Others are kept alive until the memo is cleared.
+
+Results are only valid while sub-objects don't change. Clear the memo, or
+leave its with block, between batches. Entries are evicted in insertion
+order when there are more than max_entries sub-objects.
+"""
+
+import collections
+import weakref
+
+import objectfilter
+
+
+class MemoStats(object):
+  """Statistics of a ContextMemo.
+
+  Attributes:
+    hits: The number of condition results returned from the memo.
+    misses: The number of conditions evaluated.
+    evictions: The number of sub-objects evicted to stay within max_entries.
+    collected: The number of sub-objects forgotten when they were collected.
+    entries: The number of sub-objects in the memo.
+  """
+
+  def __init__(self):
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    self.collected = 0
+    self.entries = 0
+
+  def HitRate(self):
+    lookups = self.hits + self.misses
+    return float(self.hits) / lookups if lookups else 0.0
+
+  def ToDict(self):
+    return {"hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "collected": self.collected,
+            "entries": self.entries,
+            "hit_rate": self.HitRate()}
+
+
+class ContextMemo(object):
+  """Results of the conditions of contexts by sub-object.
+
+  Attributes:
+    stats: The MemoStats of the memo since it was created.
+  """
+
+  def __init__(self, key=None, max_entries=100000):
+    """Constructor.
+
+    Args:
+      key: A function returning a hashable key for a sub-object. Sub-objects
+        with the same key share their results. By default, sub-objects are
+        recognized by identity.
+      max_entries: The maximum number of sub-objects to remember.
+    """
+    self.key = key
+    self.max_entries = max_entries
+    self.stats = MemoStats()
+    # Key of the sub-object to a dict of id(condition) to result.
+    self._results = collections.OrderedDict()
+    # id() of the sub-object to a weak reference to it, or the sub-object
+    # itself for those that don't support weak references.
+    self._refs = {}
+
+  def __len__(self):
+    return len(self._results)
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, unused_type, unused_value, unused_traceback):
+    self.Clear()
+
+  def _Forget(self, object_id, ref):
+    # Called when a sub-object is collected, unless the memo was cleared.
+    if self._refs.get(object_id) is ref:
+      del self._refs[object_id]
+      if self._results.pop(object_id, None) is not None:
+        self.stats.collected += 1
+        self.stats.entries = len(self._results)
+
+  def _Key(self, sub_object):
+    """Returns the key of sub_object, remembering it if new."""
+    if self.key is not None:
+      return self.key(sub_object)
+    object_id = id(sub_object)
+    ref = self._refs.get(object_id)
+    if ref is not None:
+      if ref is sub_object or (isinstance(ref, weakref.ref) and
+                               ref() is sub_object):
+        return object_id
+    # Results without a live reference belong to a collected object, whose
+    # weak reference callback didn't run yet, or to an evicted one.
+    self._results.pop(object_id, None)
+    try:
+      ref = weakref.ref(sub_object,
+                        lambda ref, memo=weakref.ref(self): (
+                            memo() is not None and
+                            memo()._Forget(object_id, ref)))
+    except TypeError:
+      ref = sub_object
+    self._refs[object_id] = ref
+    return object_id
+
+  def _Evict(self):
+    while len(self._results) > self.max_entries:
+      key, _ = self._results.popitem(last=False)
+      if self.key is None:
+        self._refs.pop(key, None)
+      self.stats.evictions += 1
+
+  def Matches(self, condition, sub_object):
+    """Returns condition.Matches(sub_object), evaluating it at most once."""
+    key = self._Key(sub_object)
+    results = self._results.get(key)
+    if results is None:
+      results = self._results[key] = {}
+    result = results.get(id(condition))
+    if result is not None:
+      self.stats.hits += 1
+      return result
+    self.stats.misses += 1
+    result = bool(condition.Matches(sub_object))
+    # The condition may have evicted or cleared entries of nested contexts.
+    self._results.setdefault(key, results)[id(condition)] = result
+    self._Evict()
+    self.stats.entries = len(self._results)
+    return result
+
+  def Clear(self):
+    """Forgets every result, usually after evaluating a batch."""
+    self._results.clear()
+    self._refs.clear()
+    self.stats.entries = 0
+
+
+def _Attach(filter_, memo):
+  children = [_Attach(child, memo) for child in filter_.Children()]
+  node = filter_.CopyWithChildren(children)
+  if isinstance(node, objectfilter.Context):
+    node.memo = memo
+  return node
+
+
+def MemoizingCopy(filter_, key=None, max_entries=100000):
+  """Returns a copy of filter_ whose contexts memoize their conditions.
+
+  Args:
+    filter_: A compiled filter.
+    key: The key function of the ContextMemo, identity by default.
+    max_entries: The maximum number of sub-objects to remember.
+
+  Returns:
+    A tuple of (filter copy, ContextMemo). filter_ is left untouched.
+  """
+  memo = ContextMemo(key=key, max_entries=max_entries)
+  return _Attach(filter_, memo), memo
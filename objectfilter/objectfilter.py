@@ -108,13 +108,21 @@ filter is easy. Three basic filter implementations are given:
 
 import abc
 import binascii
+import copy
 import logging
 import re
 
 import lexer
+import literals
+import operands
+import tracing
 import utils
 
 
+# Declared only here: setup.py reads it, and query caches are keyed on it.
+__version__ = "0.1.1"
+
+
 class Error(Exception):
   """Base module exception."""
 
@@ -131,6 +139,10 @@ class InvalidNumberOfOperands(Error):
   """The number of operands provided to this operator is wrong."""
 
 
+class MissingParameterError(Error):
+  """A query parameter was not given a value at compile time."""
+
+
 class Filter(object):
   """Base class for every filter."""
 
@@ -154,7 +166,8 @@ class Filter(object):
             self.value_expander_cls))
       self.value_expander = self.value_expander_cls()
     self.args = arguments or []
-    logging.debug("Adding %s", arguments)
+    if tracing.tracer:
+      tracing.tracer(tracing.NODE_CREATED, node=self)
 
   @abc.abstractmethod
   def Matches(self, obj):
@@ -164,6 +177,32 @@ class Filter(object):
     """Returns a list of objects that pass the filter."""
     return filter(self.Matches, objects)
 
+  def Children(self):
+    """Returns the filters that are arguments of this filter."""
+    return [arg for arg in self.args if isinstance(arg, Filter)]
+
+  def CopyWithChildren(self, children):
+    """Returns a shallow copy of this filter with its child filters replaced.
+
+    Args:
+      children: A list of filters, in the same order as returned by Children().
+
+    Returns:
+      A copy of this filter. Non-filter arguments are preserved.
+    """
+    children = iter(children)
+    result = copy.copy(self)
+    result.args = [next(children) if isinstance(arg, Filter) else arg
+                   for arg in self.args]
+    return result
+
+  def GetPaths(self):
+    """Returns the set of attribute paths this filter reads."""
+    paths = set()
+    for child in self.Children():
+      paths.update(child.GetPaths())
+    return paths
+
   def __str__(self):
     return "%s(%s)" % (self.__class__.__name__,
                        ", ".join([str(arg) for arg in self.args]))
@@ -176,8 +215,13 @@ class AndFilter(Filter):
   """
 
   def Matches(self, obj):
+    tracer = tracing.tracer
+    if tracer:
+      tracer(tracing.NODE_ENTERED, node=self, obj=obj)
     for child_filter in self.args:
       if not child_filter.Matches(obj):
+        if tracer:
+          tracer(tracing.SHORT_CIRCUIT, node=self, result=False)
         return False
     return True
 
@@ -190,8 +234,13 @@ class OrFilter(Filter):
 
   def Matches(self, obj):
     if not self.args: return True
+    tracer = tracing.tracer
+    if tracer:
+      tracer(tracing.NODE_ENTERED, node=self, obj=obj)
     for child_filter in self.args:
       if child_filter.Matches(obj):
+        if tracer:
+          tracer(tracing.SHORT_CIRCUIT, node=self, result=True)
         return True
     return False
 
@@ -205,6 +254,13 @@ class IdentityFilter(Operator):
     return True
 
 
+class FalseFilter(Operator):
+  """Matches no object, like a filter folded to false."""
+
+  def Matches(self, _):
+    return False
+
+
 class UnaryOperator(Operator):
   """Base class for unary operators."""
 
@@ -224,6 +280,10 @@ class BinaryOperator(Operator):
   The left operand is always a path into the object which will be expanded for
   values. The right operand is a value defined at initialization and is stored
   at self.right_operand.
+
+  Typed literals in the right operand are replaced by their encoded value and
+  self.coerce is set to the function that converts expanded values to the same
+  encoding. It's None for other operands.
   """
 
   def __init__(self, arguments=None, **kwargs):
@@ -233,7 +293,10 @@ class BinaryOperator(Operator):
                                     "Received %d." % (self.__class__.__name__,
                                                       len(self.args)))
     self.left_operand = self.args[0]
-    self.right_operand = self.args[1]
+    self.right_operand, self.coerce = literals.Unwrap(self.args[1])
+
+  def GetPaths(self):
+    return set([self.left_operand])
 
 
 class GenericBinaryOperator(BinaryOperator):
@@ -244,11 +307,19 @@ class GenericBinaryOperator(BinaryOperator):
 
   def Operate(self, values):
     """Takes a list of values and if at least one matches, returns True."""
+    if self.coerce:
+      values = [value for value in map(self.coerce, values)
+                if value is not None]
+    tracer = tracing.tracer
     for val in values:
       try:
-        logging.debug("Operating %s with x=%s and y=%s",
-                      self.__class__.__name__, val, self.right_operand)
-        if self.Operation(val, self.right_operand):
+        result = self.Operation(val, self.right_operand)
+        if tracer:
+          tracer(tracing.VALUE_COMPARED, node=self, value=val,
+                 operand=self.right_operand, result=result)
+        if result:
+          if tracer:
+            tracer(tracing.SHORT_CIRCUIT, node=self, result=True)
           return True
         else:
           continue
@@ -257,6 +328,8 @@ class GenericBinaryOperator(BinaryOperator):
     return False
 
   def Matches(self, obj):
+    if tracing.tracer:
+      tracing.tracer(tracing.NODE_ENTERED, node=self, obj=obj)
     key = self.left_operand
     values = self.value_expander.Expand(obj, key)
     if values and self.Operate(values):
@@ -328,8 +401,12 @@ class InSet(GenericBinaryOperator):
 
   def Operation(self, x, y):
     """Whether x is a subset of y."""
-    if x in y:
-      return True
+    try:
+      if x in y:
+        return True
+    except TypeError:
+      # x is unhashable and y is a set.
+      pass
 
     # x might be an iterable
     # first we need to skip strings or we'll do silly things like matching a
@@ -361,7 +438,6 @@ class Regexp(GenericBinaryOperator):
 
   def __init__(self, *children, **kwargs):
     super(Regexp, self).__init__(*children, **kwargs)
-    logging.debug("Compiled: %s", self.right_operand)
     try:
       self.compiled_re = re.compile(utils.SmartUnicode(self.right_operand))
     except re.error:
@@ -377,6 +453,85 @@ class Regexp(GenericBinaryOperator):
     return False
 
 
+class InCIDR(GenericBinaryOperator):
+  """Whether the value is an IP address in the CIDR ranges of the operand.
+
+  The right operand can be cidr() literals or strings like "10.0.0.0/8".
+  """
+
+  def __init__(self, *children, **kwargs):
+    super(InCIDR, self).__init__(*children, **kwargs)
+    operand = self.right_operand
+    if not isinstance(operand, literals.CIDRSet):
+      if isinstance(operand, basestring):
+        operand = [operand]
+      try:
+        self.right_operand = literals.CIDRSet(operand)
+      except (TypeError, ValueError):
+        raise ValueError("%r is not a valid set of CIDR ranges." %
+                         (self.args[1],))
+    self.coerce = literals.CIDR.Coerce
+
+  def Operation(self, x, y):
+    return x in y
+
+
+class NotInCIDR(InCIDR):
+  """Whether no value is an IP address in the CIDR ranges of the operand."""
+
+  def Operate(self, values):
+    return not super(NotInCIDR, self).Operate(values)
+
+
+class DateOperator(GenericBinaryOperator):
+  """Base class for operators comparing points in time.
+
+  Strings in the right operand are parsed as date() literals.
+  """
+
+  def __init__(self, *children, **kwargs):
+    super(DateOperator, self).__init__(*children, **kwargs)
+    self.right_operand = self.ParseDates(self.right_operand)
+
+  def ParseDates(self, operand):
+    if self.coerce is None and isinstance(operand, basestring):
+      self.coerce = literals.Date.Coerce
+      return literals.Date.Parse(operand)
+    return operand
+
+
+class Before(DateOperator):
+  """Whether the expanded value is earlier than right_operand."""
+
+  def Operation(self, x, y):
+    return x < y
+
+
+class After(DateOperator):
+  """Whether the expanded value is later than right_operand."""
+
+  def Operation(self, x, y):
+    return x > y
+
+
+class Between(DateOperator):
+  """Whether the expanded value is within the inclusive [low, high] operand."""
+
+  def ParseDates(self, operand):
+    if not isinstance(operand, (list, tuple)) or len(operand) != 2:
+      raise ValueError("between needs a list of two bounds.")
+    if any(isinstance(bound, literals.TypedLiteral) for bound in operand):
+      raise ValueError("The bounds of between must be of the same type.")
+    if (self.coerce is None and
+        all(isinstance(bound, basestring) for bound in operand)):
+      self.coerce = literals.Date.Coerce
+      return [literals.Date.Parse(bound) for bound in operand]
+    return operand
+
+  def Operation(self, x, y):
+    return y[0] <= x <= y[1]
+
+
 class Context(Operator):
   """Restricts the child operators to a specific context within the object.
 
@@ -439,24 +594,53 @@ class Context(Operator):
   object and returning the right result.
   """
 
+  # An optional memo of the results of the condition by sub-object, see
+  # memo.ContextMemo.
+  memo = None
+
   def __init__(self, arguments=None, **kwargs):
     if len(arguments) != 2:
       raise InvalidNumberOfOperands("Context accepts only 2 operands.")
     super(Context, self).__init__(arguments=arguments, **kwargs)
     self.context, self.condition = self.args
 
+  def CopyWithChildren(self, children):
+    result = super(Context, self).CopyWithChildren(children)
+    result.context, result.condition = result.args
+    return result
+
+  def GetPaths(self):
+    return _PrefixPaths(self.context, self.condition.GetPaths())
+
   def Matches(self, obj):
-    logging.debug("Expanding context: %s", self.context)
+    tracer = tracing.tracer
+    if tracer:
+      tracer(tracing.NODE_ENTERED, node=self, obj=obj)
+    memo = self.memo
     for object_list in self.value_expander.Expand(obj, self.context):
       for sub_object in object_list:
-        logging.debug("Trying to match condition: '%s' on '%s'",
-                      self.condition,
-                      sub_object)
-        if self.condition.Matches(sub_object):
+        if memo is None:
+          matched = self.condition.Matches(sub_object)
+        else:
+          matched = memo.Matches(self.condition, sub_object)
+        if matched:
+          if tracer:
+            tracer(tracing.SHORT_CIRCUIT, node=self, result=True)
           return True
     return False
 
 
+def _PrefixPaths(prefix, paths):
+  """Returns paths relative to prefix as absolute paths.
+
+  A context that reads no paths below it still reads the prefix itself.
+  """
+  if not paths:
+    return set([prefix])
+  return set(ValueExpander.FIELD_SEPARATOR.join([prefix, path])
+             for path in paths)
+
+
 OP2FN = {"equals": Equals,
          "is": Equals,
          "==": Equals,
@@ -472,6 +656,11 @@ OP2FN = {"equals": Equals,
          "inset": InSet,
          "notinset": NotInSet,
          "regexp": Regexp,
+         "incidr": InCIDR,
+         "notincidr": NotInCIDR,
+         "before": Before,
+         "after": After,
+         "between": Between,
         }
 
 
@@ -480,14 +669,25 @@ class ValueExpander(object):
 
   Once instantiated and called, this class returns all the values that follow a
   given field path.
+
+  The attribute names of every path string are computed once per expander, so
+  splitting the path and _GetAttributeName() aren't repeated for every object.
   """
 
   FIELD_SEPARATOR = "."
 
+  def __init__(self):
+    # Attribute names to fetch, by path string.
+    self._attribute_names = {}
+
   def _GetAttributeName(self, path):
     """Returns the attribute name to fetch given a path."""
     return path[0]
 
+  def _GetAttributeNames(self, path):
+    """Returns the attribute names to fetch for every segment of a path."""
+    return [self._GetAttributeName(path[i:]) for i in xrange(len(path))]
+
   def _GetValue(self, obj, attr_name):
     """Returns the value of tha attribute attr_name."""
     raise NotImplementedError()
@@ -506,10 +706,10 @@ class ValueExpander(object):
       else:
         # If it's an iterable, we recurse on each value.
         for sub_obj in attr_value:
-          for value in self.Expand(sub_obj, path[1:]):
+          for value in self._ExpandNames(sub_obj, path[1:]):
             yield value
     except TypeError:  # This is then not iterable, we recurse with the value
-      for value in self.Expand(attr_value, path[1:]):
+      for value in self._ExpandNames(attr_value, path[1:]):
         yield value
 
   def Expand(self, obj, path):
@@ -527,22 +727,29 @@ class ValueExpander(object):
       obj: An object that will be traversed for the given path
       path: A list of strings
 
-    Yields:
-      The values once the object is traversed.
+    Returns:
+      An iterator of the values once the object is traversed.
     """
     if isinstance(path, basestring):
-      path = path.split(self.FIELD_SEPARATOR)
+      names = self._attribute_names.get(path)
+      if names is None:
+        names = self._GetAttributeNames(path.split(self.FIELD_SEPARATOR))
+        self._attribute_names[path] = names
+    else:
+      names = self._GetAttributeNames(path)
+    return self._ExpandNames(obj, names)
 
-    attr_name = self._GetAttributeName(path)
-    attr_value = self._GetValue(obj, attr_name)
+  def _ExpandNames(self, obj, names):
+    """Yields the values of a path given as the attribute names to fetch."""
+    attr_value = self._GetValue(obj, names[0])
     if attr_value is None:
       return
 
-    if len(path) == 1:
+    if len(names) == 1:
       for value in self._AtLeaf(attr_value):
         yield value
     else:
-      for value in self._AtNonLeaf(attr_value, path):
+      for value in self._AtNonLeaf(attr_value, names):
         yield value
 
 
@@ -568,14 +775,63 @@ class DictValueExpander(ValueExpander):
 
 
 ### PARSER DEFINITION
+class Parameter(object):
+  """A bind parameter in a query, like :iocs, given a value at compile time."""
+
+  def __init__(self, name):
+    self.name = name
+
+  def __eq__(self, other):
+    return isinstance(other, Parameter) and self.name == other.name
+
+  def __ne__(self, other):
+    return not self == other
+
+  def __hash__(self):
+    return hash(self.name)
+
+  def __repr__(self):
+    return ":%s" % self.name
+
+
+# Operators whose parameter values are stored as compact sets.
+SET_OPERATORS = (InSet, NotInSet)
+
+
 class BasicExpression(lexer.Expression):
-  def Compile(self, filter_implementation):
+  def BindArgs(self, parameters=None):
+    """Returns the arguments with parameters replaced by their values.
+
+    Args:
+      parameters: A dict of parameter name to value.
+
+    Returns:
+      A list of arguments. Values of parameters used with set operators are
+      converted with operands.CompactSet().
+
+    Raises:
+      MissingParameterError: If a parameter has no value.
+    """
+    args = []
+    set_operator = issubclass(OP2FN.get(self.operator.lower(), Operator),
+                              SET_OPERATORS)
+    for arg in self.args:
+      if isinstance(arg, Parameter):
+        if not parameters or arg.name not in parameters:
+          raise MissingParameterError("No value for parameter %r." % arg)
+        arg = parameters[arg.name]
+        if set_operator and isinstance(arg, (list, tuple, set, frozenset)):
+          arg = operands.CompactSet(arg)
+      args.append(arg)
+    return args
+
+  def Compile(self, filter_implementation, parameters=None):
     arguments = [self.attribute]
     op_str = self.operator.lower()
     operator = filter_implementation.OPS.get(op_str, None)
     if not operator:
       raise ParseError("Unknown operator %s provided." % self.operator)
-    arguments.extend(self.args)
+    arguments.extend(self.BindArgs(parameters))
     expander = filter_implementation.FILTERS["ValueExpander"]
     return operator(arguments=arguments, value_expander=expander)
 
@@ -593,16 +849,22 @@ class ContextExpression(lexer.Expression):
     return "Context(%s %s)" % (
         self.attribute, [str(x) for x in self.args])
 
+  def GetPaths(self):
+    paths = set()
+    for arg in self.args:
+      paths.update(arg.GetPaths())
+    return _PrefixPaths(self.attribute, paths)
+
   def SetExpression(self, expression):
     if isinstance(expression, lexer.Expression):
       self.args = [expression]
     else:
       raise ParseError("Expected expression, got %s" % expression)
 
-  def Compile(self, filter_implementation):
+  def Compile(self, filter_implementation, parameters=None):
     arguments = [self.attribute]
     for arg in self.args:
-      arguments.append(arg.Compile(filter_implementation))
+      arguments.append(arg.Compile(filter_implementation, parameters))
     expander = filter_implementation.FILTERS["ValueExpander"]
     context_cls = filter_implementation.FILTERS["Context"]
     return context_cls(arguments=arguments,
@@ -610,7 +872,7 @@ class ContextExpression(lexer.Expression):
 
 
 class BinaryExpression(lexer.BinaryExpression):
-  def Compile(self, filter_implemention):
+  def Compile(self, filter_implemention, parameters=None):
     """Compile the binary expression into a filter object."""
     operator = self.operator.lower()
     if operator == "and" or operator == "&&":
@@ -620,15 +882,20 @@ class BinaryExpression(lexer.BinaryExpression):
     else:
       raise ParseError("Invalid binary operator %s" % operator)
 
-    args = [x.Compile(filter_implemention) for x in self.args]
+    args = [x.Compile(filter_implemention, parameters) for x in self.args]
     return filter_implemention.FILTERS[method](arguments=args)
 
 
 class IdentityExpression(lexer.Expression):
-  def Compile(self, filter_implementation):
+  def Compile(self, filter_implementation, parameters=None):
     return filter_implementation.FILTERS["IdentityFilter"]()
 
 
+# A typed literal argument, like ip("10.0.0.1").
+TYPED_LITERAL = (r"(%s)\(\s*(?:\"([^\"]*)\"|'([^']*)')\s*\)" %
+                 "|".join(sorted(literals.TYPES)))
+
+
 class Parser(lexer.SearchParser):
   """Parses and generates an AST for a query written in the described language.
 
@@ -636,6 +903,16 @@ class Parser(lexer.SearchParser):
     size is 40
     (name contains "Program Files" AND hash.md5 is "123abc")
     @imported_modules (num_symbols = 14 AND symbol.name is "FindWindow")
+    hash.md5 inset :iocs
+    mtime between [date("2013-01-01"), date("2013-02-01")]
+    src_ip incidr [cidr("10.0.0.0/8"), cidr("192.168.0.0/16")]
+
+  Arguments like :iocs are bind parameters. Their values are passed to
+  Compile() in the parameters dict, keeping the query text short and the
+  parsed query reusable.
+
+  Arguments like date("...") are typed literals, see the literals module. The
+  available types are date, duration, ip and cidr.
   """
   expression_cls = BasicExpression
   binary_expression_cls = BinaryExpression
@@ -672,12 +949,15 @@ class Parser(lexer.SearchParser):
       lexer.Token("ARGORLIST", r"[^\s\[]", "PushBack", "ARG"),
       lexer.Token("LISTARG", r"\]", "ListFinish", "ANDOR"),
       lexer.Token("LISTARG", r",", "", "LISTARG"),
+      lexer.Token("LISTARG", TYPED_LITERAL, "InsertTypedArg", ""),
       lexer.Token("LISTARG", r"(\d+\.\d+)", "InsertFloatArg", ""),
       lexer.Token("LISTARG", r"(0x\d+)", "InsertInt16Arg", ""),
       lexer.Token("LISTARG", r"(\d+)", "InsertIntArg", ""),
       lexer.Token("LISTARG", "\"", "PushState,StringStart", "STRING"),
       lexer.Token("LISTARG", "'", "PushState,StringStart", "SQ_STRING"),
 
+      lexer.Token("ARG", r":(\w+)", "InsertParameterArg", "ANDOR"),
+      lexer.Token("ARG", TYPED_LITERAL, "InsertTypedArg", "ANDOR"),
       lexer.Token("ARG", r"(\d+\.\d+)", "InsertFloatArg", "ANDOR"),
       lexer.Token("ARG", r"(0x\d+)", "InsertInt16Arg", "ANDOR"),
       lexer.Token("ARG", r"(\d+)", "InsertIntArg", "ANDOR"),
@@ -705,8 +985,6 @@ class Parser(lexer.SearchParser):
 
   def InsertArg(self, string="", **_):
     """Insert an arg to the current expression."""
-    logging.debug("Storing Argument %s", string)
-
     if self.state == "LISTARG":
       self.current_expression.args[0].append(string)
     # This expression is complete
@@ -740,6 +1018,19 @@ class Parser(lexer.SearchParser):
     except (TypeError, ValueError):
       raise ParseError("%s is not a valid base16 integer." % string)
 
+  def InsertParameterArg(self, string="", match=None, **_):
+    """Inserts a bind parameter argument."""
+    return self.InsertArg(Parameter(match.group(1)))
+
+  def InsertTypedArg(self, string="", match=None, **_):
+    """Inserts a typed literal argument, like date("2013-01-01")."""
+    name, double_quoted, single_quoted = match.groups()
+    text = double_quoted if double_quoted is not None else single_quoted
+    try:
+      return self.InsertArg(literals.TYPES[name.lower()](text))
+    except ValueError as e:
+      raise ParseError(str(e))
+
   def StringFinish(self, **_):
     if self.state == "ATTRIBUTE":
       return self.StoreAttribute(string=self.string)
@@ -765,7 +1056,6 @@ class Parser(lexer.SearchParser):
 
   def HexEscape(self, string, match, **_):
     """Converts a hex escaped string."""
-    logging.debug("HexEscape matched %s", string)
     hex_string = match.group(1)
     try:
       self.string += binascii.unhexlify(hex_string)
@@ -817,8 +1107,6 @@ class Parser(lexer.SearchParser):
         self.stack[i].AddOperands(lhs, rhs)
         self.stack[i-1] = None
         self.stack[i+1] = None
-        logging.debug("i %d", i)
-        logging.debug("BinaryExpression: %s", self.stack[i])
 
     self.stack = filter(None, self.stack)
 
@@ -831,9 +1119,6 @@ class Parser(lexer.SearchParser):
         context = self.stack[i]
         context.SetExpression(self.stack[i+1])
         self.stack[i+1] = None
-        logging.debug("i %d", i)
-        logging.debug("ContextExpression: %s", self.stack[i-1])
-        logging.debug("self.stack[i-1] = %s", self.stack[i-2])
 
     self.stack = filter(None, self.stack)
 
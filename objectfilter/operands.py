@@ -0,0 +1,354 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Compact operand types for set membership operators.
+
+InSet and NotInSet only need membership tests and iteration from their right
+operand. Large sets of values, usually supplied through bind parameters, are
+stored in these types instead of Python lists.
+
+For sets with millions of entries, like hash IOC lists, MappedSortedSet keeps
+the values in a file of sorted fixed-width records that is memory-mapped, so
+every process using the set shares it through the OS page cache:
+
+  BuildMappedSet("md5.set", open("md5.txt"), kind=KIND_HEX)
+  iocs = MappedSortedSet("md5.set")
+  compiled = Parser("md5 inset :iocs").Parse().Compile(
+      DictFilterImplementation, {"iocs": iocs})
+
+The same files can be built from the command line:
+
+  python -m objectfilter.operands --kind hex md5.txt md5.set
+"""
+
+import argparse
+import array
+import binascii
+import bisect
+import heapq
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+
+# The array typecode for native signed longs, 8 bytes on 64 bit platforms.
+_LONG_TYPECODE = "l"
+_LONG_BITS = array.array(_LONG_TYPECODE).itemsize * 8
+
+
+class SortedArraySet(object):
+  """An immutable set of integers stored in a sorted array.
+
+  Uses one machine word per value, instead of the ~60 bytes of a Python int in
+  a frozenset, and answers membership tests by binary search.
+  """
+
+  def __init__(self, values):
+    self.values = array.array(_LONG_TYPECODE, sorted(set(values)))
+
+  def __contains__(self, value):
+    index = bisect.bisect_left(self.values, value)
+    return index < len(self.values) and self.values[index] == value
+
+  def __iter__(self):
+    return iter(self.values)
+
+  def __len__(self):
+    return len(self.values)
+
+  def __repr__(self):
+    return "SortedArraySet(%d values)" % len(self)
+
+
+def _IsInteger(value):
+  return (isinstance(value, (int, long)) and not isinstance(value, bool) and
+          -2 ** (_LONG_BITS - 1) <= value < 2 ** (_LONG_BITS - 1))
+
+
+def CompactSet(values):
+  """Returns the most compact set type able to hold values.
+
+  Args:
+    values: An iterable of values.
+
+  Returns:
+    A SortedArraySet if every value fits in a long, otherwise a frozenset
+    if every value is hashable, otherwise a list of the values.
+  """
+  values = list(values)
+  if values and all(_IsInteger(value) for value in values):
+    return SortedArraySet(values)
+  try:
+    return frozenset(values)
+  except TypeError:
+    return values
+
+
+class Error(Exception):
+  """Module exception."""
+
+
+class FormatError(Error):
+  """A mapped set file is malformed."""
+
+
+# Kinds of values stored by a MappedSortedSet.
+KIND_HEX = 0  # Hex strings, like hash digests, stored as raw bytes.
+KIND_INT = 1  # 64 bit signed integers.
+
+_MAGIC = "OFSET\x00\x00\x01"
+# Magic, kind, record width and number of records.
+_HEADER = struct.Struct(">8sIIQ")
+_INT = struct.Struct(">Q")
+_INT_BIAS = 2 ** 63
+
+
+def _EncodeHex(value, width):
+  """Returns the raw bytes of a hex string of width bytes or None."""
+  if not isinstance(value, basestring) or len(value) != width * 2:
+    return None
+  try:
+    return binascii.unhexlify(value)
+  except (TypeError, ValueError, UnicodeError):
+    return None
+
+
+def _EncodeInt(value):
+  """Returns a 64 bit integer as bytes that sort in numeric order, or None."""
+  if isinstance(value, bool):
+    return None
+  if isinstance(value, float):
+    if not value.is_integer():
+      return None
+    value = int(value)
+  if not isinstance(value, (int, long)):
+    return None
+  if not -_INT_BIAS <= value < _INT_BIAS:
+    return None
+  return _INT.pack(value + _INT_BIAS)
+
+
+class MappedSortedSet(object):
+  """A read-only set of hex strings or integers in a memory-mapped file.
+
+  Membership is tested by binary search over the sorted records, without
+  loading the file into Python objects. Pickling a MappedSortedSet only stores
+  its path, so worker processes map the same file instead of copying it.
+  """
+
+  def __init__(self, path):
+    self.path = path
+    self._Open()
+
+  def _Open(self):
+    with open(self.path, "rb") as fd:
+      self._buffer = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(self._buffer) < _HEADER.size:
+      raise FormatError("%s is too short to be a mapped set." % self.path)
+    magic, self.kind, self.width, self.count = _HEADER.unpack_from(
+        self._buffer)
+    if magic != _MAGIC or self.kind not in (KIND_HEX, KIND_INT):
+      raise FormatError("%s is not a mapped set." % self.path)
+    if len(self._buffer) != _HEADER.size + self.width * self.count:
+      raise FormatError("%s is truncated." % self.path)
+
+  def _Encode(self, value):
+    if self.kind == KIND_HEX:
+      return _EncodeHex(value, self.width)
+    return _EncodeInt(value)
+
+  def _Decode(self, record):
+    if self.kind == KIND_HEX:
+      return binascii.hexlify(record)
+    return _INT.unpack(record)[0] - _INT_BIAS
+
+  def _Record(self, index):
+    offset = _HEADER.size + index * self.width
+    return self._buffer[offset:offset + self.width]
+
+  def __contains__(self, value):
+    key = self._Encode(value)
+    if key is None:
+      return False
+    low, high = 0, self.count
+    while low < high:
+      middle = (low + high) // 2
+      record = self._Record(middle)
+      if record < key:
+        low = middle + 1
+      elif record > key:
+        high = middle
+      else:
+        return True
+    return False
+
+  def __iter__(self):
+    for index in xrange(self.count):
+      yield self._Decode(self._Record(index))
+
+  def __len__(self):
+    return self.count
+
+  def __getstate__(self):
+    return {"path": self.path}
+
+  def __setstate__(self, state):
+    self.path = state["path"]
+    self._Open()
+
+  def Close(self):
+    self._buffer.close()
+
+  def __repr__(self):
+    return "MappedSortedSet(%r, %d values)" % (self.path, self.count)
+
+
+def _SortedRuns(records, run_size, temp_dir):
+  """Writes records in sorted runs to temporary files and returns them."""
+  runs = []
+  run = []
+  for record in records:
+    run.append(record)
+    if len(run) >= run_size:
+      runs.append(_WriteRun(run, temp_dir))
+      run = []
+  if run or not runs:
+    runs.append(_WriteRun(run, temp_dir))
+  return runs
+
+
+def _WriteRun(run, temp_dir):
+  run.sort()
+  fd = tempfile.TemporaryFile(dir=temp_dir)
+  fd.write("".join(run))
+  fd.seek(0)
+  return fd
+
+
+def _ReadRun(fd, width):
+  while True:
+    record = fd.read(width)
+    if not record:
+      return
+    yield record
+
+
+def BuildMappedSet(path, values, kind=KIND_HEX, width=None,
+                   run_size=1000000):
+  """Writes a file that can be opened with MappedSortedSet.
+
+  Values are sorted in runs of run_size records that are merged from
+  temporary files, so memory use does not depend on the number of values.
+
+  Args:
+    path: The file to write.
+    values: An iterable of hex strings or integers. Surrounding whitespace of
+      strings is ignored.
+    kind: KIND_HEX or KIND_INT.
+    width: For KIND_HEX, the size in bytes of each value. Taken from the first
+      value by default.
+    run_size: The number of records sorted in memory at a time.
+
+  Returns:
+    The number of distinct values written.
+
+  Raises:
+    Error: If a value can not be stored in the set.
+  """
+  values = iter(values)
+  if kind == KIND_INT:
+    width = _INT.size
+    encode = _EncodeInt
+  elif kind == KIND_HEX:
+    first = []
+    if width is None:
+      for value in values:
+        first.append(value.strip())
+        width = len(first[0]) // 2
+        break
+    values = _Chain(first, values)
+    encode = lambda value: _EncodeHex(value.strip(), width)
+  else:
+    raise Error("Unknown kind %r." % kind)
+
+  def Records():
+    for value in values:
+      record = encode(value)
+      if record is None:
+        raise Error("Can not store %r in the set." % (value,))
+      yield record
+
+  directory = os.path.dirname(os.path.abspath(path))
+  runs = _SortedRuns(Records(), run_size, directory)
+  # No values were given to guess the width from.
+  width = width or 0
+  temp_fd, temp_path = tempfile.mkstemp(dir=directory)
+  count = 0
+  try:
+    with os.fdopen(temp_fd, "wb") as out:
+      out.write(_HEADER.pack(_MAGIC, kind, width, 0))
+      previous = None
+      for record in heapq.merge(*[_ReadRun(run, width) for run in runs]):
+        if record != previous:
+          out.write(record)
+          count += 1
+          previous = record
+      out.seek(0)
+      out.write(_HEADER.pack(_MAGIC, kind, width, count))
+    os.rename(temp_path, path)
+  except:
+    os.unlink(temp_path)
+    raise
+  finally:
+    for run in runs:
+      run.close()
+  return count
+
+
+def _Chain(first, rest):
+  for value in first:
+    yield value
+  for value in rest:
+    yield value
+
+
+def main(argv=None):
+  """Builds a mapped set file from files with one value per line."""
+  parser = argparse.ArgumentParser(
+      description="Builds a memory-mapped set for inset/notinset operands.")
+  parser.add_argument("--kind", choices=["hex", "int"], default="hex")
+  parser.add_argument("inputs", nargs="+",
+                      help="Files with one value per line, - for stdin.")
+  parser.add_argument("output", help="The set file to write.")
+  args = parser.parse_args(argv)
+
+  def Values():
+    for name in args.inputs:
+      fd = sys.stdin if name == "-" else open(name, "rb")
+      for line in fd:
+        line = line.strip()
+        if line:
+          yield int(line, 0) if args.kind == "int" else line
+
+  kind = KIND_INT if args.kind == "int" else KIND_HEX
+  count = BuildMappedSet(args.output, Values(), kind=kind)
+  sys.stderr.write("Wrote %d values to %s\n" % (count, args.output))
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,188 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Sorting the objects matching a filter, with an optional limit.
+
+  largest = Sort(compiled_filter, processes, ["-memory", "name"], limit=100)
+
+Paths are sorted in ascending order, or descending if prefixed with "-".
+With a limit, only the best limit objects are kept in a bounded heap, so
+memory doesn't grow with the number of objects.
+
+A path with several values is reduced to one: its smallest value when sorting
+in ascending order and its largest when descending, unless reduction is given.
+List values are reduced the same way.
+Objects without values for a path sort after all others, in either direction.
+Objects with equal keys keep their input order.
+"""
+
+import heapq
+
+import expansions
+import objectfilter
+
+
+class Error(objectfilter.Error):
+  """Base module exception."""
+
+
+class InvalidOrderError(Error):
+  """An ordering is malformed."""
+
+
+class _Reversed(object):
+  """Wraps a value to invert its ordering."""
+
+  __slots__ = ("value",)
+
+  def __init__(self, value):
+    self.value = value
+
+  def __lt__(self, other):
+    return other.value < self.value
+
+  def __eq__(self, other):
+    return self.value == other.value
+
+
+REDUCTIONS = {"min": min, "max": max}
+
+
+class OrderBy(object):
+  """Computes sort keys for objects from a list of paths.
+
+  Attributes:
+    paths: A list of (path, descending, reduction function) tuples.
+  """
+
+  def __init__(self, order_by, reduction=None):
+    """Constructor.
+
+    Args:
+      order_by: A list of paths, each prefixed with "-" to sort in
+        descending order.
+      reduction: "min" or "max", to reduce paths with several values for
+        every path regardless of its direction.
+
+    Raises:
+      InvalidOrderError: If order_by or reduction are not valid.
+    """
+    if not order_by:
+      raise InvalidOrderError("No paths to order by.")
+    if reduction is not None and reduction not in REDUCTIONS:
+      raise InvalidOrderError("Unknown reduction %r." % reduction)
+    self.paths = []
+    for path in order_by:
+      descending = path.startswith("-")
+      path = path.lstrip("-")
+      if not path:
+        raise InvalidOrderError("Empty path in %r." % (order_by,))
+      default = "max" if descending else "min"
+      self.paths.append((path, descending,
+                         REDUCTIONS[reduction or default]))
+
+  def Key(self, obj, value_expander):
+    """Returns the sort key of obj."""
+    key = []
+    for path, descending, reduce_values in self.paths:
+      values = []
+      for value in value_expander.Expand(obj, path):
+        if isinstance(value, (list, tuple)):
+          values.extend(value)
+        else:
+          values.append(value)
+      if not values:
+        key.append((1, None))
+        continue
+      value = reduce_values(values)
+      key.append((0, _Reversed(value) if descending else value))
+    return key
+
+
+class TopK(object):
+  """Keeps the first limit objects matching a filter in sort order.
+
+  Attributes:
+    filter: The copy of the filter sharing its expansions.
+    cache: The ExpansionCache of filter.
+    seen: The number of objects added.
+    matched: The number of objects that matched the filter.
+  """
+
+  def __init__(self, filter_, order_by, limit=None, reduction=None,
+               filter_implementation=None):
+    """Constructor.
+
+    Args:
+      filter_: A compiled filter.
+      order_by: A list of paths, see OrderBy.
+      limit: The number of objects to keep, or None to keep every match.
+      reduction: See OrderBy.
+      filter_implementation: The implementation filter_ was compiled with. Its
+        value expander reads the paths when no node of filter_ has one.
+    """
+    self.order_by = OrderBy(order_by, reduction=reduction)
+    self.limit = limit
+    self.filter, self.cache = expansions.CachingCopy(filter_,
+                                                     filter_implementation)
+    # Heap of (inverted (key, sequence), object) with the worst entry first.
+    self.heap = []
+    self.seen = 0
+    self.matched = 0
+
+  def Add(self, obj):
+    """Adds obj if it matches the filter. Returns whether it matched."""
+    sequence = self.seen
+    self.seen += 1
+    self.cache.Clear()
+    try:
+      if not self.filter.Matches(obj):
+        return False
+      self.matched += 1
+      key = self.order_by.Key(obj, self.cache)
+    finally:
+      self.cache.Clear()
+    self.AddWithKey(key, sequence, obj)
+    return True
+
+  def AddWithKey(self, key, sequence, obj):
+    """Adds obj with a precomputed key and input position."""
+    entry = (_Reversed((key, sequence)), obj)
+    if self.limit is None or len(self.heap) < self.limit:
+      heapq.heappush(self.heap, entry)
+    elif self.limit and entry[0].value < self.heap[0][0].value:
+      heapq.heapreplace(self.heap, entry)
+
+  def Entries(self):
+    """Returns the kept (key, sequence, object) tuples in sort order."""
+    entries = sorted((inverted.value, obj) for inverted, obj in self.heap)
+    return [(key, sequence, obj) for (key, sequence), obj in entries]
+
+  def Results(self):
+    """Returns the kept objects in sort order."""
+    return [obj for _, _, obj in self.Entries()]
+
+
+def Sort(filter_, objects, order_by, limit=None, reduction=None,
+         filter_implementation=None):
+  """Returns the objects matching filter_ sorted by order_by.
+
+  See TopK for the arguments.
+  """
+  top = TopK(filter_, order_by, limit=limit, reduction=reduction,
+             filter_implementation=filter_implementation)
+  for obj in objects:
+    top.Add(obj)
+  return top.Results()
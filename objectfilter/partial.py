@@ -0,0 +1,102 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Partial evaluation of filters against fields with known values.
+
+When every object of a batch shares the values of some fields, like the host
+they were collected from, the operators reading those fields give the same
+result for the whole batch. PartiallyEvaluate() folds them into constants and
+simplifies the filter around them:
+
+  residual = PartiallyEvaluate(compiled_filter,
+                               {"os": "windows", "arch": "x64"})
+  if Constant(residual) is False:
+    skip the batch
+  else:
+    matching = residual.Filter(batch)
+
+The residual filter matches an object exactly when the original filter does,
+for every object with those values. Known values are given as Expand()
+would return them for a leaf path: a single value, which may be a list, or
+None if the path is missing. Paths are matched as written in the query.
+Conditions inside contexts are relative to sub-objects and are left as is.
+"""
+
+import objectfilter
+
+
+def Constant(filter_):
+  """Returns True or False for constant filters, None otherwise."""
+  if isinstance(filter_, objectfilter.IdentityFilter):
+    return True
+  if isinstance(filter_, objectfilter.FalseFilter):
+    return False
+  return None
+
+
+def _Fold(value):
+  if value:
+    return objectfilter.IdentityFilter()
+  return objectfilter.FalseFilter()
+
+
+def PartiallyEvaluate(filter_, known):
+  """Returns a residual filter for objects with known values for some paths.
+
+  Args:
+    filter_: A compiled filter.
+    known: A dict of path to the value shared by every object.
+
+  Returns:
+    A filter equivalent to filter_ for the objects with the known values.
+    IdentityFilter or FalseFilter if no operator is left to evaluate.
+  """
+  if isinstance(filter_, objectfilter.AndFilter):
+    children = []
+    for child in filter_.args:
+      residual = PartiallyEvaluate(child, known)
+      constant = Constant(residual)
+      if constant is False:
+        return residual
+      if constant is None:
+        children.append(residual)
+    if not children:
+      return objectfilter.IdentityFilter()
+    if len(children) == 1:
+      return children[0]
+    return filter_.__class__(arguments=children)
+
+  if isinstance(filter_, objectfilter.OrFilter):
+    if not filter_.args:
+      return objectfilter.IdentityFilter()
+    children = []
+    for child in filter_.args:
+      residual = PartiallyEvaluate(child, known)
+      constant = Constant(residual)
+      if constant is True:
+        return residual
+      if constant is None:
+        children.append(residual)
+    if not children:
+      return objectfilter.FalseFilter()
+    if len(children) == 1:
+      return children[0]
+    return filter_.__class__(arguments=children)
+
+  if (isinstance(filter_, objectfilter.GenericBinaryOperator) and
+      filter_.left_operand in known):
+    value = known[filter_.left_operand]
+    return _Fold(filter_.Operate([] if value is None else [value]))
+  return filter_
@@ -0,0 +1,95 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Returning selected paths of the objects matching a filter.
+
+  for name, size in Project(compiled_filter, objects, ["name", "size"]):
+    ...
+
+Results are produced as objects are read, and hold only the selected values,
+so the matching objects can be freed. Paths read by the filter are not
+expanded again, see the expansions module.
+
+Each path becomes its value, a list of its values if it has several, or None
+if it has none.
+"""
+
+import expansions
+
+
+def Collapse(values):
+  """Returns the single value of a list of values, None or the list."""
+  if not values:
+    return None
+  if len(values) == 1:
+    return values[0]
+  return values
+
+
+class Projection(object):
+  """Projects the objects that match a filter onto a list of paths.
+
+  Attributes:
+    filter: The copy of the filter sharing its expansions.
+    cache: The ExpansionCache of filter.
+    paths: The projected paths.
+  """
+
+  def __init__(self, filter_, paths, as_dict=False,
+               filter_implementation=None):
+    """Constructor.
+
+    Args:
+      filter_: A compiled filter.
+      paths: A list of paths to project.
+      as_dict: Whether to return dicts of path to value instead of tuples.
+      filter_implementation: The implementation filter_ was compiled with. Its
+        value expander reads the paths when no node of filter_ has one.
+    """
+    self.filter, self.cache = expansions.CachingCopy(filter_,
+                                                     filter_implementation)
+    self.paths = list(paths)
+    self.as_dict = as_dict
+
+  def Project(self, obj):
+    """Returns the projection of obj, or None if it doesn't match."""
+    self.cache.Clear()
+    try:
+      if not self.filter.Matches(obj):
+        return None
+      values = tuple(Collapse(self.cache.Values(obj, path))
+                     for path in self.paths)
+    finally:
+      self.cache.Clear()
+    if self.as_dict:
+      return dict(zip(self.paths, values))
+    return values
+
+  def Filter(self, objects):
+    """Yields the projections of the objects that match."""
+    for obj in objects:
+      result = self.Project(obj)
+      if result is not None:
+        yield result
+
+
+def Project(filter_, objects, paths, as_dict=False,
+            filter_implementation=None):
+  """Yields the projections of the objects that match filter_.
+
+  See Projection for the arguments.
+  """
+  return Projection(filter_, paths, as_dict=as_dict,
+                    filter_implementation=filter_implementation).Filter(objects)
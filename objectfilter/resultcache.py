@@ -0,0 +1,320 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Caching the results of filters over versioned collections of objects.
+
+A Collection holds objects by id and has a version, bumped by every change.
+A ResultCache stores the ids of the objects that match a query, keyed by the
+fingerprint of the query and the version of the collection:
+
+  processes = Collection(snapshot)
+  cache = ResultCache(DictFilterImplementation)
+  cache.Match("memory > 100", processes)   # Evaluated.
+  cache.Match("memory>100.0", processes)   # Same fingerprint, cached.
+  processes.Add(new_process)
+  cache.Match("memory > 100", processes)   # New version, evaluated again.
+
+Results are never stale: a change to the collection makes its cached results
+unreachable, and they are dropped when results for the newer version are
+stored. Objects changed in place must be reported with Collection.Touch().
+
+Entries are evicted in least recently used order when there are more than
+max_entries, or when their ids take more than max_bytes.
+"""
+
+import array
+import collections
+import itertools
+
+import canonical
+import objectfilter
+
+
+class Collection(object):
+  """Objects by id, with a version that changes whenever they do.
+
+  Attributes:
+    uid: A number identifying the collection in this process.
+    version: The number of changes made to the collection.
+  """
+
+  _uids = itertools.count()
+
+  def __init__(self, objects=()):
+    self.uid = next(self._uids)
+    self.version = 0
+    self._objects = collections.OrderedDict()
+    self._next_id = 0
+    for obj in objects:
+      self.Add(obj)
+
+  def Add(self, obj):
+    """Adds obj and returns its id."""
+    object_id = self._next_id
+    self._next_id += 1
+    self._objects[object_id] = obj
+    self.version += 1
+    return object_id
+
+  def Replace(self, object_id, obj):
+    """Replaces the object with the given id."""
+    if object_id not in self._objects:
+      raise KeyError(object_id)
+    self._objects[object_id] = obj
+    self.version += 1
+
+  def Remove(self, object_id):
+    del self._objects[object_id]
+    self.version += 1
+
+  def Touch(self):
+    """Records that objects of the collection were changed in place."""
+    self.version += 1
+
+  def Items(self):
+    """Returns the (id, object) pairs of the collection, in insertion order."""
+    return self._objects.items()
+
+  def __getitem__(self, object_id):
+    return self._objects[object_id]
+
+  def __contains__(self, object_id):
+    return object_id in self._objects
+
+  def __len__(self):
+    return len(self._objects)
+
+
+class CacheStats(object):
+  """Statistics of a ResultCache.
+
+  Attributes:
+    hits: The number of results returned from the cache.
+    misses: The number of results evaluated.
+    evictions: The number of entries evicted to stay within the limits.
+    invalidations: The number of entries dropped for old collection versions.
+    entries: The number of entries in the cache.
+    bytes: The memory used by the ids of the cached entries.
+  """
+
+  def __init__(self):
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    self.invalidations = 0
+    self.entries = 0
+    self.bytes = 0
+
+  def HitRate(self):
+    lookups = self.hits + self.misses
+    return float(self.hits) / lookups if lookups else 0.0
+
+  def ToDict(self):
+    return {"hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "entries": self.entries,
+            "bytes": self.bytes,
+            "hit_rate": self.HitRate()}
+
+
+# Operators whose list arguments are sets, so their order doesn't matter.
+_SET_OPERATORS = objectfilter.SET_OPERATORS + (objectfilter.InCIDR,)
+
+
+def _SetParameters(expression, set_names=None, other_names=None):
+  """Returns the names of the parameters only used with set operators."""
+  if set_names is None:
+    set_names, other_names = set(), set()
+  operator_cls = objectfilter.OP2FN.get((expression.operator or "").lower(),
+                                        object)
+  for arg in expression.args:
+    if isinstance(arg, objectfilter.Parameter):
+      if issubclass(operator_cls, _SET_OPERATORS):
+        set_names.add(arg.name)
+      else:
+        other_names.add(arg.name)
+    elif hasattr(arg, "args"):
+      _SetParameters(arg, set_names, other_names)
+  return set_names - other_names
+
+
+def _Freeze(value):
+  """Returns a hashable form of value, telling its type apart.
+
+  Raises:
+    TypeError: If a part of value can't be hashed.
+  """
+  if isinstance(value, (list, tuple)):
+    return (type(value).__name__, tuple(_Freeze(item) for item in value))
+  if isinstance(value, (set, frozenset)):
+    return ("set", frozenset(_Freeze(item) for item in value))
+  if isinstance(value, dict):
+    return ("dict", tuple(sorted((_Freeze(key), _Freeze(item))
+                                 for key, item in value.iteritems())))
+  hash(value)
+  return (type(value).__name__, value)
+
+
+def _ParametersKey(parameters, set_names=()):
+  """Returns a hashable key of bind parameter values.
+
+  Args:
+    parameters: A dict of bind parameter values.
+    set_names: The names of the parameters only used with set operators, whose
+      order doesn't matter.
+
+  Returns:
+    A tuple, or None if a value can't be hashed.
+  """
+  if not parameters:
+    return ()
+  items = []
+  for name, value in sorted(parameters.iteritems()):
+    try:
+      if name in set_names and isinstance(value, (list, tuple)):
+        items.append((name, _Freeze(set(value))))
+      else:
+        items.append((name, _Freeze(value)))
+    except TypeError:
+      return None
+  return tuple(items)
+
+
+def _Size(ids):
+  return ids.buffer_info()[1] * ids.itemsize
+
+
+class ResultCache(object):
+  """A cache of the ids of the objects of collections matching queries.
+
+  Attributes:
+    stats: The CacheStats of the cache.
+  """
+
+  def __init__(self, filter_implementation=None, max_entries=1024,
+               max_bytes=64 * 1024 * 1024):
+    """Constructor.
+
+    Args:
+      filter_implementation: The implementation to compile queries with.
+        DictFilterImplementation by default.
+      max_entries: The maximum number of cached results.
+      max_bytes: The maximum memory used by the ids of cached results.
+        Results bigger than this are not cached.
+    """
+    self.filter_implementation = (filter_implementation or
+                                  objectfilter.DictFilterImplementation)
+    self.max_entries = max_entries
+    self.max_bytes = max_bytes
+    self.stats = CacheStats()
+    # Cached ids by (fingerprint, parameters, collection uid, version), in
+    # least recently used order.
+    self._entries = collections.OrderedDict()
+    # The newest version with results, by collection uid.
+    self._versions = {}
+    # Compiled filters by (fingerprint, parameters).
+    self._filters = {}
+
+  def _Compile(self, expression, fingerprint, parameters, parameters_key):
+    if parameters_key is None:
+      return expression.Compile(self.filter_implementation, parameters)
+    key = (fingerprint, parameters_key)
+    compiled = self._filters.get(key)
+    if compiled is None:
+      compiled = expression.Compile(self.filter_implementation, parameters)
+      if len(self._filters) >= self.max_entries:
+        self._filters.clear()
+      self._filters[key] = compiled
+    return compiled
+
+  def _Invalidate(self, uid, version):
+    """Drops the entries of versions of a collection older than version."""
+    newest = self._versions.get(uid)
+    if newest is not None and newest >= version:
+      return
+    self._versions[uid] = version
+    if newest is None:
+      return
+    for key in [key for key in self._entries
+                if key[2] == uid and key[3] < version]:
+      self._Drop(key)
+      self.stats.invalidations += 1
+
+  def _Drop(self, key):
+    ids = self._entries.pop(key)
+    self.stats.entries -= 1
+    self.stats.bytes -= _Size(ids)
+
+  def _Store(self, key, ids):
+    size = _Size(ids)
+    if size > self.max_bytes:
+      return
+    self._entries[key] = ids
+    self.stats.entries += 1
+    self.stats.bytes += size
+    while (self.stats.entries > self.max_entries or
+           self.stats.bytes > self.max_bytes):
+      self._Drop(next(iter(self._entries)))
+      self.stats.evictions += 1
+
+  def Match(self, query, collection, parameters=None):
+    """Returns the ids of the objects of collection that match query.
+
+    Args:
+      query: A query string or a parsed query.
+      collection: A Collection.
+      parameters: A dict of bind parameter values.
+
+    Returns:
+      A list of ids, in the order the objects were added.
+    """
+    if isinstance(query, basestring):
+      query = objectfilter.Parser(query).Parse()
+    fingerprint = canonical.Fingerprint(query)
+    version = collection.version
+    parameters_key = _ParametersKey(parameters, _SetParameters(query))
+    # Results for parameter values that can't be hashed are never cached.
+    key = None
+    if parameters_key is not None:
+      key = (fingerprint, parameters_key, collection.uid, version)
+    ids = self._entries.pop(key, None) if key else None
+    if ids is not None:
+      self.stats.hits += 1
+      self._entries[key] = ids
+      return ids.tolist()
+
+    self.stats.misses += 1
+    compiled = self._Compile(query, fingerprint, parameters, parameters_key)
+    ids = array.array("L", (object_id for object_id, obj in collection.Items()
+                            if compiled.Matches(obj)))
+    # Results of a collection changed while evaluating are never stored.
+    if key and collection.version == version:
+      self._Invalidate(collection.uid, version)
+      self._Store(key, ids)
+    return ids.tolist()
+
+  def Objects(self, query, collection, parameters=None):
+    """Returns the objects of collection that match query. See Match()."""
+    return [collection[object_id]
+            for object_id in self.Match(query, collection, parameters)]
+
+  def Clear(self):
+    self._entries.clear()
+    self._versions.clear()
+    self._filters.clear()
+    self.stats.entries = 0
+    self.stats.bytes = 0
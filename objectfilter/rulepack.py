@@ -0,0 +1,274 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Loading packs of named rules.
+
+A rule pack file has a rule per line, as a name and a query separated by a
+colon. Empty lines and lines starting with # are ignored:
+
+  # Known bad binaries.
+  evil_exe: name is 'evil.exe'
+  big_and_hidden: size > 1000000 and attributes contains 'hidden'
+
+  rules = LoadFile("iocs.rules", DictFilterImplementation, workers=8)
+  for name in rules.Match(obj):
+    ...
+
+Queries are parsed in a pool of processes, which send back the serialized
+queries to be compiled. Queries are deduplicated by their fingerprint, see
+canonical.Fingerprint(), so equivalent queries, even if spelled differently,
+are compiled and evaluated once. A rule that fails to parse or compile is
+recorded in RuleSet.errors and doesn't stop the rest of the pack from
+loading.
+"""
+
+import collections
+import multiprocessing
+import timeit
+
+import canonical
+import lexer
+import objectfilter
+import serialization
+
+
+# A named rule and its compiled filter.
+Rule = collections.namedtuple("Rule", ["name", "query", "filter"])
+
+
+class LoadStats(object):
+  """Statistics of loading a rule pack.
+
+  Attributes:
+    rules: The number of rules read.
+    unique: The number of queries among them with distinct meanings.
+    errors: The number of rules that failed to load.
+    parse_time: Seconds spent parsing, including the process pool.
+    compile_time: Seconds spent compiling the parsed queries.
+    workers: The number of worker processes used.
+  """
+
+  def __init__(self):
+    self.rules = 0
+    self.unique = 0
+    self.errors = 0
+    self.parse_time = 0.0
+    self.compile_time = 0.0
+    self.workers = 0
+
+  def ToDict(self):
+    return {"rules": self.rules,
+            "unique": self.unique,
+            "errors": self.errors,
+            "parse_time": self.parse_time,
+            "compile_time": self.compile_time,
+            "workers": self.workers}
+
+
+class RuleSet(object):
+  """Named rules indexed by name and by the paths they read.
+
+  Attributes:
+    rules: An ordered dict of rule name to Rule.
+    errors: An ordered dict of rule name to the error that prevented loading
+      it.
+    stats: The LoadStats of the load.
+  """
+
+  def __init__(self):
+    self.rules = collections.OrderedDict()
+    self.errors = collections.OrderedDict()
+    self.stats = LoadStats()
+    # Distinct filters and the load positions of the rules using each one.
+    self._filters = []
+    self._positions = []
+    self._names = []
+    self._paths = {}
+
+  def _Index(self):
+    """Groups the rules by filter and indexes them by path."""
+    groups = collections.OrderedDict()
+    for position, rule in enumerate(self.rules.itervalues()):
+      groups.setdefault(id(rule.filter), (rule.filter, []))[1].append(
+          position)
+      for path in rule.filter.GetPaths():
+        self._paths.setdefault(path, []).append(rule.name)
+    self._filters = [filter_ for filter_, _ in groups.itervalues()]
+    self._positions = [positions for _, positions in groups.itervalues()]
+    self._names = list(self.rules)
+
+  def __getitem__(self, name):
+    return self.rules[name]
+
+  def __contains__(self, name):
+    return name in self.rules
+
+  def __iter__(self):
+    return iter(self.rules.values())
+
+  def __len__(self):
+    return len(self.rules)
+
+  def RulesReading(self, path):
+    """Returns the names of the rules that read path."""
+    return list(self._paths.get(path, []))
+
+  def Match(self, obj):
+    """Returns the names of the rules that match obj, in load order."""
+    positions = []
+    for filter_, filter_positions in zip(self._filters, self._positions):
+      if filter_.Matches(obj):
+        positions.extend(filter_positions)
+    positions.sort()
+    return [self._names[position] for position in positions]
+
+
+def ParseLines(lines):
+  """Yields the (name, query) pairs of the lines of a rule pack.
+
+  Lines without a colon are yielded with a query of None.
+  """
+  for line in lines:
+    line = line.strip()
+    if not line or line.startswith("#"):
+      continue
+    name, colon, query = line.partition(":")
+    if not colon:
+      yield line, None
+    else:
+      yield name.strip(), query.strip()
+
+
+def _Parse(args):
+  """Returns ("ok", (fingerprint, serialized query)) or ("error", message)."""
+  query, filter_implementation = args
+  try:
+    expression = objectfilter.Parser(query).Parse()
+    if not isinstance(expression, lexer.Expression):
+      # The parser gives up on some malformed queries without raising.
+      raise objectfilter.ParseError("Unable to parse %r." % query)
+    # Compile errors, like unknown operators, are reported per rule too.
+    # Bind parameters are only known later, so they can't be checked here.
+    if not _HasParameters(expression):
+      expression.Compile(filter_implementation)
+    return "ok", (canonical.Fingerprint(expression),
+                  serialization.ToData(expression))
+  # A query crashing the parser or an implementation must not stop the other
+  # rules from loading.
+  except Exception as e:
+    return "error", "%s: %s" % (e.__class__.__name__, e)
+
+
+def _HasParameters(expression):
+  for arg in expression.args:
+    if isinstance(arg, objectfilter.Parameter):
+      return True
+    if hasattr(arg, "args") and _HasParameters(arg):
+      return True
+  return False
+
+
+def LoadRules(named_queries, filter_implementation, workers=None,
+              parameters=None, chunk_size=64):
+  """Parses and compiles named queries into a RuleSet.
+
+  Args:
+    named_queries: An iterable of (name, query) pairs.
+    filter_implementation: The implementation to compile the queries with.
+    workers: The number of parsing processes. One per CPU by default. With 1
+      queries are parsed in this process.
+    parameters: A dict of bind parameter values for every query.
+    chunk_size: The number of queries sent to a worker at a time.
+
+  Returns:
+    A RuleSet.
+  """
+  rule_set = RuleSet()
+  stats = rule_set.stats
+  names_by_query = collections.OrderedDict()
+  names = []
+  seen = set()
+  # (position in the pack, name, message) of the rules that failed.
+  errors = []
+  for position, (name, query) in enumerate(named_queries):
+    stats.rules += 1
+    if name in seen:
+      errors.append((position, name, "Duplicate rule name."))
+      continue
+    seen.add(name)
+    names.append((position, name))
+    if query is None:
+      errors.append((position, name, "Missing query."))
+      continue
+    names_by_query.setdefault(query, []).append(name)
+  queries = list(names_by_query)
+
+  if workers is None:
+    workers = multiprocessing.cpu_count()
+  workers = max(1, min(workers, len(queries) // chunk_size + 1))
+  stats.workers = workers
+  start = timeit.default_timer()
+  jobs = [(query, filter_implementation) for query in queries]
+  if workers > 1:
+    pool = multiprocessing.Pool(workers)
+    try:
+      results = pool.map(_Parse, jobs, chunk_size)
+    finally:
+      pool.close()
+      pool.join()
+  else:
+    results = map(_Parse, jobs)
+  stats.parse_time = timeit.default_timer() - start
+
+  start = timeit.default_timer()
+  positions = dict((name, position) for position, name in names)
+  rules = {}
+  # (status, filter or error message) by fingerprint.
+  compiled = {}
+  for query, (status, result) in zip(queries, results):
+    if status == "ok":
+      fingerprint, data = result
+      if fingerprint not in compiled:
+        try:
+          compiled[fingerprint] = "ok", serialization.FromData(data).Compile(
+              filter_implementation, parameters)
+        except Exception as e:
+          compiled[fingerprint] = "error", "%s: %s" % (e.__class__.__name__,
+                                                      e)
+      status, result = compiled[fingerprint]
+    else:
+      # Queries that don't parse have no fingerprint and count as distinct.
+      stats.unique += 1
+    for name in names_by_query[query]:
+      if status == "ok":
+        rules[name] = Rule(name, query, result)
+      else:
+        errors.append((positions[name], name, result))
+  stats.unique += len(compiled)
+  for _, name in names:
+    if name in rules:
+      rule_set.rules[name] = rules[name]
+  for _, name, message in sorted(errors):
+    rule_set.errors[name] = message
+  rule_set._Index()
+  stats.compile_time = timeit.default_timer() - start
+  stats.errors = len(rule_set.errors)
+  return rule_set
+
+
+def LoadFile(path, filter_implementation, **kwargs):
+  """Loads the rule pack file at path. See LoadRules for the arguments."""
+  with open(path) as fd:
+    return LoadRules(ParseLines(fd), filter_implementation, **kwargs)
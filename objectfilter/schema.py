@@ -0,0 +1,333 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Compiling queries against a declared schema of the objects.
+
+Value expanders discover the shape of objects as they walk them, probing
+every value to know whether to iterate it. When the shape is known in
+advance, a Record declares it:
+
+  Dll = collections.namedtuple("Dll", ["name", "imported_functions"])
+  dll = Record.FromNamedTuple(Dll, {"name": str,
+                                    "imported_functions": ListOf(str)})
+  process = Record({"pid": int, "name": str, "dlls": ListOf(dll)},
+                   access=ITEM)
+  compiled = Compile(Parser("@dlls(name is 'evil.dll')").Parse(), process)
+
+Compile() checks every path of the query against the schema, raising
+InvalidPathError for undeclared fields, paths that continue below a leaf and
+contexts over values that aren't lists. Each path is turned into a chain of
+accessors that fetch its fields directly and only iterate the fields
+declared with ListOf.
+
+Fields declared as ANY, and those below them, are expanded like the
+AttributeValueExpander, or the DictValueExpander for ITEM records.
+
+Values are the same as the expanders return for the same objects, except
+that records at non-leaf positions are always descended into: expanders
+yield dicts at non-leaf positions whole, and iterate tuples like namedtuples.
+"""
+
+import operator
+
+import objectfilter
+
+
+class Error(objectfilter.Error):
+  """Base module exception."""
+
+
+class SchemaError(Error):
+  """A schema declaration is malformed."""
+
+
+class InvalidPathError(Error):
+  """A path of a query doesn't fit the schema."""
+
+
+# Record fields read with getattr() or with obj.get().
+ATTRIBUTE = "attribute"
+ITEM = "item"
+
+# The type of a field whose shape isn't declared.
+ANY = None
+
+
+class ListOf(object):
+  """Declares a field holding a list, or any iterable, of values."""
+
+  def __init__(self, item=ANY):
+    self.item = item
+
+  def __repr__(self):
+    return "ListOf(%r)" % (self.item,)
+
+
+def _AttributeGetter(name):
+  return lambda obj: getattr(obj, name, None)
+
+
+def _ItemGetter(name):
+  return lambda obj: obj.get(name)
+
+
+class Record(object):
+  """Declares the fields of records.
+
+  Attributes:
+    fields: A dict of field name to its type: a Python type or tuple of types
+      for leaf values, a Record, a ListOf or ANY.
+    access: ATTRIBUTE or ITEM.
+  """
+
+  _GENERIC_EXPANDERS = {ATTRIBUTE: objectfilter.AttributeValueExpander,
+                        ITEM: objectfilter.DictValueExpander}
+
+  def __init__(self, fields, access=ATTRIBUTE, getters=None):
+    """Constructor.
+
+    Args:
+      fields: A dict of field name to its type.
+      access: ATTRIBUTE or ITEM, how to read fields.
+      getters: An optional dict of field name to a function that reads the
+        field from a record, returning None if it's missing.
+
+    Raises:
+      SchemaError: If access is not valid.
+    """
+    if access not in self._GENERIC_EXPANDERS:
+      raise SchemaError("Unknown access %r." % (access,))
+    self.fields = dict(fields)
+    self.access = access
+    self._getters = dict(getters or {})
+
+  @classmethod
+  def FromNamedTuple(cls, namedtuple_cls, types=None):
+    """Declares the records of a namedtuple class.
+
+    Args:
+      namedtuple_cls: A class created with collections.namedtuple.
+      types: A dict of field name to type. Other fields are ANY.
+
+    Returns:
+      A Record reading fields by their index.
+    """
+    return cls._FromNames(namedtuple_cls._fields, types, getters=dict(
+        (name, operator.itemgetter(index))
+        for index, name in enumerate(namedtuple_cls._fields)))
+
+  @classmethod
+  def FromSlots(cls, slotted_cls, types=None):
+    """Declares the records of a class with __slots__, including inherited."""
+    names = []
+    for klass in reversed(slotted_cls.__mro__):
+      slots = klass.__dict__.get("__slots__", ())
+      if isinstance(slots, basestring):
+        slots = [slots]
+      names.extend(name for name in slots
+                   if name not in ("__dict__", "__weakref__"))
+    return cls._FromNames(names, types)
+
+  @classmethod
+  def _FromNames(cls, names, types, getters=None):
+    types = dict(types or {})
+    unknown = set(types) - set(names)
+    if unknown:
+      raise SchemaError("Unknown fields %s." % ", ".join(sorted(unknown)))
+    return cls(dict((name, types.get(name, ANY)) for name in names),
+               getters=getters)
+
+  def Getter(self, name):
+    """Returns the function reading field name from records."""
+    getter = self._getters.get(name)
+    if getter is None:
+      if self.access == ATTRIBUTE:
+        getter = _AttributeGetter(name)
+      else:
+        getter = _ItemGetter(name)
+    return getter
+
+  def GenericExpander(self):
+    """Returns a value expander for the fields of records declared ANY."""
+    return self._GENERIC_EXPANDERS[self.access]()
+
+  def Resolve(self, path):
+    """Returns the type of the values of path, or ANY if it's not declared.
+
+    Raises:
+      InvalidPathError: If path doesn't fit the schema.
+    """
+    record = self
+    names = path.split(objectfilter.ValueExpander.FIELD_SEPARATOR)
+    for index, name in enumerate(names):
+      field_type = record._Field(name, path)
+      if field_type is ANY:
+        return ANY
+      if index == len(names) - 1:
+        return field_type
+      if isinstance(field_type, ListOf):
+        field_type = field_type.item
+        if field_type is ANY:
+          return ANY
+      if not isinstance(field_type, Record):
+        raise InvalidPathError("%s is a leaf in %s." % (name, path))
+      record = field_type
+
+  def _Field(self, name, path):
+    try:
+      return self.fields[name]
+    except KeyError:
+      raise InvalidPathError("Unknown field %s in %s." % (name, path))
+
+  def Accessor(self, path):
+    """Returns a function of a record returning the list of values of path.
+
+    Raises:
+      InvalidPathError: If path doesn't fit the schema.
+    """
+    self.Resolve(path)
+    return self._Accessor(
+        path.split(objectfilter.ValueExpander.FIELD_SEPARATOR), path)
+
+  def _Accessor(self, names, path):
+    name = names[0]
+    field_type = self._Field(name, path)
+    get = self.Getter(name)
+    if len(names) == 1:
+      def Leaf(obj):
+        value = get(obj)
+        if value is None:
+          return []
+        return [value]
+      return Leaf
+
+    if field_type is ANY:
+      expander = self.GenericExpander()
+      return lambda obj: list(expander.Expand(obj, names))
+
+    if isinstance(field_type, ListOf):
+      item_type = field_type.item
+      if item_type is ANY:
+        expander = self.GenericExpander()
+        return lambda obj: list(expander.Expand(obj, names))
+      rest = item_type._Accessor(names[1:], path)
+
+      def FanOut(obj):
+        items = get(obj)
+        if items is None:
+          return []
+        values = []
+        for item in items:
+          if item is not None:
+            values.extend(rest(item))
+        return values
+      return FanOut
+
+    rest = field_type._Accessor(names[1:], path)
+
+    def Descend(obj):
+      value = get(obj)
+      if value is None:
+        return []
+      return rest(value)
+    return Descend
+
+
+class SchemaValueExpander(objectfilter.ValueExpander):
+  """Expands the paths of a Record with the accessors it compiles."""
+
+  def __init__(self, record):
+    super(SchemaValueExpander, self).__init__()
+    self.record = record
+    self._accessors = {}
+
+  def Accessor(self, path):
+    """Returns the accessor of path, compiling it once."""
+    accessor = self._accessors.get(path)
+    if accessor is None:
+      accessor = self._accessors[path] = self.record.Accessor(path)
+    return accessor
+
+  def Expand(self, obj, path):
+    if not isinstance(path, basestring):
+      path = self.FIELD_SEPARATOR.join(path)
+    if obj is None:
+      return iter(())
+    accessor = self._accessors.get(path)
+    if accessor is None:
+      accessor = self.Accessor(path)
+    # An iterator, since filters treat an empty list as a missing path.
+    return iter(accessor(obj))
+
+
+def _Bind(filter_, record, generic):
+  """Returns a copy of filter_ expanding paths of record, or with generic.
+
+  Args:
+    filter_: A compiled filter.
+    record: The Record of the objects filter_ matches, or ANY.
+    generic: The value expander to use when record is ANY.
+  """
+  if isinstance(filter_, objectfilter.Context):
+    item_record, item_generic = ANY, generic
+    if record is not ANY:
+      item_generic = record.GenericExpander()
+      field_type = record.Resolve(filter_.context)
+      if isinstance(field_type, ListOf):
+        item_record = field_type.item
+      elif field_type is not ANY:
+        raise InvalidPathError("Context %s is not a list." % filter_.context)
+      if item_record is not ANY and not isinstance(item_record, Record):
+        raise InvalidPathError("Context %s is not a list of records." %
+                               filter_.context)
+    children = [_Bind(filter_.condition, item_record, item_generic)]
+  else:
+    children = [_Bind(child, record, generic)
+                for child in filter_.Children()]
+  node = filter_.CopyWithChildren(children)
+  if node.value_expander is not None:
+    if record is ANY:
+      node.value_expander = generic
+    else:
+      node.value_expander = SchemaValueExpander(record)
+      if isinstance(node, objectfilter.Context):
+        paths = [node.context]
+      else:
+        paths = node.GetPaths()
+      for path in paths:
+        node.value_expander.Accessor(path)
+  return node
+
+
+def Compile(expression, record, parameters=None, filter_implementation=None):
+  """Compiles a parsed query for the records declared by record.
+
+  Args:
+    expression: A parsed query.
+    record: The Record of the objects to match.
+    parameters: A dict of bind parameter values.
+    filter_implementation: The implementation providing the operators.
+      BaseFilterImplementation by default. Its value expander is replaced.
+
+  Returns:
+    A compiled filter.
+
+  Raises:
+    InvalidPathError: If a path of the query doesn't fit the schema.
+  """
+  filter_implementation = (filter_implementation or
+                           objectfilter.BaseFilterImplementation)
+  compiled = expression.Compile(filter_implementation, parameters)
+  return _Bind(compiled, record, record.GenericExpander())
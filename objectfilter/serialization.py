@@ -0,0 +1,303 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Serialization of parsed queries and an on-disk cache of them.
+
+ToData() converts a parsed query into nested lists, dicts, strings and
+numbers, which marshal, pickle or JSON can store. FromData() rebuilds the
+parsed query, ready to be compiled with any filter implementation:
+
+  data = ToData(Parser("name is 'a' and size > 10").Parse())
+  => ["binary", "and", [["expression", "name", "is", ["a"]],
+                        ["expression", "size", ">", [10]]]]
+  FromData(data).Compile(DictFilterImplementation)
+
+Nodes are lists starting with their kind. Arguments that aren't plain
+strings or numbers are dicts: {"list": [...]} for lists, {"parameter": name}
+for bind parameters, {"literal": type, "text": text} for typed literals and
+{"bytes": hex} for byte strings that aren't ASCII.
+
+ToJSON() and FromJSON() wrap the data in a versioned JSON document, to send
+queries to other processes or programs.
+
+FilterCache stores parsed queries in a directory, so processes starting with
+many rules skip parsing them:
+
+  cache = FilterCache("/var/cache/objectfilter")
+  rules = [cache.Compile(query, DictFilterImplementation)
+           for query in queries]
+
+ParseAll() stores a whole rule set in one entry, loaded with a single read.
+"""
+
+import binascii
+import hashlib
+import json
+import marshal
+import os
+import tempfile
+
+import lexer
+import literals
+import objectfilter
+
+
+# Version of the data returned by ToData().
+FORMAT_VERSION = 1
+
+
+class Error(objectfilter.Error):
+  """Base module exception."""
+
+
+class InvalidDataError(Error):
+  """Serialized data does not describe a parsed query."""
+
+
+def _ArgToData(arg):
+  if isinstance(arg, bool) or arg is None:
+    return arg
+  if isinstance(arg, (int, long, float, unicode)):
+    return arg
+  if isinstance(arg, str):
+    try:
+      arg.decode("ascii")
+      return arg
+    except UnicodeError:
+      return {"bytes": binascii.hexlify(arg)}
+  if isinstance(arg, (list, tuple)):
+    return {"list": [_ArgToData(item) for item in arg]}
+  if isinstance(arg, objectfilter.Parameter):
+    return {"parameter": arg.name}
+  if isinstance(arg, literals.TypedLiteral):
+    return {"literal": arg.name, "text": arg.text}
+  raise Error("Can not serialize argument %r." % (arg,))
+
+
+def _ArgFromData(data):
+  if not isinstance(data, dict):
+    return data
+  if "list" in data:
+    return [_ArgFromData(item) for item in data["list"]]
+  if "parameter" in data:
+    return objectfilter.Parameter(data["parameter"])
+  if "literal" in data:
+    literal_cls = literals.TYPES.get(data["literal"])
+    if literal_cls is None:
+      raise InvalidDataError("Unknown literal type %r." % data["literal"])
+    try:
+      return literal_cls(data["text"])
+    except ValueError as e:
+      raise InvalidDataError(str(e))
+  if "bytes" in data:
+    return binascii.unhexlify(data["bytes"])
+  raise InvalidDataError("Unknown argument %r." % (data,))
+
+
+def ToData(expression):
+  """Returns a parsed query as nested lists, dicts, strings and numbers.
+
+  Raises:
+    Error: If the query has an argument that can't be serialized.
+  """
+  if isinstance(expression, objectfilter.IdentityExpression):
+    return ["identity"]
+  if isinstance(expression, objectfilter.ContextExpression):
+    return ["context", expression.attribute,
+            [ToData(arg) for arg in expression.args]]
+  if isinstance(expression, lexer.BinaryExpression):
+    return ["binary", expression.operator,
+            [ToData(arg) for arg in expression.args]]
+  if isinstance(expression, lexer.Expression):
+    return ["expression", expression.attribute, expression.operator,
+            [_ArgToData(arg) for arg in expression.args]]
+  raise Error("Can not serialize %r." % (expression,))
+
+
+def FromData(data):
+  """Returns the parsed query serialized by ToData().
+
+  Raises:
+    InvalidDataError: If data is not a serialized query.
+  """
+  try:
+    kind = data[0]
+    if kind == "identity":
+      return objectfilter.IdentityExpression()
+    if kind == "context":
+      expression = objectfilter.ContextExpression(data[1])
+      expression.args = [FromData(arg) for arg in data[2]]
+      return expression
+    if kind == "binary":
+      expression = objectfilter.BinaryExpression(data[1])
+      expression.args = [FromData(arg) for arg in data[2]]
+      return expression
+    if kind == "expression":
+      expression = objectfilter.BasicExpression()
+      expression.SetAttribute(data[1])
+      expression.SetOperator(data[2])
+      expression.args = [_ArgFromData(arg) for arg in data[3]]
+      return expression
+  except (IndexError, KeyError, TypeError) as e:
+    raise InvalidDataError("Malformed node %r: %s" % (data, e))
+  raise InvalidDataError("Unknown node %r." % (data,))
+
+
+# Identifies JSON documents written by ToJSON().
+JSON_FORMAT = "objectfilter-query"
+
+
+def ToJSON(expression):
+  """Returns a parsed query as a versioned JSON document.
+
+  The document is an object with the format name, FORMAT_VERSION and the
+  query as returned by ToData(). It can be read by any language and is
+  loaded by FromJSON().
+  """
+  return json.dumps({"format": JSON_FORMAT,
+                     "version": FORMAT_VERSION,
+                     "query": ToData(expression)}, sort_keys=True)
+
+
+def FromJSON(document):
+  """Returns the parsed query of a document written by ToJSON().
+
+  Raises:
+    InvalidDataError: If document is not valid, or of a newer version.
+  """
+  try:
+    envelope = json.loads(document)
+  except ValueError as e:
+    raise InvalidDataError("Invalid JSON: %s" % e)
+  if not isinstance(envelope, dict) or envelope.get("format") != JSON_FORMAT:
+    raise InvalidDataError("Not a serialized query.")
+  version = envelope.get("version")
+  if not isinstance(version, int) or not 1 <= version <= FORMAT_VERSION:
+    raise InvalidDataError("Unsupported format version %r." % (version,))
+  return FromData(envelope.get("query"))
+
+
+class FilterCache(object):
+  """A content-addressed directory of parsed queries.
+
+  Entries are keyed by a hash of the query, the library version and the
+  serialization format version. Each entry is a single marshal file that also
+  stores those three values, and entries that don't match them, or can't be
+  read, are parsed again and rewritten. Entries are written to a temporary file
+  and renamed, so concurrent processes never read partial entries. Parsed
+  queries don't depend on the filter implementation, so an entry serves every
+  implementation.
+
+  Attributes:
+    directory: The cache directory.
+    hits: The number of queries loaded from the cache.
+    misses: The number of queries parsed and stored.
+  """
+
+  def __init__(self, directory):
+    self.directory = directory
+    self.hits = 0
+    self.misses = 0
+
+  def _Header(self, query):
+    return [objectfilter.__version__, FORMAT_VERSION, query]
+
+  def Key(self, query):
+    """Returns the cache key of query."""
+    if isinstance(query, unicode):
+      query = query.encode("utf-8")
+    return hashlib.sha256("\0".join([objectfilter.__version__,
+                                     str(FORMAT_VERSION), query])).hexdigest()
+
+  def _Path(self, key):
+    return os.path.join(self.directory, key[:2], key)
+
+  def _Read(self, header, path):
+    """Returns the data of the entry at path, or None if it's not valid."""
+    try:
+      with open(path, "rb") as fd:
+        entry = marshal.loads(fd.read())
+      if entry[:3] != header:
+        return None
+      return entry[3]
+    except (IOError, EOFError, ValueError, TypeError, IndexError):
+      return None
+
+  def _Write(self, header, path, data):
+    directory = os.path.dirname(path)
+    try:
+      os.makedirs(directory)
+    except OSError:
+      if not os.path.isdir(directory):
+        raise
+    temp_fd, temp_path = tempfile.mkstemp(dir=directory)
+    try:
+      with os.fdopen(temp_fd, "wb") as out:
+        out.write(marshal.dumps(header + [data]))
+      os.rename(temp_path, path)
+    except:
+      os.unlink(temp_path)
+      raise
+
+  def Parse(self, query):
+    """Returns the parsed query, from the cache if possible.
+
+    Raises:
+      ParseError: If the query is not valid. Invalid queries are not cached.
+    """
+    header = self._Header(query)
+    path = self._Path(self.Key(query))
+    data = self._Read(header, path)
+    if data is not None:
+      try:
+        expression = FromData(data)
+        self.hits += 1
+        return expression
+      except InvalidDataError:
+        pass
+    self.misses += 1
+    expression = objectfilter.Parser(query).Parse()
+    self._Write(header, path, ToData(expression))
+    return expression
+
+  def ParseAll(self, queries):
+    """Returns a list of every query parsed, stored as a single entry.
+
+    Loading a rule set this way takes one read, instead of one per query.
+
+    Raises:
+      ParseError: If a query is not valid.
+    """
+    queries = list(queries)
+    header = self._Header(queries)
+    path = self._Path(self.Key("\0".join(self.Key(query)
+                                         for query in queries)))
+    data = self._Read(header, path)
+    if data is not None:
+      try:
+        expressions = [FromData(item) for item in data]
+        self.hits += len(queries)
+        return expressions
+      except InvalidDataError:
+        pass
+    self.misses += len(queries)
+    expressions = [objectfilter.Parser(query).Parse() for query in queries]
+    self._Write(header, path, [ToData(expression)
+                               for expression in expressions])
+    return expressions
+
+  def Compile(self, query, filter_implementation, parameters=None):
+    """Returns query compiled with filter_implementation."""
+    return self.Parse(query).Compile(filter_implementation, parameters)
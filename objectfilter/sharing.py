@@ -0,0 +1,208 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Compiling a set of rules into a DAG of shared subexpressions.
+
+Rules often repeat the same clauses:
+
+  os is "windows" and @imported_dlls(name is "evil.dll")
+  os is "windows" and size > 100
+
+SharedRuleSet compiles structurally identical subtrees of every rule once,
+hash-consing them into a single DAG. Subtrees referenced more than once are
+wrapped in a SharedNode, which evaluates them at most once per object and
+remembers the result for every other rule referencing them:
+
+  rules = SharedRuleSet({"a": Parser(query_a).Parse(),
+                         "b": Parser(query_b).Parse()},
+                        DictFilterImplementation)
+  for obj in objects:
+    matching_names = rules.Match(obj)
+
+Rules are compiled in their canonical form, see canonical.Canonicalize(), so
+subtrees are identical when they mean the same, even if spelled differently.
+"""
+
+import collections
+import json
+
+import canonical
+import lexer
+import objectfilter
+
+
+class _Memo(object):
+  """Results of shared nodes for the objects evaluated since Clear().
+
+  Objects are kept referenced until Clear(), so their id() can't be reused
+  by another object while their results are stored.
+  """
+
+  def __init__(self):
+    self.results = {}
+    self.objects = {}
+    self.hits = 0
+    self.evaluations = 0
+
+  def Clear(self):
+    self.results.clear()
+    self.objects.clear()
+
+
+class SharedNode(objectfilter.Filter):
+  """Evaluates a node at most once per object, remembering the result."""
+
+  def __init__(self, node, memo, index):
+    super(SharedNode, self).__init__(arguments=[node])
+    self.node = node
+    self.memo = memo
+    self.index = index
+
+  def Matches(self, obj):
+    memo = self.memo
+    key = (self.index, id(obj))
+    result = memo.results.get(key)
+    if result is not None and memo.objects.get(id(obj)) is obj:
+      memo.hits += 1
+      return result
+    memo.evaluations += 1
+    result = self.node.Matches(obj)
+    memo.objects[id(obj)] = obj
+    memo.results[key] = result
+    return result
+
+
+class SharingStats(object):
+  """Statistics of a SharedRuleSet.
+
+  Attributes:
+    nodes: The number of nodes in the trees of all rules.
+    unique: The number of distinct nodes in the DAG.
+    shared: The number of distinct nodes referenced more than once.
+  """
+
+  def __init__(self):
+    self.nodes = 0
+    self.unique = 0
+    self.shared = 0
+
+  def ToDict(self):
+    return {"nodes": self.nodes, "unique": self.unique, "shared": self.shared}
+
+
+class SharedRuleSet(object):
+  """Named rules compiled into a DAG of shared subexpressions.
+
+  Attributes:
+    filters: An ordered dict of rule name to its compiled root filter. Call
+      Match() or clear the memo between objects when using them directly.
+    stats: The SharingStats of the DAG.
+  """
+
+  def __init__(self, expressions, filter_implementation, parameters=None):
+    """Constructor.
+
+    Args:
+      expressions: A dict, or list of pairs, of rule name to parsed query.
+      filter_implementation: The implementation to compile the rules with.
+      parameters: A dict of bind parameter values for every rule.
+    """
+    if isinstance(expressions, dict):
+      expressions = expressions.items()
+    self.filter_implementation = filter_implementation
+    self.parameters = parameters
+    self.stats = SharingStats()
+    self.memo = _Memo()
+    # Distinct nodes by key, and their expression, children and references.
+    self._ids = {}
+    self._expressions = []
+    self._children = []
+    self._references = []
+    roots = [(name, self._Intern(canonical.Canonicalize(expression)))
+             for name, expression in expressions]
+    for _, node_id in roots:
+      self._references[node_id] += 1
+    self.stats.unique = len(self._expressions)
+    self.stats.shared = sum(1 for count in self._references if count > 1)
+
+    self._compiled = {}
+    self.filters = collections.OrderedDict(
+        (name, self._Compile(node_id)) for name, node_id in roots)
+
+  def _Key(self, expression, children):
+    """Returns the key identifying a node with the given interned children."""
+    if isinstance(expression, lexer.BinaryExpression):
+      return ("binary", expression.operator, tuple(children))
+    if isinstance(expression, objectfilter.ContextExpression):
+      return ("context", expression.attribute, tuple(children))
+    return ("expression", json.dumps(canonical.ToData(expression),
+                                     sort_keys=True))
+
+  def _Intern(self, expression):
+    """Returns the id of the distinct node equal to expression."""
+    self.stats.nodes += 1
+    children = []
+    if isinstance(expression, (lexer.BinaryExpression,
+                               objectfilter.ContextExpression)):
+      children = [self._Intern(arg) for arg in expression.args]
+    key = self._Key(expression, children)
+    node_id = self._ids.get(key)
+    if node_id is None:
+      node_id = self._ids[key] = len(self._expressions)
+      self._expressions.append(expression)
+      self._children.append(children)
+      self._references.append(0)
+      # Children are referenced once per distinct parent, which evaluates
+      # them at most once per object.
+      for child in children:
+        self._references[child] += 1
+    return node_id
+
+  def _Compile(self, node_id):
+    """Returns the filter of a distinct node, compiling it once."""
+    if node_id in self._compiled:
+      return self._compiled[node_id]
+    implementation = self.filter_implementation
+    expression = self._expressions[node_id]
+    children = [self._Compile(child) for child in self._children[node_id]]
+    if isinstance(expression, lexer.BinaryExpression):
+      operator = expression.operator
+      if operator == "and":
+        method = "AndFilter"
+      elif operator == "or":
+        method = "OrFilter"
+      else:
+        raise objectfilter.ParseError("Invalid binary operator %s" %
+                                      operator)
+      node = implementation.FILTERS[method](arguments=children)
+    elif isinstance(expression, objectfilter.ContextExpression):
+      node = implementation.FILTERS["Context"](
+          arguments=[expression.attribute] + children,
+          value_expander=implementation.FILTERS["ValueExpander"])
+    else:
+      node = expression.Compile(implementation, self.parameters)
+    if self._references[node_id] > 1:
+      node = SharedNode(node, self.memo, node_id)
+    self._compiled[node_id] = node
+    return node
+
+  def Match(self, obj):
+    """Returns the names of the rules that match obj."""
+    self.memo.Clear()
+    try:
+      return [name for name, filter_ in self.filters.iteritems()
+              if filter_.Matches(obj)]
+    finally:
+      self.memo.Clear()
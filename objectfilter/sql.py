@@ -0,0 +1,434 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Translation of parsed queries into SQL WHERE clauses for SQLite.
+
+Instead of loading every row into Python and running Matches on it, the AST
+returned by Parser.Parse() can be translated into a parameterised WHERE clause
+so that SQLite does the filtering.
+
+Paths are mapped to columns through a TableMapping. Context expressions are
+translated into EXISTS subqueries over child tables:
+
+  mapping = TableMapping(
+      "processes", key="id",
+      contexts={"imported_dlls": TableMapping("dlls", foreign_key="pid")})
+  ast = Parser("name is 'a.exe' and @imported_dlls(name is 'evil.dll')").Parse()
+  for row in Execute(connection, ast, mapping):
+    ...
+
+Top-level conjuncts that can not be translated (unmapped dotted paths,
+unsupported operators or operands) are kept as a residual expression that is
+evaluated in Python on every row returned by the database.
+"""
+
+import re
+
+import lexer
+import objectfilter
+import operands
+import utils
+
+
+class Error(objectfilter.Error):
+  """Base module exception."""
+
+
+class UntranslatableError(Error):
+  """The expression can not be translated into SQL."""
+
+
+class TableMapping(object):
+  """Describes how the paths of a query map to a SQL table.
+
+  Attributes:
+    table: The name of the table.
+    columns: A dict of path to column name. Paths without dots that are not
+      listed map to the column of the same name.
+    key: The primary key column, referenced by child tables.
+    foreign_key: For child tables, the column that references the parent key.
+    contexts: A dict of context path to the TableMapping of the child table.
+  """
+
+  def __init__(self, table, columns=None, key="id", foreign_key=None,
+               contexts=None):
+    self.table = table
+    self.columns = columns or {}
+    self.key = key
+    self.foreign_key = foreign_key
+    self.contexts = contexts or {}
+
+  def GetColumn(self, path):
+    """Returns the column for path or None if it is not mapped."""
+    column = self.columns.get(path)
+    separator = objectfilter.ValueExpander.FIELD_SEPARATOR
+    if column is None and separator not in path:
+      column = path
+    return column
+
+
+class SQLTranslation(object):
+  """The result of translating an expression.
+
+  Attributes:
+    where: The SQL boolean expression, to be used in a WHERE clause.
+    params: A list of the values for the placeholders in where.
+    residual: An expression that must still be evaluated in Python on the
+      resulting rows, or None.
+  """
+
+  def __init__(self, where, params, residual=None):
+    self.where = where
+    self.params = params
+    self.residual = residual
+
+  def __str__(self):
+    return "SQLTranslation(%s, %s, residual=%s)" % (
+        self.where, self.params, self.residual)
+
+
+def QuoteIdentifier(name):
+  """Quotes a table or column name."""
+  return "\"%s\"" % name.replace("\"", "\"\"")
+
+
+def _RegexpFunction(pattern, value):
+  """Implements the REGEXP function with the semantics of the Regexp filter."""
+  if value is None:
+    return 0
+  try:
+    if re.search(utils.SmartUnicode(pattern), utils.SmartUnicode(value)):
+      return 1
+  except (TypeError, re.error):
+    pass
+  return 0
+
+
+def RegisterFunctions(connection):
+  """Registers the SQL functions needed by translated queries."""
+  connection.create_function("REGEXP", 2, _RegexpFunction)
+
+
+def _IsScalar(value):
+  return isinstance(value, (basestring, int, long, float))
+
+
+def _WithoutAffinity(column):
+  """Returns an expression of column that compares like Python values.
+
+  SQLite converts the operands of a comparison to the affinity of a typed
+  column, so that for an INTEGER column x, x = '1' matches 1. The unary +
+  drops the affinity, at the cost of not using indexes on the column.
+  """
+  return "+%s" % column
+
+
+def _Comparison(sql_operator):
+  def Translate(column, operand):
+    if not _IsScalar(operand):
+      raise UntranslatableError("Can not compare with %r." % (operand,))
+    return "%s %s ?" % (_WithoutAffinity(column), sql_operator), [operand]
+  return Translate
+
+
+def _NotEquals(column, operand):
+  if not _IsScalar(operand):
+    raise UntranslatableError("Can not compare with %r." % (operand,))
+  return ("(%s IS NULL OR %s <> ?)" % (column, _WithoutAffinity(column)),
+          [operand])
+
+
+def _Contains(column, operand):
+  if not isinstance(operand, basestring):
+    raise UntranslatableError("contains needs a string operand.")
+  return ("(typeof(%s) = 'text' AND instr(%s, ?) > 0)" % (column, column),
+          [operand])
+
+
+def _NotContains(column, operand):
+  if not isinstance(operand, basestring):
+    raise UntranslatableError("notcontains needs a string operand.")
+  return ("(%s IS NULL OR typeof(%s) <> 'text' OR instr(%s, ?) = 0)" % (
+      column, column, column), [operand])
+
+
+# Operand types accepted by inset and notinset.
+_SET_TYPES = (list, tuple, set, frozenset, operands.SortedArraySet)
+
+
+def _InSet(column, operand):
+  if not isinstance(operand, _SET_TYPES) or not all(map(_IsScalar, operand)):
+    raise UntranslatableError("inset needs a list of values.")
+  if not operand:
+    return "0", []
+  placeholders = ", ".join("?" * len(operand))
+  return ("%s IN (%s)" % (_WithoutAffinity(column), placeholders),
+          list(operand))
+
+
+def _NotInSet(column, operand):
+  if not isinstance(operand, _SET_TYPES) or not all(map(_IsScalar, operand)):
+    raise UntranslatableError("notinset needs a list of values.")
+  if not operand:
+    return "1", []
+  placeholders = ", ".join("?" * len(operand))
+  return ("(%s IS NULL OR %s NOT IN (%s))" % (
+      column, _WithoutAffinity(column), placeholders), list(operand))
+
+
+def _Regexp(column, operand):
+  if not isinstance(operand, basestring):
+    raise UntranslatableError("regexp needs a string operand.")
+  try:
+    re.compile(utils.SmartUnicode(operand))
+  except re.error:
+    raise UntranslatableError("Regular expression \"%s\" is malformed." %
+                              operand)
+  return "%s REGEXP ?" % column, [operand]
+
+
+# How every operator class translates to SQL. Each function takes the quoted
+# column and the right operand and returns the SQL and its parameters.
+OPERATORS = {objectfilter.Equals: _Comparison("="),
+             objectfilter.NotEquals: _NotEquals,
+             objectfilter.Less: _Comparison("<"),
+             objectfilter.LessEqual: _Comparison("<="),
+             objectfilter.Greater: _Comparison(">"),
+             objectfilter.GreaterEqual: _Comparison(">="),
+             objectfilter.Contains: _Contains,
+             objectfilter.NotContains: _NotContains,
+             objectfilter.InSet: _InSet,
+             objectfilter.NotInSet: _NotInSet,
+             objectfilter.Regexp: _Regexp,
+            }
+
+
+class _Translator(object):
+  """Translates an expression tree, allocating table aliases as it goes."""
+
+  def __init__(self, parameters=None):
+    self.aliases = 0
+    self.parameters = parameters
+
+  def NewAlias(self):
+    alias = "t%d" % self.aliases
+    self.aliases += 1
+    return alias
+
+  def Translate(self, expression, mapping, alias):
+    if isinstance(expression, objectfilter.IdentityExpression):
+      return "1", []
+    if isinstance(expression, objectfilter.ContextExpression):
+      return self._TranslateContext(expression, mapping, alias)
+    if isinstance(expression, lexer.BinaryExpression):
+      return self._TranslateBinary(expression, mapping, alias)
+    return self._TranslateBasic(expression, mapping, alias)
+
+  def _TranslateBasic(self, expression, mapping, alias):
+    operator = objectfilter.OP2FN.get(expression.operator.lower())
+    translate = OPERATORS.get(operator)
+    if translate is None:
+      raise UntranslatableError("Unsupported operator %s." %
+                                expression.operator)
+    column = mapping.GetColumn(expression.attribute)
+    if column is None:
+      raise UntranslatableError("Path %s is not mapped to a column." %
+                                expression.attribute)
+    return translate("%s.%s" % (alias, QuoteIdentifier(column)),
+                     expression.BindArgs(self.parameters)[0])
+
+  def _TranslateBinary(self, expression, mapping, alias):
+    operator = expression.operator.lower()
+    if operator in ("and", "&&"):
+      sql_operator = " AND "
+    elif operator in ("or", "||"):
+      sql_operator = " OR "
+    else:
+      raise UntranslatableError("Invalid binary operator %s." % operator)
+    parts, params = [], []
+    for arg in expression.args:
+      sql, arg_params = self.Translate(arg, mapping, alias)
+      parts.append(sql)
+      params.extend(arg_params)
+    return "(%s)" % sql_operator.join(parts), params
+
+  def _TranslateContext(self, expression, mapping, alias):
+    child = mapping.contexts.get(expression.attribute)
+    if child is None or not child.foreign_key:
+      raise UntranslatableError("Context %s is not mapped to a table." %
+                                expression.attribute)
+    child_alias = self.NewAlias()
+    condition, params = self.Translate(expression.args[0], child, child_alias)
+    return ("EXISTS (SELECT 1 FROM %s AS %s WHERE %s.%s = %s.%s AND %s)" % (
+        QuoteIdentifier(child.table), child_alias, child_alias,
+        QuoteIdentifier(child.foreign_key), alias, QuoteIdentifier(mapping.key),
+        condition), params)
+
+
+def _Conjuncts(expression):
+  """Returns the operands of a tree of ANDs."""
+  if (isinstance(expression, lexer.BinaryExpression) and
+      expression.operator.lower() in ("and", "&&")):
+    result = []
+    for arg in expression.args:
+      result.extend(_Conjuncts(arg))
+    return result
+  return [expression]
+
+
+def _ToColumns(expression, mapping):
+  """Returns a copy of expression with paths replaced by their column names.
+
+  Rows are handed to the residual filter as dicts keyed by column name, and
+  child rows of a context are stored under the context path.
+  """
+  if isinstance(expression, objectfilter.ContextExpression):
+    child = mapping.contexts.get(expression.attribute)
+    if child is None:
+      return expression
+    result = objectfilter.ContextExpression(expression.attribute)
+    result.SetExpression(_ToColumns(expression.args[0], child))
+    return result
+  if isinstance(expression, lexer.BinaryExpression):
+    result = objectfilter.BinaryExpression(expression.operator)
+    result.AddOperands(*[_ToColumns(arg, mapping) for arg in expression.args])
+    return result
+  if isinstance(expression, objectfilter.IdentityExpression):
+    return expression
+  result = objectfilter.BasicExpression()
+  result.SetAttribute(mapping.GetColumn(expression.attribute) or
+                      expression.attribute)
+  result.SetOperator(expression.operator)
+  result.args = list(expression.args)
+  return result
+
+
+def _HasContext(expression):
+  if isinstance(expression, objectfilter.ContextExpression):
+    return True
+  if isinstance(expression, lexer.BinaryExpression):
+    return any(_HasContext(arg) for arg in expression.args)
+  return False
+
+
+def _CheckContexts(expression, mapping):
+  """Raises UntranslatableError if a context has no child table to load."""
+  if isinstance(expression, objectfilter.ContextExpression):
+    child = mapping.contexts.get(expression.attribute)
+    if child is None or not child.foreign_key:
+      raise UntranslatableError("Context %s is not mapped to a table." %
+                                expression.attribute)
+    _CheckContexts(expression.args[0], child)
+  elif isinstance(expression, lexer.BinaryExpression):
+    for arg in expression.args:
+      _CheckContexts(arg, mapping)
+
+
+def Translate(expression, mapping, parameters=None):
+  """Translates a parsed expression into a SQL WHERE clause.
+
+  Args:
+    expression: The AST returned by Parser.Parse().
+    mapping: The TableMapping of the table being queried.
+    parameters: A dict of values for the bind parameters of expression.
+
+  Returns:
+    A SQLTranslation. Its where clause refers to the queried table with the
+    alias t0.
+  """
+  translator = _Translator(parameters)
+  alias = translator.NewAlias()
+  parts, params, residual = [], [], []
+  for conjunct in _Conjuncts(expression):
+    try:
+      sql, conjunct_params = translator.Translate(conjunct, mapping, alias)
+    except UntranslatableError:
+      residual.append(_ToColumns(conjunct, mapping))
+      continue
+    parts.append(sql)
+    params.extend(conjunct_params)
+
+  residual_expression = None
+  for conjunct in residual:
+    if residual_expression is None:
+      residual_expression = conjunct
+    else:
+      combined = objectfilter.BinaryExpression("and")
+      combined.AddOperands(residual_expression, conjunct)
+      residual_expression = combined
+  return SQLTranslation(" AND ".join(parts) or "1", params,
+                        residual_expression)
+
+
+def _FetchRows(cursor):
+  names = [description[0] for description in cursor.description]
+  for row in cursor:
+    yield dict(zip(names, row))
+
+
+def _Hydrate(connection, row, mapping):
+  """Stores the child rows of every context of mapping in row."""
+  for path, child in mapping.contexts.items():
+    cursor = connection.execute(
+        "SELECT * FROM %s WHERE %s = ?" % (QuoteIdentifier(child.table),
+                                           QuoteIdentifier(child.foreign_key)),
+        [row.get(mapping.key)])
+    children = list(_FetchRows(cursor))
+    for child_row in children:
+      _Hydrate(connection, child_row, child)
+    row[path] = children
+
+
+def Execute(connection, expression, mapping,
+            filter_implementation=objectfilter.DictFilterImplementation,
+            parameters=None):
+  """Yields, as dicts, the rows of mapping.table matching expression.
+
+  Args:
+    connection: A sqlite3 connection.
+    expression: The AST returned by Parser.Parse().
+    mapping: The TableMapping of the table being queried.
+    filter_implementation: Used to compile the residual expression, if any.
+    parameters: A dict of values for the bind parameters of expression.
+
+  Yields:
+    A dict of column name to value for every matching row. If a residual
+    expression uses a context, the child rows are included under the context
+    path.
+
+  Raises:
+    UntranslatableError: If the residual expression uses a context that is
+      not mapped to a child table, as its rows can't be loaded.
+  """
+  translation = Translate(expression, mapping, parameters)
+  if translation.residual is not None:
+    _CheckContexts(translation.residual, mapping)
+  RegisterFunctions(connection)
+  cursor = connection.execute(
+      "SELECT t0.* FROM %s AS t0 WHERE %s" % (QuoteIdentifier(mapping.table),
+                                             translation.where),
+      translation.params)
+  if translation.residual is None:
+    for row in _FetchRows(cursor):
+      yield row
+    return
+
+  residual = translation.residual.Compile(filter_implementation, parameters)
+  hydrate = _HasContext(translation.residual)
+  for row in _FetchRows(cursor):
+    if hydrate:
+      _Hydrate(connection, row, mapping)
+    if residual.Matches(row):
+      yield row
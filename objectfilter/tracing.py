@@ -0,0 +1,62 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Pluggable tracing of filter compilation, evaluation and parsing.
+
+Evaluation hot paths only check whether a tracer is installed, so with no
+tracer the cost is a single global lookup per node. To debug a filter install
+a callback that receives structured events:
+
+  def Tracer(event, **fields):
+    print event, fields
+
+  tracing.SetTracer(Tracer)
+  compiled_filter.Matches(obj)
+  tracing.SetTracer(None)
+
+Every event carries the fields documented next to its name below.
+"""
+
+import logging
+
+# A filter node was built. Fields: node.
+NODE_CREATED = "node_created"
+# A filter node starts evaluating an object. Fields: node, obj.
+NODE_ENTERED = "node_entered"
+# An operator compared an expanded value. Fields: node, value, operand, result.
+VALUE_COMPARED = "value_compared"
+# A node returned before evaluating every child or value. Fields: node, result.
+SHORT_CIRCUIT = "short_circuit"
+# The lexer matched a token. Fields: state, regex, string.
+PARSE_TOKEN = "parse_token"
+
+# The installed tracer, a callable(event, **fields), or None.
+tracer = None
+
+
+def SetTracer(callback):
+  """Installs callback as the tracer. None disables tracing."""
+  global tracer
+  tracer = callback
+
+
+def GetTracer():
+  """Returns the installed tracer or None."""
+  return tracer
+
+
+def LoggingTracer(event, **fields):
+  """A tracer that reproduces the old behaviour of logging every event."""
+  logging.debug("%s: %s", event, fields)
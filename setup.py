@@ -13,15 +13,34 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
+import re
+
 from setuptools import setup
 
+
+def _Version():
+  """Returns objectfilter.__version__ without importing the package."""
+  path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                      "objectfilter", "objectfilter.py")
+  with open(path) as fd:
+    return re.search(r"^__version__ = \"([^\"]+)\"", fd.read(),
+                     re.M).group(1)
+
+
 setup(name="objectfilter",
-      version="0.1.1",
+      version=_Version(),
       description="A library to implement object filters.",
       author="Jordi Sanchez",
       author_email="objectfilter.feedback@gmail.com",
       url="http://code.google.com/p/objectfilter",
       license="Apache Software License",
       packages=["objectfilter"],
+      entry_points={
+          "console_scripts": [
+              "objectfilter = objectfilter.cli:main",
+              "objectfilter-buildset = objectfilter.operands:main",
+          ],
+      },
       test_suite = "tests",
       )
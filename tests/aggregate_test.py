@@ -0,0 +1,111 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for objectfilter.aggregate."""
+
+
+import unittest
+
+from objectfilter import aggregate
+from objectfilter import expansions
+from objectfilter import objectfilter
+
+
+def Compile(query):
+  return objectfilter.Parser(query).Parse().Compile(
+      objectfilter.DictFilterImplementation)
+
+
+class Event(object):
+
+  def __init__(self, host, size):
+    self.host = host
+    self.size = size
+
+
+class AggregateTest(unittest.TestCase):
+  objects = [{"host": "a", "size": 10, "user": "root", "tags": ["x", "y"]},
+             {"host": "a", "size": 5, "user": "bob"},
+             {"host": "b", "size": 7, "user": "root"},
+             {"host": "b", "size": "big", "user": "root"},
+             {"size": 1},
+             {"host": "c", "size": 100}]
+
+  def testAggregate(self):
+    results = aggregate.Aggregate(
+        Compile("size < 50"), self.objects,
+        ["count", "sum(size)", "min(size)", "max(size)", "distinct(user)",
+         "count(tags)", "approx_distinct(user)"],
+        group_by=["host"])
+    self.assertEqual([None, "a", "b"],
+                     sorted(key[0] for key in results))
+    self.assertEqual({"count": 2, "sum(size)": 15, "min(size)": 5,
+                      "max(size)": 10, "distinct(user)": 2,
+                      "count(tags)": 1, "approx_distinct(user)": 2},
+                     results[("a",)])
+    # Strings are compared, not added.
+    self.assertEqual(7, results[("b",)]["sum(size)"])
+    self.assertEqual(1, results[(None,)]["count"])
+
+    self.assertEqual({(): {"count": 6}},
+                     aggregate.Aggregate(Compile(""), self.objects, ["count"]))
+
+  def testMaxGroups(self):
+    aggregation = aggregate.Aggregation(
+        Compile(""), ["count"], group_by=["host"], max_groups=2,
+        filter_implementation=objectfilter.DictFilterImplementation)
+    for obj in self.objects:
+      aggregation.Add(obj)
+    results = aggregation.Results()
+    self.assertEqual(3, len(results))
+    self.assertEqual(2, results[aggregate.OTHER]["count"])
+    self.assertEqual(6, aggregation.matched)
+
+  def testAttributes(self):
+    implementation = objectfilter.LowercaseAttributeFilterImplementation
+    compiled = objectfilter.Parser("").Parse().Compile(implementation)
+    objects = [Event("a", 10), Event("a", 5), Event("b", 7)]
+    self.assertEqual({("a",): {"sum(size)": 15}, ("b",): {"sum(size)": 7}},
+                     aggregate.Aggregate(compiled, objects, ["sum(size)"],
+                                         group_by=["host"],
+                                         filter_implementation=implementation))
+    # Without the implementation, paths can't be expanded.
+    self.assertRaises(expansions.MissingValueExpanderError,
+                      aggregate.Aggregate, compiled, objects, ["sum(size)"])
+
+  def testReusesExpansions(self):
+    aggregation = aggregate.Aggregation(Compile("host is 'a'"), ["sum(size)"],
+                                        group_by=["host"])
+    aggregation.Add(self.objects[0])
+    self.assertEqual(1, aggregation.cache.hits)
+
+  def testHyperLogLog(self):
+    sketch = aggregate.HyperLogLog()
+    for i in xrange(20000):
+      sketch.Add("user%d" % (i % 10000))
+    self.assertAlmostEqual(10000, sketch.Estimate(), delta=500)
+    sketch = aggregate.HyperLogLog()
+    for i in xrange(100):
+      sketch.Add(i)
+    self.assertAlmostEqual(100, sketch.Estimate(), delta=5)
+
+  def testInvalidAggregate(self):
+    for spec in ["median(size)", "sum", "count(", "sum(size) extra"]:
+      self.assertRaises(aggregate.InvalidAggregateError,
+                        aggregate.Aggregation, Compile(""), [spec])
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,115 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for objectfilter.batch."""
+
+
+import unittest
+
+from objectfilter import batch
+from objectfilter import objectfilter
+
+
+def Compile(query):
+  return objectfilter.Parser(query).Parse().Compile(
+      objectfilter.DictFilterImplementation)
+
+
+class BatchFilterTest(unittest.TestCase):
+
+  def setUp(self):
+    self.objects = []
+    for i in range(50):
+      obj = {"id": i, "size": i % 7, "name": "file%d" % (i % 5)}
+      if i % 3:
+        obj["owner"] = "root" if i % 2 else "user"
+      if i % 4 == 0:
+        obj["dlls"] = [{"name": "a.dll", "size": i}]
+      self.objects.append(obj)
+
+  queries = ["size > 3",
+             "size > 3 and name is 'file1'",
+             "name is 'file1' or size < 2 or owner is 'root'",
+             "owner != 'root' and (size is 1 or name contains '2')",
+             "(size > 1 and size < 5) or (owner is 'user' and name is 'file0')",
+             "owner notinset ['root'] and @dlls(size > 10)",
+             ""]
+
+  def testSelectMatchesRowByRow(self):
+    for query in self.queries:
+      compiled = Compile(query)
+      expected = [i for i, obj in enumerate(self.objects)
+                  if compiled.Matches(obj)]
+      for adaptive in [True, False]:
+        batch_filter = batch.BatchFilter(compiled, adaptive=adaptive)
+        # Later batches run in the measured order.
+        for _ in range(3):
+          self.assertEqual(expected, batch_filter.Select(self.objects), query)
+        self.assertEqual([self.objects[i] for i in expected],
+                         list(batch_filter.Filter(self.objects,
+                                                  batch_size=7)))
+
+  def testSelectColumns(self):
+    paths = ["id", "size", "name", "owner"]
+    columns = dict((path, [obj.get(path) for obj in self.objects])
+                   for path in paths)
+    for query in self.queries[:-2]:
+      compiled = Compile(query)
+      expected = [i for i, obj in enumerate(self.objects)
+                  if compiled.Matches(obj)]
+      self.assertEqual(expected,
+                       batch.BatchFilter(compiled).SelectColumns(columns),
+                       query)
+    self.assertEqual([0, 1], batch.BatchFilter(
+        Compile("missing isnot 1")).SelectColumns(columns, size=2))
+    # Positions past the end of shorter columns are missing values.
+    short = {"a": [1, 2, 3], "b": [1]}
+    self.assertEqual([1, 2], batch.BatchFilter(
+        Compile("b isnot 1")).SelectColumns(short))
+    self.assertEqual([0], batch.BatchFilter(
+        Compile("a < 3 and b is 1")).SelectColumns(short))
+    self.assertEqual([3], batch.BatchFilter(
+        Compile("a isnot 1 and b isnot 1 and a notinset [2, 3]")).SelectColumns(
+            short, size=4))
+    self.assertRaises(batch.Error,
+                      batch.BatchFilter(Compile(self.queries[-2])).
+                      SelectColumns, columns)
+
+  def testAdaptiveOrder(self):
+    # "name contains 'file'" matches every object, so it runs last once
+    # measured.
+    batch_filter = batch.BatchFilter(Compile(
+        "name contains 'file' and size is 1"))
+    batch_filter.Select(self.objects)
+    self.assertEqual((50, 50), (batch_filter.plan.children[0].evaluated,
+                                batch_filter.plan.children[0].selected))
+    batch_filter.Select(self.objects)
+    self.assertEqual(["Equals(size, 1)", "Contains(name, file)"],
+                     [str(child.filter)
+                      for child in batch_filter.plan.Order()])
+    self.assertEqual(57, batch_filter.plan.children[0].evaluated)
+
+    # OR runs the children matching the most objects first.
+    batch_filter = batch.BatchFilter(Compile(
+        "size is 1 or name contains 'file'"))
+    batch_filter.Select(self.objects)
+    batch_filter.Select(self.objects)
+    self.assertEqual(50, batch_filter.plan.children[0].evaluated)
+    self.assertEqual("Contains(name, file)",
+                     str(batch_filter.plan.Order()[0].filter))
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,93 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for objectfilter.bloom."""
+
+
+import unittest
+
+from objectfilter import bloom
+from objectfilter import objectfilter
+from objectfilter import operands
+
+
+def Compile(query):
+  return objectfilter.Parser(query).Parse().Compile(
+      objectfilter.DictFilterImplementation)
+
+
+class BloomTest(unittest.TestCase):
+
+  def testBloomFilter(self):
+    bloom_filter = bloom.BloomFilter(1000, error_rate=0.01)
+    for i in xrange(1000):
+      bloom_filter.Add("value%d" % i)
+    for i in xrange(1000):
+      self.assertIn("value%d" % i, bloom_filter)
+    false_positives = sum(1 for i in xrange(10000)
+                          if "other%d" % i in bloom_filter)
+    self.assertLess(false_positives, 300)
+    self.assertEqual(bloom_filter.MemoryUsage(), len(bloom_filter.bits))
+
+    bloom_filter.Add(1)
+    self.assertIn(1.0, bloom_filter)
+    self.assertRaises(ValueError, bloom.BloomFilter, 10, 0)
+
+  def testRequirements(self):
+    requirement = bloom.Requirements(Compile(
+        "size > 10 and (name is 'a' or @dlls(name inset ['b', 'c']))"))
+    self.assertEqual([("name", ["a"]), ("dlls.name", ["b", "c"])],
+                     [(path, literals) for path, _, literals in requirement])
+    self.assertIsNone(bloom.Requirements(Compile("name is 'a' or size > 1")))
+    self.assertIsNone(bloom.Requirements(Compile("name isnot 'a'")))
+    # A string operand of inset matches its substrings.
+    self.assertIsNone(bloom.Requirements(Compile("name inset 'a.exe b.exe'")))
+
+    expression = objectfilter.Parser("size inset :sizes").Parse()
+    for sizes in (operands.SortedArraySet([1, 2]), frozenset([1, 2])):
+      requirement = bloom.Requirements(expression.Compile(
+          objectfilter.DictFilterImplementation, {"sizes": sizes}))
+      self.assertEqual([("size", [1, 2])],
+                       [(path, sorted(literals))
+                        for path, _, literals in requirement])
+
+  def testPrefilter(self):
+    rules = [Compile("name is 'evil.exe' and size > 10"),
+             Compile("@dlls(name inset ['bad.dll', 'worse.dll'])"),
+             Compile("size is 7")]
+    prefilter = bloom.RuleSetPrefilter(rules, error_rate=0.001)
+    self.assertTrue(prefilter.enabled)
+    self.assertGreater(prefilter.MemoryUsage(), 0)
+
+    objects = [{"name": "good.exe", "size": 100, "dlls": [{"name": "a.dll"}]},
+               {"name": "evil.exe", "size": 100},
+               {"name": "good.exe", "dlls": [{"name": "worse.dll"}]},
+               {"name": "good.exe", "size": 7.0},
+               {"name": ["not", "hashable"]}]
+    for obj in objects:
+      self.assertEqual([rule for rule in rules if rule.Matches(obj)],
+                       prefilter.Matches(obj))
+    self.assertFalse(prefilter.MayMatch(objects[0]))
+    self.assertTrue(prefilter.MayMatch(objects[-1]))
+    self.assertEqual(2, prefilter.rejected)
+
+    # A rule without equalities may match anything.
+    prefilter = bloom.RuleSetPrefilter(rules + [Compile("size > 1")])
+    self.assertFalse(prefilter.enabled)
+    self.assertTrue(prefilter.MayMatch(objects[0]))
+
+
+if __name__ == "__main__":
+  unittest.main()
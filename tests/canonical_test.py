@@ -0,0 +1,96 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for objectfilter.canonical."""
+
+
+import unittest
+
+from objectfilter import canonical
+from objectfilter import objectfilter
+
+
+class CanonicalTest(unittest.TestCase):
+
+  def Canonical(self, query):
+    return canonical.ToData(canonical.Canonicalize(
+        objectfilter.Parser(query).Parse()))
+
+  def testOperatorNames(self):
+    self.assertEqual("==", canonical.OperatorName("IS"))
+    self.assertEqual("==", canonical.OperatorName("equals"))
+    self.assertEqual("!=", canonical.OperatorName("isnot"))
+    self.assertEqual("frobs", canonical.OperatorName("Frobs"))
+
+  def testCanonicalize(self):
+    self.assertEqual(
+        ["binary", "and", [["expression", "a", "==", [1]],
+                           ["expression", "b", "==", [2]],
+                           ["expression", "c", "inset", [
+                               {"list": [u"x", u"y", 1]}]]]],
+        self.Canonical("(c inset ['y', 1.0, 'x', 'y'] and b is 2) AND "
+                       "a equals 1 and a == 1"))
+    self.assertEqual(
+        ["context", "dlls", [["binary", "or", [
+            ["expression", "name", "==", [u"a"]],
+            ["expression", "size", "between", [{"list": [2, 1]}]]]]]],
+        self.Canonical("@dlls(size between [2, 1] OR name is 'a')"))
+    self.assertEqual(["expression", "a", "==", [1]],
+                     self.Canonical("a is 1 or a is 1"))
+
+  def testCompilesToEquivalentFilter(self):
+    query = objectfilter.Parser(
+        "(b is 2 or c inset ['x', 'y']) and a is 1").Parse()
+    expression = canonical.Canonicalize(query)
+    compiled = expression.Compile(objectfilter.DictFilterImplementation)
+    original = query.Compile(objectfilter.DictFilterImplementation)
+    for obj in [{"a": 1, "b": 2}, {"a": 1, "c": "y"}, {"a": 2, "b": 2},
+                {"a": 1, "c": "z"}]:
+      self.assertEqual(original.Matches(obj), compiled.Matches(obj))
+
+  def testFingerprint(self):
+    fingerprint = canonical.Fingerprint("a is 1 and b is 2")
+    self.assertEqual(64, len(fingerprint))
+    for query in ["(b == 2) AND a equals 1",
+                  "b   is 2 and   (a is 1.0)",
+                  objectfilter.Parser("a is 1 and b is 2").Parse()]:
+      self.assertEqual(fingerprint, canonical.Fingerprint(query))
+    for query in ["a is 1 or b is 2",
+                  "a is '1' and b is 2",
+                  "A is 1 and b is 2"]:
+      self.assertNotEqual(fingerprint, canonical.Fingerprint(query))
+    # Only operators comparing numbers treat 1.0 as 1.
+    for operator in ["regexp", "contains", "notcontains"]:
+      self.assertNotEqual(canonical.Fingerprint("a %s 1" % operator),
+                          canonical.Fingerprint("a %s 1.0" % operator))
+    self.assertEqual(canonical.Fingerprint("a notinset [1, 2.0]"),
+                     canonical.Fingerprint("a notinset [2, 1.0]"))
+
+    self.assertEqual(
+        canonical.Fingerprint("t before date('2013-01-01')"),
+        canonical.Fingerprint("t before date('2013-01-01T00:00:00')"))
+    self.assertEqual(
+        canonical.Fingerprint("ip incidr [cidr('10.0.0.0/8'), "
+                              "cidr('1.0.0.0/8')]"),
+        canonical.Fingerprint("ip incidr [cidr('1.0.0.0/8'), "
+                              "cidr('10.0.0.0/8')]"))
+    self.assertNotEqual(canonical.Fingerprint("a between [1, 2]"),
+                        canonical.Fingerprint("a between [2, 1]"))
+    self.assertNotEqual(canonical.Fingerprint("a inset :x"),
+                        canonical.Fingerprint("a inset :y"))
+
+
+if __name__ == "__main__":
+  unittest.main()
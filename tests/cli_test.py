@@ -0,0 +1,103 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for objectfilter.cli."""
+
+
+import json
+import os
+import shutil
+import StringIO
+import tempfile
+import unittest
+
+from objectfilter import cli
+
+
+class CLITest(unittest.TestCase):
+  def setUp(self):
+    self.temp_dir = tempfile.mkdtemp()
+    self.jsonl_path = os.path.join(self.temp_dir, "records.jsonl")
+    with open(self.jsonl_path, "wb") as fd:
+      for i in range(100):
+        fd.write(json.dumps({"id": i, "name": "file%d.exe" % i,
+                             "tags": [{"name": "even" if i % 2 else "odd"}]}))
+        fd.write("\n")
+    self.csv_path = os.path.join(self.temp_dir, "records.csv")
+    with open(self.csv_path, "wb") as fd:
+      fd.write("id,name\n")
+      for i in range(100):
+        fd.write("%d,file%d.exe\n" % (i, i))
+
+  def tearDown(self):
+    shutil.rmtree(self.temp_dir)
+
+  def Run(self, *argv):
+    stdout, stderr = StringIO.StringIO(), StringIO.StringIO()
+    code = cli.main(list(argv), stdout=stdout, stderr=stderr)
+    return code, stdout.getvalue(), stderr.getvalue()
+
+  def testJSONL(self):
+    code, out, _ = self.Run("--workers", "1", "id >= 95", self.jsonl_path)
+    self.assertEqual(0, code)
+    self.assertEqual([95, 96, 97, 98, 99],
+                     [json.loads(line)["id"] for line in out.splitlines()])
+
+  def testShardingKeepsOrder(self):
+    code, out, err = self.Run("--workers", "3", "--chunk-size", "100",
+                              "--fields", "id", "--stats",
+                              "@tags(name is 'even')", self.jsonl_path)
+    self.assertEqual(0, code)
+    self.assertEqual(range(1, 100, 2),
+                     [json.loads(line)["id"] for line in out.splitlines()])
+    self.assertIn("100 records, 50 matches", err)
+
+  def testCSV(self):
+    code, out, _ = self.Run("--workers", "1", "--chunk-size", "50",
+                            "--fields", "name", "id < 3", self.csv_path)
+    self.assertEqual(0, code)
+    self.assertEqual(["name", "file0.exe", "file1.exe", "file2.exe"],
+                     out.splitlines())
+
+  def testCountAndImplementation(self):
+    code, out, _ = self.Run("--workers", "1", "--count", "--implementation",
+                            "lowercase", "Name contains '9'", self.jsonl_path)
+    self.assertEqual(0, code)
+    self.assertEqual("19\n", out)
+
+  def testInvalidQuery(self):
+    code, _, err = self.Run("--workers", "1", "id >=", self.jsonl_path)
+    self.assertEqual(2, code)
+    self.assertIn("Invalid query", err)
+    code, _, err = self.Run("--workers", "1", "name regexp '('",
+                            self.jsonl_path)
+    self.assertEqual(2, code)
+    self.assertIn("Invalid query", err)
+    # The parser returns a string instead of raising for this one.
+    code, _, err = self.Run("--workers", "1", "--count", "(",
+                            self.jsonl_path)
+    self.assertEqual(2, code)
+    self.assertIn("Invalid query", err)
+
+  def testMalformedRecords(self):
+    with open(self.jsonl_path, "ab") as fd:
+      fd.write('{"id": 100, "name": \n{"id": 101, "name": "file101.exe"}\n')
+    for workers in ("1", "2"):
+      code, out, err = self.Run("--workers", workers, "--chunk-size", "1000",
+                                "id >= 98", self.jsonl_path)
+      self.assertEqual(1, code)
+      self.assertEqual([98, 99, 101], [json.loads(line)["id"]
+                                       for line in out.splitlines()])
+      self.assertIn("Skipped 1 malformed records.", err)
@@ -0,0 +1,100 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for objectfilter.cluster."""
+
+
+import unittest
+
+from objectfilter import cluster
+from objectfilter import objectfilter
+from objectfilter import ordering
+from objectfilter import serialization
+
+
+class ClusterTest(unittest.TestCase):
+
+  def setUp(self):
+    self.objects = [{"name": "file%d" % i, "size": (i * 37) % 101,
+                     "tags": [{"name": "t%d" % (i % 3)}]}
+                    for i in xrange(300)]
+    shards = [self.objects[i::3] for i in xrange(3)]
+    self.cluster = cluster.Cluster(shards, batch_size=7)
+    self.cluster.Start()
+
+  def tearDown(self):
+    self.cluster.Stop()
+
+  def Matching(self, query):
+    compiled = objectfilter.Parser(query).Parse().Compile(
+        objectfilter.DictFilterImplementation)
+    return [obj for obj in self.objects if compiled.Matches(obj)]
+
+  def testWireFormat(self):
+    expression = objectfilter.Parser(
+        "size > 10 and @tags(name inset :tags)").Parse()
+    document = serialization.ToJSON(expression)
+    compiled = serialization.FromJSON(document).Compile(
+        objectfilter.DictFilterImplementation, {"tags": ["t1"]})
+    self.assertTrue(compiled.Matches(self.objects[1]))
+    self.assertFalse(compiled.Matches(self.objects[2]))
+    for document in ["[]", "nope", '{"format": "objectfilter-query", '
+                     '"version": 99, "query": ["identity"]}']:
+      self.assertRaises(serialization.InvalidDataError,
+                        serialization.FromJSON, document)
+
+  def testFilter(self):
+    query = "size > 50 and @tags(name is 't1')"
+    results = list(self.cluster.Filter(query))
+    self.assertEqual(sorted(self.Matching(query)), sorted(results))
+    self.assertEqual(len(results), self.cluster.Count(query))
+
+    results = list(self.cluster.Filter("@tags(name inset :tags)",
+                                       {"tags": ["t0", "t2"]}))
+    self.assertEqual(200, len(results))
+
+  def testStopEarly(self):
+    for obj in self.cluster.Filter(""):
+      break
+    self.assertEqual(300, self.cluster.Count(""))
+
+  def testInterleavedRequests(self):
+    results = self.cluster.Filter("size > 10")
+    next(results)
+    expected = len(self.Matching("size > 10"))
+    # The replies of the filter left unread are dropped.
+    self.assertEqual(expected, self.cluster.Count("size > 10"))
+    self.assertRaises(cluster.InterruptedRequestError, list, results)
+    self.assertEqual(expected, self.cluster.Count("size > 10"))
+    self.assertEqual(10, len(self.cluster.TopK("", ["name"], 10)))
+
+  def testTopK(self):
+    expected = ordering.Sort(
+        objectfilter.Parser("size < 90").Parse().Compile(
+            objectfilter.DictFilterImplementation),
+        self.objects, ["-size", "name"], limit=10)
+    self.assertEqual(expected, self.cluster.TopK("size < 90",
+                                                 ["-size", "name"], 10))
+
+  def testErrors(self):
+    self.assertRaises(cluster.WorkerError, self.cluster.Count,
+                      "size is :missing")
+    self.assertRaises(cluster.WorkerError, list,
+                      self.cluster.Filter("size unknown 1"))
+    self.assertEqual(300, self.cluster.Count(""))
+
+
+if __name__ == "__main__":
+  unittest.main()
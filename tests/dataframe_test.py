@@ -0,0 +1,111 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for objectfilter.dataframe."""
+
+
+import unittest
+
+from objectfilter import dataframe
+from objectfilter import objectfilter
+
+
+RECORDS = [
+    {"name": "yay.exe", "size": 10, "hash.md5": "abc", "tags": ["x", "y"],
+     "mixed": "a.exe"},
+    {"name": "nay.exe", "size": 20, "tags": ["y"], "mixed": 5},
+    {"name": "svchost.exe", "size": 30.5, "hash.md5": "def", "tags": [],
+     "mixed": "b.dll"},
+    {"name": "ntdll.dll", "hash.md5": "abc", "tags": ["x"],
+     "mixed": ["x.exe"]},
+    {"size": 7, "tags": None},
+    ]
+
+QUERIES = [
+    "name is 'yay.exe'",
+    "name isnot 'yay.exe'",
+    "size > 10",
+    "size >= 10",
+    "size < 20.5",
+    "size <= 20",
+    "size == 10",
+    "size != 10",
+    "name contains 'exe'",
+    "name notcontains 'exe'",
+    "size contains 'a'",
+    "tags contains 'x'",
+    "tags notcontains 'x'",
+    "mixed contains 'exe'",
+    "mixed notcontains 'exe'",
+    "mixed contains 'x.exe'",
+    "mixed notcontains 'x.exe'",
+    "name inset ['yay.exe', 'ntdll.dll']",
+    "name notinset ['yay.exe', 'ntdll.dll']",
+    "size inset [7, 30.5]",
+    "tags inset ['x', 'y', 'z']",
+    "name inset 'yay.exe or nay.exe'",
+    "name regexp '^[ny]ay'",
+    "size regexp '^3'",
+    "missing is 1",
+    "missing isnot 1",
+    "name > 'o'",
+    "size > 'a'",
+    "size > [1, 2]",
+    "size <= [1, 2]",
+    "name is ['yay.exe']",
+    "(name contains 'exe' and size > 15) or name is 'ntdll.dll'",
+    "name contains 'exe' and (size < 15 or size > 25)",
+    ]
+
+
+@unittest.skipIf(dataframe.pandas is None, "pandas is not installed.")
+class DataFrameTest(unittest.TestCase):
+  def setUp(self):
+    self.frame = dataframe.pandas.DataFrame(RECORDS)
+
+  def Expected(self, query):
+    compiled = objectfilter.Parser(query).Parse().Compile(
+        objectfilter.DictFilterImplementation)
+    records = [dict((key, value) for key, value in record.items()
+                    if value is not None) for record in RECORDS]
+    return [compiled.Matches(record) for record in records]
+
+  def Mask(self, query):
+    expression = objectfilter.Parser(query).Parse()
+    return list(dataframe.Compile(expression).Mask(self.frame))
+
+  def testDifferential(self):
+    for query in QUERIES:
+      self.assertEqual(self.Expected(query), self.Mask(query), query)
+
+  def testDottedPath(self):
+    # Dotted paths refer to flattened column names.
+    self.assertEqual([True, False, False, True, False],
+                     self.Mask("hash.md5 is 'abc'"))
+
+  def testContext(self):
+    frame = dataframe.pandas.DataFrame(
+        {"dlls": [[{"name": "a.dll"}], [{"name": "b.dll"}], []]})
+    mask = dataframe.Compile(
+        objectfilter.Parser("@dlls(name is 'b.dll')").Parse()).Mask(frame)
+    self.assertEqual([False, True, False], list(mask))
+
+  def testFilter(self):
+    expression = objectfilter.Parser("size > 15").Parse()
+    matching = dataframe.Compile(expression).Filter(self.frame)
+    self.assertEqual(["nay.exe", "svchost.exe"], list(matching["name"]))
+    expression = objectfilter.Parser("mixed notcontains 'exe'").Parse()
+    matching = dataframe.Compile(expression).Filter(self.frame)
+    self.assertEqual([1, 2, 3, 4], list(matching.index))
@@ -0,0 +1,57 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for objectfilter.expansions."""
+
+
+import unittest
+
+from objectfilter import expansions
+from objectfilter import objectfilter
+
+
+class ExpansionsTest(unittest.TestCase):
+
+  def testCachingCopy(self):
+    compiled = objectfilter.Parser(
+        "name is 'a' and size > 1 and name isnot 'b' and "
+        "@dlls(name is 'c')").Parse().Compile(
+            objectfilter.DictFilterImplementation)
+    shared, cache = expansions.CachingCopy(compiled)
+    obj = {"name": "a", "size": 2, "dlls": [{"name": "c"}]}
+    self.assertTrue(shared.Matches(obj))
+    # name is read twice by the filter.
+    self.assertEqual(1, cache.hits)
+    self.assertEqual(["a"], cache.Values(obj, "name"))
+    self.assertEqual(2, cache.hits)
+    self.assertEqual(4, cache.misses)
+
+    cache.Clear()
+    self.assertEqual({}, cache.entries)
+    # Missing values still match negated operators.
+    self.assertTrue(shared.Matches({"name": "a", "size": 2,
+                                    "dlls": [{"name": "c"}]}))
+    self.assertTrue(compiled.Matches(obj))
+    self.assertIsNot(compiled.value_expander, cache)
+
+  def testIterators(self):
+    cache = expansions.ExpansionCache(objectfilter.DictValueExpander())
+    obj = {"items": (x for x in [1, 2])}
+    self.assertEqual(1, len(cache.Values(obj, "items")))
+    self.assertEqual({}, cache.entries)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,86 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for objectfilter.explain."""
+
+
+import json
+import unittest
+
+from objectfilter import explain
+from objectfilter import objectfilter
+
+
+class ExplainTest(unittest.TestCase):
+  def setUp(self):
+    self.objects = [{"name": "a.exe", "size": 5, "tags": ["x", "y"]},
+                    {"name": "b.exe", "size": 50, "tags": ["y"]},
+                    {"name": "c.dll", "size": 500, "tags": []}]
+
+  def Compile(self, query):
+    return objectfilter.Parser(query).Parse().Compile(
+        objectfilter.DictFilterImplementation)
+
+  def testCountersAndResults(self):
+    compiled = self.Compile("size > 10 and name contains 'exe'")
+    explained = explain.Explain(compiled, self.objects)
+    self.assertEqual(3, explained.stats.calls)
+    self.assertEqual(1, explained.stats.passes)
+    # The first object fails "size > 10", so "name contains" is skipped.
+    self.assertEqual(1, explained.stats.short_circuits)
+    size_node, name_node = explained.children
+    self.assertEqual(3, size_node.stats.calls)
+    self.assertEqual(2, size_node.stats.passes)
+    self.assertEqual(3, size_node.stats.values)
+    self.assertEqual(2, name_node.stats.calls)
+    self.assertEqual(1, name_node.stats.passes)
+
+    # Results are the same as the original filter's.
+    self.assertEqual(compiled.Filter(self.objects),
+                     explained.Filter(self.objects))
+
+  def testOriginalIsUntouched(self):
+    compiled = self.Compile("size > 10 or name is 'a.exe'")
+    children = compiled.Children()
+    explain.Explain(compiled, self.objects)
+    self.assertEqual(children, compiled.Children())
+    self.assertIsInstance(children[0].value_expander,
+                          objectfilter.DictValueExpander)
+
+  def testContext(self):
+    compiled = self.Compile("@tags(name is 'y')")
+    explained = explain.Explain(compiled, [{"tags": [{"name": "x"},
+                                                     {"name": "y"}]}])
+    self.assertEqual(1, explained.stats.passes)
+    self.assertEqual(2, explained.children[0].stats.calls)
+
+    # The condition of a Context without sub-objects is never evaluated.
+    explained = explain.Explain(compiled, [{"tags": []}, {}])
+    self.assertEqual(0, explained.stats.passes)
+    self.assertEqual(0, explained.stats.short_circuits)
+    self.assertEqual(0, explained.children[0].stats.calls)
+
+  def testRender(self):
+    compiled = self.Compile("size > 10 and name contains 'exe'")
+    explained = explain.Explain(compiled, self.objects)
+    lines = explained.Render().splitlines()
+    self.assertEqual(3, len(lines))
+    self.assertTrue(lines[0].startswith("AndFilter  calls=3 passes=1"))
+    self.assertTrue(lines[1].startswith("  Greater(size, 10)"))
+
+    data = json.loads(explained.ToJSON())
+    self.assertEqual("AndFilter", data["node"])
+    self.assertEqual(3, data["calls"])
+    self.assertEqual("Contains(name, 'exe')", data["children"][1]["node"])
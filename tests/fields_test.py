@@ -0,0 +1,76 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for objectfilter.fields."""
+
+
+import json
+import unittest
+
+from objectfilter import fields
+from objectfilter import objectfilter
+
+
+class FieldsTest(unittest.TestCase):
+  query = """
+name is 'yay.exe' and hash.md5 inset ['abc'] and
+@imported_dlls(name is 'a.dll' and @functions(name contains 'Reg')) and
+@children(size > 1)
+"""
+  paths = set(["name", "hash.md5", "imported_dlls.name",
+               "imported_dlls.functions.name", "children.size"])
+
+  def testGetPaths(self):
+    expression = objectfilter.Parser(self.query).Parse()
+    self.assertEqual(self.paths, expression.GetPaths())
+    compiled = expression.Compile(objectfilter.DictFilterImplementation)
+    self.assertEqual(self.paths, compiled.GetPaths())
+
+    self.assertEqual(set(), objectfilter.Parser("").Parse().GetPaths())
+    # A context without paths below reads the context path itself.
+    context = objectfilter.Context(
+        arguments=["dlls", objectfilter.IdentityFilter()],
+        value_expander=objectfilter.DictValueExpander)
+    self.assertEqual(set(["dlls"]), context.GetPaths())
+
+  def testPathTree(self):
+    tree = fields.PathTree(["a.b.c", "a.d", "e", "e.f"])
+    self.assertEqual({"a": {"b": {"c": None}, "d": None}, "e": None}, tree)
+
+  def testTrimRecord(self):
+    record = {"name": "yay.exe", "unused": [1, 2, 3],
+              "hash": [{"md5": "abc", "sha1": "def"}],
+              "imported_dlls": [
+                  {"name": "a.dll", "size": 3,
+                   "functions": [{"name": "RegOpenKey", "ordinal": 3}]},
+                  "not a dict"],
+              "children": {"size": 2, "other": 1}}
+    loader = fields.ProjectingLoader(self.paths, decoder=json.loads)
+    trimmed = loader.Load(json.dumps(record))
+    self.assertEqual({"name": "yay.exe",
+                      "hash": [{"md5": "abc"}],
+                      "imported_dlls": [
+                          {"name": "a.dll",
+                           "functions": [{"name": "RegOpenKey"}]},
+                          "not a dict"],
+                      "children": {"size": 2, "other": 1}}, trimmed)
+
+    record["imported_dlls"].pop()
+    record["children"] = [{"size": 2, "other": 1}]
+    compiled = objectfilter.Parser(self.query).Parse().Compile(
+        objectfilter.DictFilterImplementation)
+    trimmed = fields.TrimRecord(record, fields.PathTree(self.paths))
+    self.assertTrue(compiled.Matches(record))
+    self.assertTrue(compiled.Matches(trimmed))
@@ -0,0 +1,97 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for objectfilter.jsonl."""
+
+
+import json
+import os
+import shutil
+import StringIO
+import tempfile
+import unittest
+
+from objectfilter import jsonl
+from objectfilter import objectfilter
+
+
+RECORDS = [
+    {"name": "yay.exe", "size": 10, "dlls": [{"name": "a.dll"}]},
+    {"name": "nay.exe", "size": 20, "dlls": [{"name": "evil.dll"}]},
+    {"name": "evil.exe", "size": 30, "dlls": []},
+    {"name": "yay.exe", "size": 40, "dlls": [{"name": "evil.dll"}]},
+    ]
+
+
+class JSONLTest(unittest.TestCase):
+  def setUp(self):
+    self.data = "".join(json.dumps(record) + "\n" for record in RECORDS)
+    self.temp_dir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.temp_dir)
+
+  def Compile(self, query):
+    return objectfilter.Parser(query).Parse().Compile(
+        objectfilter.DictFilterImplementation)
+
+  def testRequiredLiterals(self):
+    self.assertEqual([("yay.exe",), ("a.dll",)], jsonl.RequiredLiterals(
+        self.Compile("name is 'yay.exe' and @dlls(name contains 'a.dll')")))
+    self.assertEqual([("evil", "yay")], jsonl.RequiredLiterals(
+        self.Compile("name contains 'yay' or name contains 'evil'")))
+    # A branch without literals makes the whole OR unconstrained.
+    self.assertEqual([], jsonl.RequiredLiterals(
+        self.Compile("name is 'yay.exe' or size > 10")))
+    # Negations, numbers and strings JSON may escape give no literal.
+    self.assertEqual([], jsonl.RequiredLiterals(
+        self.Compile("name isnot 'a' and size is 10 and name is 'a/b'")))
+    # HTML-safe encoders write <, > and & as \u003c, \u003e and \u0026.
+    self.assertEqual([], jsonl.RequiredLiterals(
+        self.Compile("name contains '<a>' or name contains 'a&b'")))
+
+  def testFilterBuffer(self):
+    for query in ["name is 'yay.exe' and size > 15",
+                  "@dlls(name is 'evil.dll')",
+                  "name contains 'evil' or size == 10",
+                  "size > 15"]:
+      compiled = self.Compile(query)
+      expected = [json.dumps(record) + "\n" for record in RECORDS
+                  if compiled.Matches(record)]
+      jsonl_filter = jsonl.JSONLFilter(compiled)
+      self.assertEqual(expected, list(jsonl_filter.FilterBuffer(self.data)),
+                       query)
+      self.assertEqual(expected, list(jsonl_filter.FilterLines(
+          StringIO.StringIO(self.data))), query)
+
+  def testPrefilterSkipsDecoding(self):
+    jsonl_filter = jsonl.JSONLFilter(self.Compile("name is 'evil.exe'"))
+    self.assertEqual(1, len(list(jsonl_filter.FilterBuffer(self.data))))
+    self.assertEqual(1, jsonl_filter.decoded)
+    self.assertEqual(1, jsonl_filter.matched)
+
+  def testFilterFileAndWrite(self):
+    path = os.path.join(self.temp_dir, "input.jsonl")
+    with open(path, "wb") as fd:
+      fd.write(self.data.rstrip("\n"))
+    jsonl_filter = jsonl.JSONLFilter(self.Compile("name is 'yay.exe'"))
+    out = StringIO.StringIO()
+    self.assertEqual(2, jsonl_filter.Write(jsonl_filter.FilterFile(path), out))
+    lines = out.getvalue().splitlines()
+    self.assertEqual([10, 40], [json.loads(line)["size"] for line in lines])
+
+    empty_path = os.path.join(self.temp_dir, "empty.jsonl")
+    open(empty_path, "wb").close()
+    self.assertEqual([], list(jsonl_filter.FilterFile(empty_path)))
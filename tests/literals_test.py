@@ -0,0 +1,121 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for objectfilter.literals."""
+
+
+import datetime
+import unittest
+
+from objectfilter import literals
+from objectfilter import objectfilter
+
+
+def Matches(query, obj):
+  return objectfilter.Parser(query).Parse().Compile(
+      objectfilter.DictFilterImplementation).Matches(obj)
+
+
+class LiteralsTest(unittest.TestCase):
+
+  def testDate(self):
+    self.assertEqual(0, literals.Date.Parse("1970-01-01"))
+    self.assertEqual(3600 * 10 ** 6, literals.Date.Parse("1970-01-01T01:00Z"))
+    self.assertEqual(literals.Date.Parse("2013-05-01T12:00:00Z"),
+                     literals.Date.Parse("2013-05-01 14:00:00+02:00"))
+    self.assertEqual(500000, literals.Date.Parse("1970-01-01T00:00:00.5"))
+    self.assertRaises(ValueError, literals.Date.Parse, "yesterday")
+    self.assertRaises(ValueError, literals.Date.Parse, "2013-13-01")
+
+    self.assertEqual(10 ** 6, literals.Date.Coerce(1))
+    self.assertEqual(0, literals.Date.Coerce(datetime.date(1970, 1, 1)))
+    self.assertEqual(literals.Date.Parse("2013-05-01T12:00:00"),
+                     literals.Date.Coerce(datetime.datetime(2013, 5, 1, 12)))
+    self.assertIsNone(literals.Date.Coerce("not a date"))
+    self.assertIsNone(literals.Date.Coerce(True))
+
+  def testDuration(self):
+    self.assertEqual(5400 * 10 ** 6, literals.Duration.Parse("1h30m"))
+    self.assertEqual(5400 * 10 ** 6, literals.Duration.Parse("1.5h"))
+    self.assertEqual(1500, literals.Duration.Parse("1ms 500us"))
+    self.assertRaises(ValueError, literals.Duration.Parse, "")
+    self.assertRaises(ValueError, literals.Duration.Parse, "1h and 5m")
+    self.assertEqual(90 * 10 ** 6, literals.Duration.Coerce(
+        datetime.timedelta(seconds=90)))
+
+  def testIPAddress(self):
+    self.assertEqual(0xffff0a000001, literals.IPAddress.Parse("10.0.0.1"))
+    self.assertEqual(1, literals.IPAddress.Parse("::1"))
+    self.assertEqual(literals.IPAddress.Parse("10.0.0.1"),
+                     literals.IPAddress.Parse("::ffff:10.0.0.1"))
+    self.assertEqual(literals.IPAddress.Parse("10.0.0.1"),
+                     literals.IPAddress.Coerce(0x0a000001))
+    self.assertRaises(ValueError, literals.IPAddress.Parse, "10.0.0.256")
+    self.assertIsNone(literals.IPAddress.Coerce("example.com"))
+
+  def testCIDRSet(self):
+    self.assertEqual((0xffff0a000000, 0xffff0affffff),
+                     literals.CIDR.Parse("10.1.2.3/8"))
+    self.assertRaises(ValueError, literals.CIDR.Parse, "10.0.0.0/33")
+    cidrs = literals.CIDRSet(["10.0.0.0/8", "10.1.0.0/16", "11.0.0.0/8",
+                              "fe80::/10", literals.CIDR("192.168.1.1")])
+    self.assertEqual(3, len(cidrs))
+    for address in ["10.0.0.0", "11.255.255.255", "fe80::1", "192.168.1.1"]:
+      self.assertIn(literals.IPAddress.Parse(address), cidrs)
+    for address in ["9.255.255.255", "12.0.0.0", "::1", "192.168.1.2"]:
+      self.assertNotIn(literals.IPAddress.Parse(address), cidrs)
+
+  def testParser(self):
+    expression = objectfilter.Parser(
+        "src incidr [cidr('10.0.0.0/8'), cidr(\"fe80::/10\")]").Parse()
+    self.assertEqual(
+        [[literals.CIDR("10.0.0.0/8"), literals.CIDR("fe80::/10")]],
+        expression.args)
+    # Type names are case insensitive, like operators.
+    expression = objectfilter.Parser(
+        "src is IP('1.2.3.4') and time after Date(\"2013-01-01\")").Parse()
+    self.assertEqual([literals.IPAddress("1.2.3.4")], expression.args[0].args)
+    self.assertEqual([literals.Date("2013-01-01")], expression.args[1].args)
+    self.assertRaises(objectfilter.ParseError,
+                      objectfilter.Parser("src is ip('nope')").Parse)
+
+  def testOperators(self):
+    event = {"src": "10.1.2.3", "time": "2013-05-01T12:00:00Z",
+             "uptime": 4000, "hosts": [{"ip": "192.168.1.5"}, {"ip": "bogus"}]}
+    self.assertTrue(Matches("src is ip('10.1.2.3')", event))
+    self.assertTrue(Matches("src > ip('9.0.0.0')", event))
+    self.assertTrue(Matches("src inset [ip('1.1.1.1'), ip('10.1.2.3')]",
+                            event))
+    self.assertTrue(Matches("src incidr cidr('10.0.0.0/8')", event))
+    self.assertTrue(Matches("src incidr '10.0.0.0/8'", event))
+    self.assertFalse(Matches("src notincidr ['10.0.0.0/8']", event))
+    self.assertTrue(Matches("hosts.ip incidr cidr('192.168.0.0/16')", event))
+    self.assertTrue(Matches("time after '2013-01-01'", event))
+    self.assertTrue(Matches("time before date('2013-05-01T13:00+00:00')",
+                            event))
+    self.assertFalse(Matches("time before '2013-05-01'", event))
+    self.assertTrue(Matches(
+        "time between [date('2013-05-01'), date('2013-05-02')]", event))
+    self.assertTrue(Matches("uptime between [3000, 5000]", event))
+    self.assertTrue(Matches("uptime > duration('1h')", event))
+    self.assertFalse(Matches("missing after '2013-01-01'", event))
+
+    self.assertRaises(ValueError, Matches, "src incidr 'bogus'", event)
+    self.assertRaises(ValueError, Matches,
+                      "time between [date('2013-01-01')]", event)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,124 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for objectfilter.memo."""
+
+
+import gc
+import unittest
+
+from objectfilter import memo
+from objectfilter import objectfilter
+
+
+class Dll(object):
+  def __init__(self, name, size):
+    self.name = name
+    self.size = size
+
+
+class Process(object):
+  def __init__(self, pid, dlls):
+    self.pid = pid
+    self.dlls = dlls
+
+
+def Compile(query):
+  return objectfilter.Parser(query).Parse().Compile(
+      objectfilter.BaseFilterImplementation)
+
+
+class ContextMemoTest(unittest.TestCase):
+
+  def setUp(self):
+    self.dlls = [Dll("a.dll", 10), Dll("b.dll", 20), Dll("c.dll", 30)]
+    self.processes = [Process(pid, [self.dlls[pid % 3], self.dlls[2]])
+                      for pid in range(10)]
+
+  def testMatchesLikeFilter(self):
+    for query in ["@dlls(name is 'a.dll' and size is 10)",
+                  "@dlls(name is 'c.dll') and pid > 4",
+                  "@dlls(size > 15) or @dlls(name is 'a.dll')",
+                  "pid is 3 or @dlls(name contains 'b')"]:
+      compiled = Compile(query)
+      memoized, context_memo = memo.MemoizingCopy(compiled)
+      with context_memo:
+        self.assertEqual(
+            [compiled.Matches(process) for process in self.processes],
+            [memoized.Matches(process) for process in self.processes],
+            query)
+      self.assertEqual(0, len(context_memo))
+
+  def testStats(self):
+    compiled = Compile("@dlls(name is 'x.dll')")
+    memoized, context_memo = memo.MemoizingCopy(compiled)
+    self.assertIsNone(compiled.memo)
+    with context_memo:
+      for process in self.processes:
+        memoized.Matches(process)
+      self.assertEqual(3, len(context_memo))
+    # 20 sub-objects, 3 distinct.
+    self.assertEqual({"hits": 17, "misses": 3, "evictions": 0,
+                      "collected": 0, "entries": 0, "hit_rate": 0.85},
+                     context_memo.stats.ToDict())
+
+  def testKey(self):
+    # Equal sub-objects without the same identity share results.
+    processes = [{"dlls": [{"name": "a.dll"}]} for _ in range(4)]
+    compiled = objectfilter.Parser("@dlls(name is 'a.dll')").Parse().Compile(
+        objectfilter.DictFilterImplementation)
+    memoized, context_memo = memo.MemoizingCopy(
+        compiled, key=lambda dll: dll["name"])
+    self.assertTrue(all(memoized.Matches(process) for process in processes))
+    self.assertEqual((3, 1), (context_memo.stats.hits,
+                              context_memo.stats.misses))
+
+  def testMaxEntries(self):
+    memoized, context_memo = memo.MemoizingCopy(
+        Compile("@dlls(size > 100)"), max_entries=2)
+    for process in self.processes:
+      memoized.Matches(process)
+    self.assertEqual(2, len(context_memo))
+    self.assertTrue(context_memo.stats.evictions > 0)
+
+  def testCollectedSubObjects(self):
+    memoized, context_memo = memo.MemoizingCopy(
+        Compile("@dlls(name is 'a.dll')"))
+    for i in range(10):
+      # Each new dll may reuse the id of the collected one, and must not get
+      # its result.
+      dll = Dll("a.dll" if i % 2 else "b.dll", 1)
+      self.assertEqual(bool(i % 2), memoized.Matches(Process(1, [dll])))
+      del dll
+      gc.collect()
+    self.assertEqual(0, len(context_memo))
+    self.assertEqual(10, context_memo.stats.collected)
+
+  def testPinsObjectsWithoutWeakReferences(self):
+    compiled = objectfilter.Parser("@dlls(name is 'a.dll')").Parse().Compile(
+        objectfilter.DictFilterImplementation)
+    memoized, context_memo = memo.MemoizingCopy(compiled)
+    for name in ["a.dll", "b.dll", "a.dll"]:
+      self.assertEqual(name == "a.dll",
+                       memoized.Matches({"dlls": [{"name": name}]}))
+    self.assertEqual((0, 3, 3), (context_memo.stats.hits,
+                                 context_memo.stats.misses,
+                                 len(context_memo)))
+    context_memo.Clear()
+    self.assertEqual(0, len(context_memo))
+
+
+if __name__ == "__main__":
+  unittest.main()
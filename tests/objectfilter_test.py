@@ -274,6 +274,19 @@ class ObjectFilterTest(unittest.TestCase):
     values = self.value_expander().Expand(self.file, "Callable.a")
     self.assertListEqual(list(values), [])
 
+  def testExpandReusesPaths(self):
+    # An expander remembers the names of its paths, for any object.
+    value_expander = self.value_expander()
+    for _ in range(2):
+      self.assertListEqual([hash1, hash2],
+                           list(value_expander.Expand(self.file, "Hash.MD5")))
+      self.assertListEqual([hash1, hash2], list(value_expander.Expand(
+          self.file, ["HASH", "md5"])))
+      self.assertListEqual([], list(value_expander.Expand(
+          HashObject(hash1), "Hash.MD5")))
+      self.assertListEqual([hash1], list(value_expander.Expand(
+          HashObject(hash1), "MD5")))
+
   def testGenericBinaryOperator(self):
     class TestBinaryOperator(objectfilter.GenericBinaryOperator):
       values = list()
@@ -603,4 +616,34 @@ AND size is 10
     obj = DummyObject("os", "windows")
     self.assertObjectMatches(obj, 'os inset ["windows", "mac"]')
     # "a" != ["a"]
-    self.assertObjectMatches(obj, 'os isnot ["windows"]')
\ No newline at end of file
+    self.assertObjectMatches(obj, 'os isnot ["windows"]')
+
+  def testParameters(self):
+    query = "md5 inset :iocs and size > :min_size"
+    parser = objectfilter.Parser(query).Parse()
+    self.assertEqual(objectfilter.Parameter("iocs"), parser.args[0].args[0])
+    self.assertRaises(objectfilter.MissingParameterError, parser.Compile,
+                      self.filter_imp)
+    self.assertRaises(objectfilter.MissingParameterError, parser.Compile,
+                      self.filter_imp, {"iocs": []})
+
+    iocs = ["%032x" % i for i in range(1000)]
+    filter_ = parser.Compile(self.filter_imp, {"iocs": iocs, "min_size": 3})
+    self.assertIsInstance(filter_.args[0].right_operand, frozenset)
+    self.assertTrue(filter_.Matches(HashObject("%032x" % 999)) is False)
+    obj = DummyObject("md5", "%032x" % 999)
+    obj.size = 4
+    self.assertTrue(filter_.Matches(obj))
+    obj.size = 3
+    self.assertFalse(filter_.Matches(obj))
+
+    # The parsed query can be compiled again with other values.
+    filter_ = parser.Compile(self.filter_imp, {"iocs": [1, 2], "min_size": 0})
+    self.assertIsInstance(filter_.args[0].right_operand,
+                          objectfilter.operands.SortedArraySet)
+    obj = DummyObject("md5", [2, 1])
+    obj.size = 1
+    self.assertTrue(filter_.Matches(obj))
+
+    self.assertParseRaises("md5 inset :")
+    self.assertParseRaises("md5 inset :a-b")
@@ -0,0 +1,106 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for objectfilter.operands."""
+
+
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from objectfilter import objectfilter
+from objectfilter import operands
+
+
+class OperandsTest(unittest.TestCase):
+  def testSortedArraySet(self):
+    values = operands.SortedArraySet([5, 3, 3, -2 ** 63, 2 ** 63 - 1])
+    self.assertEqual(4, len(values))
+    self.assertEqual([-2 ** 63, 3, 5, 2 ** 63 - 1], list(values))
+    self.assertIn(3, values)
+    self.assertIn(5.0, values)
+    self.assertNotIn(4, values)
+    self.assertNotIn(6, values)
+    self.assertNotIn("3", values)
+    self.assertNotIn(3, operands.SortedArraySet([]))
+
+  def testCompactSet(self):
+    self.assertIsInstance(operands.CompactSet([1, 2]),
+                          operands.SortedArraySet)
+    self.assertIsInstance(operands.CompactSet(["a", 1]), frozenset)
+    self.assertIsInstance(operands.CompactSet([2 ** 64]), frozenset)
+    self.assertIsInstance(operands.CompactSet([True]), frozenset)
+    self.assertIsInstance(operands.CompactSet([]), frozenset)
+    self.assertEqual([[1]], operands.CompactSet([[1]]))
+
+
+class MappedSortedSetTest(unittest.TestCase):
+  def setUp(self):
+    self.temp_dir = tempfile.mkdtemp()
+    self.path = os.path.join(self.temp_dir, "test.set")
+
+  def tearDown(self):
+    shutil.rmtree(self.temp_dir)
+
+  def testHex(self):
+    hashes = ["%032x" % (i * 7919) for i in range(1000)]
+    count = operands.BuildMappedSet(self.path, hashes + [" %s\n" % hashes[0]],
+                                    run_size=100)
+    self.assertEqual(1000, count)
+    iocs = operands.MappedSortedSet(self.path)
+    self.assertEqual(1000, len(iocs))
+    self.assertEqual(sorted(hashes), list(iocs))
+    for value in hashes:
+      self.assertIn(value, iocs)
+    self.assertIn(hashes[1].upper(), iocs)
+    self.assertIn(unicode(hashes[1]), iocs)
+    self.assertNotIn("%032x" % 1, iocs)
+    self.assertNotIn(hashes[1][:-1], iocs)
+    self.assertNotIn("z" * 32, iocs)
+    self.assertNotIn(1, iocs)
+
+    # Pickling maps the file again instead of copying its contents.
+    self.assertLess(len(pickle.dumps(iocs)), 500)
+    unpickled = pickle.loads(pickle.dumps(iocs))
+    self.assertIn(hashes[5], unpickled)
+
+    compiled = objectfilter.Parser("md5 inset :iocs").Parse().Compile(
+        objectfilter.DictFilterImplementation, {"iocs": iocs})
+    self.assertTrue(compiled.Matches({"md5": hashes[3]}))
+    self.assertTrue(compiled.Matches({"md5": hashes[3:6]}))
+    self.assertFalse(compiled.Matches({"md5": "%032x" % 1}))
+
+  def testInt(self):
+    values = [5, -3, 2 ** 63 - 1, -2 ** 63, 0, 5]
+    operands.BuildMappedSet(self.path, values, kind=operands.KIND_INT)
+    numbers = operands.MappedSortedSet(self.path)
+    self.assertEqual([-2 ** 63, -3, 0, 5, 2 ** 63 - 1], list(numbers))
+    self.assertIn(-3, numbers)
+    self.assertIn(5.0, numbers)
+    self.assertNotIn(5.5, numbers)
+    self.assertNotIn(4, numbers)
+    self.assertNotIn("5", numbers)
+    self.assertRaises(operands.Error, operands.BuildMappedSet, self.path,
+                      [2 ** 63], kind=operands.KIND_INT)
+
+  def testEmptyAndMalformed(self):
+    operands.BuildMappedSet(self.path, [])
+    self.assertEqual([], list(operands.MappedSortedSet(self.path)))
+    with open(self.path, "wb") as fd:
+      fd.write("not a set file at all, really")
+    self.assertRaises(operands.FormatError, operands.MappedSortedSet,
+                      self.path)
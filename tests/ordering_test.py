@@ -0,0 +1,101 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for objectfilter.ordering."""
+
+
+import random
+import unittest
+
+from objectfilter import objectfilter
+from objectfilter import ordering
+
+
+def Compile(query):
+  return objectfilter.Parser(query).Parse().Compile(
+      objectfilter.DictFilterImplementation)
+
+
+def Names(objects):
+  return [obj["name"] for obj in objects]
+
+
+class Process(object):
+
+  def __init__(self, name, memory):
+    self.name = name
+    self.memory = memory
+
+
+class OrderingTest(unittest.TestCase):
+  objects = [{"name": "a", "memory": 10, "user": "root"},
+             {"name": "b", "memory": 30, "user": "bob"},
+             {"name": "c", "user": "root"},
+             {"name": "d", "memory": [5, 50], "user": "root"},
+             {"name": "e", "memory": 30, "user": "alice"},
+             {"name": "f", "memory": 1, "user": "root"}]
+
+  def testSort(self):
+    everything = Compile("")
+
+    def Sort(filter_, order_by, **kwargs):
+      return Names(ordering.Sort(
+          filter_, self.objects, order_by,
+          filter_implementation=objectfilter.DictFilterImplementation,
+          **kwargs))
+
+    self.assertEqual(["d", "b", "e", "a", "f", "c"],
+                     Sort(everything, ["-memory"]))
+    self.assertEqual(["f", "d", "a", "b", "e", "c"],
+                     Sort(everything, ["memory"]))
+    self.assertEqual(["d", "e", "b"],
+                     Sort(everything, ["-memory", "user"], limit=3))
+    self.assertEqual(["b", "e", "a"],
+                     Sort(everything, ["-memory"], limit=3, reduction="min"))
+    self.assertEqual(["f", "a"], Sort(Compile("user is 'root'"),
+                                      ["memory", "-name"], limit=2,
+                                      reduction="max"))
+    self.assertEqual([], Sort(everything, ["name"], limit=0))
+
+  def testAttributes(self):
+    implementation = objectfilter.LowercaseAttributeFilterImplementation
+    compiled = objectfilter.Parser("").Parse().Compile(implementation)
+    processes = [Process("a", 10), Process("b", 30), Process("c", 20)]
+    top = ordering.TopK(compiled, ["-memory"], limit=2,
+                        filter_implementation=implementation)
+    for process in processes:
+      top.Add(process)
+    self.assertEqual(["b", "c"], [process.name for process in top.Results()])
+
+  def testBoundedHeap(self):
+    objects = [{"name": i, "memory": random.randint(0, 1000)}
+               for i in xrange(1000)]
+    top = ordering.TopK(Compile("memory > 100"), ["-memory"], limit=10)
+    for obj in objects:
+      top.Add(obj)
+      self.assertLessEqual(len(top.heap), 10)
+    expected = sorted([obj for obj in objects if obj["memory"] > 100],
+                      key=lambda obj: -obj["memory"])[:10]
+    self.assertEqual(expected, top.Results())
+
+  def testInvalidOrder(self):
+    self.assertRaises(ordering.InvalidOrderError, ordering.OrderBy, [])
+    self.assertRaises(ordering.InvalidOrderError, ordering.OrderBy, ["-"])
+    self.assertRaises(ordering.InvalidOrderError, ordering.OrderBy, ["a"],
+                      reduction="avg")
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,77 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for objectfilter.partial."""
+
+
+import unittest
+
+from objectfilter import objectfilter
+from objectfilter import partial
+
+
+def Compile(query):
+  return objectfilter.Parser(query).Parse().Compile(
+      objectfilter.DictFilterImplementation)
+
+
+class PartiallyEvaluateTest(unittest.TestCase):
+
+  def Residual(self, query, known):
+    return partial.PartiallyEvaluate(Compile(query), known)
+
+  def testFolding(self):
+    known = {"os": "windows", "arch": "x64", "host": None}
+    for query, expected in [
+        ("os is 'windows'", "IdentityFilter()"),
+        ("os is 'linux'", "FalseFilter()"),
+        ("os is 'linux' and size > 1", "FalseFilter()"),
+        ("os is 'windows' and size > 1", "Greater(size, 1)"),
+        ("os is 'windows' or size > 1", "IdentityFilter()"),
+        ("os is 'linux' or size > 1", "Greater(size, 1)"),
+        ("os is 'linux' or arch isnot 'x64'", "FalseFilter()"),
+        ("(os is 'windows' and size > 1) or (arch is 'arm' and size < 1)",
+         "Greater(size, 1)"),
+        ("os is 'windows' and size > 1 and name is 'a'",
+         "AndFilter(Greater(size, 1), Equals(name, a))"),
+        # Missing values match negated operators, as with Matches().
+        ("host != 'a'", "IdentityFilter()"),
+        ("host is 'a'", "FalseFilter()"),
+        # Conditions in contexts are relative to sub-objects.
+        ("@dlls(os is 'windows')", "Context(dlls, Equals(os, windows))")]:
+      self.assertEqual(expected, str(self.Residual(query, known)), query)
+
+  def testConstant(self):
+    self.assertIs(True, partial.Constant(objectfilter.IdentityFilter()))
+    self.assertIs(False, partial.Constant(objectfilter.FalseFilter()))
+    self.assertIs(None, partial.Constant(Compile("a is 1")))
+
+  def testResidualMatchesLikeFilter(self):
+    known = {"os": "windows", "tags": ["a", "b"]}
+    objects = [dict(known, size=size, name=name)
+               for size in range(3) for name in ["a", "b"]]
+    for query in ["os is 'windows' and (size > 1 or name is 'a')",
+                  "tags contains 'a' and size < 2",
+                  "tags inset ['a', 'b', 'c'] or (os != 'windows' and "
+                  "name is 'b')",
+                  "not_known is 1 or os regexp '^win'"]:
+      compiled = Compile(query)
+      residual = partial.PartiallyEvaluate(compiled, known)
+      for obj in objects:
+        self.assertEqual(compiled.Matches(obj), residual.Matches(obj), query)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,71 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for objectfilter.projection."""
+
+
+import types
+import unittest
+
+from objectfilter import objectfilter
+from objectfilter import projection
+
+
+class File(object):
+
+  def __init__(self, name, size):
+    self.name = name
+    self.size = size
+
+
+class ProjectionTest(unittest.TestCase):
+  objects = [{"name": "a.exe", "size": 10, "dlls": [{"name": "x.dll"},
+                                                   {"name": "y.dll"}]},
+             {"name": "b.exe", "size": 1},
+             {"name": "c.exe", "size": 20, "dlls": [{"name": "z.dll"}]}]
+
+  def setUp(self):
+    self.compiled = objectfilter.Parser("size > 5").Parse().Compile(
+        objectfilter.DictFilterImplementation)
+
+  def testProject(self):
+    results = projection.Project(self.compiled, self.objects,
+                                 ["name", "dlls.name", "missing"])
+    self.assertIsInstance(results, types.GeneratorType)
+    self.assertEqual([("a.exe", ["x.dll", "y.dll"], None),
+                      ("c.exe", "z.dll", None)], list(results))
+
+    results = projection.Project(self.compiled, self.objects, ["size"],
+                                 as_dict=True)
+    self.assertEqual([{"size": 10}, {"size": 20}], list(results))
+
+  def testAttributes(self):
+    implementation = objectfilter.LowercaseAttributeFilterImplementation
+    compiled = objectfilter.Parser("").Parse().Compile(implementation)
+    results = projection.Project(compiled, [File("a.exe", 10)],
+                                 ["name", "size"],
+                                 filter_implementation=implementation)
+    self.assertEqual([("a.exe", 10)], list(results))
+
+  def testReusesExpansions(self):
+    projector = projection.Projection(self.compiled, ["size", "name"])
+    self.assertIsNone(projector.Project(self.objects[1]))
+    self.assertEqual((10, "a.exe"), projector.Project(self.objects[0]))
+    self.assertEqual(1, projector.cache.hits)
+    self.assertEqual({}, projector.cache.entries)
+
+
+if __name__ == "__main__":
+  unittest.main()
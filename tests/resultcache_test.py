@@ -0,0 +1,125 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for objectfilter.resultcache."""
+
+
+import array
+import unittest
+
+from objectfilter import resultcache
+
+
+class CollectionTest(unittest.TestCase):
+
+  def testVersions(self):
+    collection = resultcache.Collection([{"a": 1}, {"a": 2}])
+    self.assertEqual(2, collection.version)
+    object_id = collection.Add({"a": 3})
+    self.assertEqual(2, object_id)
+    collection.Replace(object_id, {"a": 4})
+    collection.Remove(0)
+    collection.Touch()
+    self.assertEqual(6, collection.version)
+    self.assertEqual([(1, {"a": 2}), (2, {"a": 4})], collection.Items())
+    self.assertRaises(KeyError, collection.Replace, 0, {})
+    self.assertNotEqual(collection.uid, resultcache.Collection().uid)
+
+
+class ResultCacheTest(unittest.TestCase):
+
+  def testMatch(self):
+    collection = resultcache.Collection(
+        [{"size": size, "name": str(size)} for size in range(10)])
+    cache = resultcache.ResultCache()
+    self.assertEqual([6, 7, 8, 9], cache.Match("size > 5", collection))
+    self.assertEqual([6, 7, 8, 9], cache.Match("size>5.0", collection))
+    self.assertEqual([{"size": 9, "name": "9"}],
+                     cache.Objects("size > 5 and name is '9'", collection))
+    self.assertEqual((1, 2), (cache.stats.hits, cache.stats.misses))
+
+    # Changes to the collection are never served from the cache.
+    collection.Add({"size": 10})
+    self.assertEqual([6, 7, 8, 9, 10], cache.Match("size > 5", collection))
+    collection[10]["size"] = 0
+    collection.Touch()
+    self.assertEqual([6, 7, 8, 9], cache.Match("size > 5", collection))
+    self.assertEqual(3, cache.stats.invalidations)
+    self.assertEqual(1, cache.stats.entries)
+
+    # Other collections and parameters have their own entries.
+    other = resultcache.Collection([{"size": 7}])
+    self.assertEqual([0], cache.Match("size > 5", other))
+    self.assertEqual([5], cache.Match("name inset :names", collection,
+                                      parameters={"names": ["5"]}))
+    self.assertEqual([4], cache.Match("name inset :names", collection,
+                                      parameters={"names": ["4"]}))
+    self.assertEqual([5], cache.Match("name inset :names", collection,
+                                      parameters={"names": ["5"]}))
+    self.assertEqual(4, cache.stats.entries)
+
+  def testParameters(self):
+    collection = resultcache.Collection([{"tags": ["b", "a"], "name": "a"}])
+    cache = resultcache.ResultCache()
+    # The order of a list compared as a whole matters.
+    self.assertEqual([], cache.Match("tags is :t", collection,
+                                     parameters={"t": ["a", "b"]}))
+    self.assertEqual([0], cache.Match("tags is :t", collection,
+                                      parameters={"t": ["b", "a"]}))
+    # The order of the operand of a set operator doesn't.
+    self.assertEqual([0], cache.Match("name inset :t", collection,
+                                      parameters={"t": ["a", "b"]}))
+    self.assertEqual([0], cache.Match("name inset :t", collection,
+                                      parameters={"t": ["b", "a"]}))
+    self.assertEqual((1, 3), (cache.stats.hits, cache.stats.misses))
+
+    # Values that can't be hashed are evaluated every time.
+    parameters = {"t": [{"x": ["a"]}]}
+    self.assertEqual([], cache.Match("name inset :t", collection,
+                                     parameters=parameters))
+    self.assertEqual([], cache.Match("name inset :t", collection,
+                                     parameters=parameters))
+    self.assertEqual((1, 5), (cache.stats.hits, cache.stats.misses))
+    self.assertEqual(3, cache.stats.entries)
+
+  def testEviction(self):
+    collection = resultcache.Collection({"size": size} for size in range(10))
+    cache = resultcache.ResultCache(max_entries=2)
+    cache.Match("size > 1", collection)
+    cache.Match("size > 2", collection)
+    cache.Match("size > 1", collection)
+    cache.Match("size > 3", collection)
+    self.assertEqual(1, cache.stats.evictions)
+    # "size > 2" was the least recently used.
+    cache.Match("size > 1", collection)
+    cache.Match("size > 2", collection)
+    self.assertEqual({"hits": 2, "misses": 4, "evictions": 2,
+                      "invalidations": 0, "entries": 2,
+                      "bytes": cache.stats.bytes, "hit_rate": 2.0 / 6},
+                     cache.stats.ToDict())
+
+    # Room for the ids of 3 objects.
+    cache = resultcache.ResultCache(max_bytes=3 * array.array("L").itemsize)
+    cache.Match("size > 2", collection)
+    self.assertEqual(0, cache.stats.entries)
+    cache.Match("size > 8", collection)
+    cache.Match("size > 7", collection)
+    self.assertEqual((2, 0), (cache.stats.entries, cache.stats.evictions))
+    cache.Match("size > 6", collection)
+    self.assertEqual((1, 2), (cache.stats.entries, cache.stats.evictions))
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,86 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for objectfilter.rulepack."""
+
+
+import os
+import tempfile
+import unittest
+
+from objectfilter import objectfilter
+from objectfilter import rulepack
+
+
+class RulePackTest(unittest.TestCase):
+  pack = """
+# Comment.
+evil: name is 'evil.exe'
+big: size > 100
+broken: name is
+also_evil: name == "evil.exe"
+bad_regexp: name regexp '('
+unknown: name frobs 1
+no_query
+iocs: md5 inset :iocs
+big: size > 1
+dlls: @dlls(name is 'a.dll')
+"""
+
+  def Load(self, workers):
+    fd, path = tempfile.mkstemp()
+    try:
+      with os.fdopen(fd, "w") as out:
+        out.write(self.pack)
+      return rulepack.LoadFile(path, objectfilter.DictFilterImplementation,
+                               workers=workers, parameters={"iocs": ["abc"]},
+                               chunk_size=1)
+    finally:
+      os.unlink(path)
+
+  def testLoad(self):
+    for workers in [1, 3]:
+      rules = self.Load(workers)
+      self.assertEqual(["evil", "big", "also_evil", "iocs", "dlls"],
+                       list(rules.rules))
+      self.assertEqual(["broken", "bad_regexp", "unknown", "no_query", "big"],
+                       list(rules.errors))
+      self.assertIn("ParseError", rules.errors["broken"])
+      self.assertEqual("Duplicate rule name.", rules.errors["big"])
+      self.assertIs(rules["evil"].filter, rules["also_evil"].filter)
+      self.assertEqual("size > 100", rules["big"].query)
+
+      stats = rules.stats
+      self.assertEqual((10, 7, 5, workers),
+                       (stats.rules, stats.unique, stats.errors,
+                        stats.workers))
+
+      self.assertEqual(["evil", "big", "also_evil", "iocs"], rules.Match(
+          {"name": "evil.exe", "size": 200, "md5": "abc"}))
+      self.assertEqual(["dlls"], rules.Match({"dlls": [{"name": "a.dll"}]}))
+      self.assertEqual(["evil", "also_evil"], rules.RulesReading("name"))
+      self.assertEqual(["dlls"], rules.RulesReading("dlls.name"))
+
+  def testQueriesCrashingTheParser(self):
+    for workers in [1, 2]:
+      rules = rulepack.LoadRules([("ok", "a is 1"), ("bad", "(")],
+                                 objectfilter.DictFilterImplementation,
+                                 workers=workers, chunk_size=1)
+      self.assertEqual(["ok"], list(rules.rules))
+      self.assertIn("ParseError", rules.errors["bad"])
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,140 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for objectfilter.schema."""
+
+
+import collections
+import unittest
+
+from objectfilter import objectfilter
+from objectfilter import schema
+
+
+Function = collections.namedtuple("Function", ["name", "ordinal"])
+
+
+class Dll(object):
+  __slots__ = ("name", "functions", "extra")
+
+  def __init__(self, name, functions, extra=None):
+    self.name = name
+    self.functions = functions
+    if extra is not None:
+      self.extra = extra
+
+
+class Process(object):
+  def __init__(self, pid, dlls, tags=None, parent=None):
+    self.pid = pid
+    self.dlls = dlls
+    self.tags = tags
+    self.parent = parent
+
+
+FUNCTION = schema.Record.FromNamedTuple(Function, {"name": str,
+                                                   "ordinal": int})
+DLL = schema.Record.FromSlots(Dll, {"name": str,
+                                    "functions": schema.ListOf(FUNCTION)})
+PROCESS = schema.Record({"pid": int,
+                         "dlls": schema.ListOf(DLL),
+                         "tags": schema.ListOf(str),
+                         "parent": schema.ANY})
+
+
+class SchemaTest(unittest.TestCase):
+
+  def setUp(self):
+    self.processes = [
+        Process(1, [Dll("a.dll", [Function("f", 1), Function("g", 2)]),
+                    Dll("b.dll", [], extra={"k": "v"})],
+                tags=["x", "y"]),
+        Process(2, [Dll("c.dll", [Function("g", 3)])],
+                parent=Process(1, [])),
+        Process(3, [None, Dll("a.dll", (f for f in [Function("h", 4)]))]),
+    ]
+
+  def Compile(self, query):
+    return schema.Compile(objectfilter.Parser(query).Parse(), PROCESS)
+
+  def testMatchesLikeExpanders(self):
+    queries = ["pid is 2",
+               "pid != 2",
+               "dlls.name is 'a.dll'",
+               "dlls.functions.name is 'g'",
+               "dlls.functions.ordinal > 2",
+               "dlls.functions.name isnot 'f'",
+               "tags contains 'x'",
+               "tags inset ['x', 'y', 'z']",
+               "parent.pid is 1",
+               "parent.dlls.name notcontains 'a'",
+               "@dlls(name is 'a.dll' and functions.ordinal is 2)",
+               "@dlls(@functions(name is 'g' and ordinal is 3))",
+               "@dlls.functions(ordinal < 2 or name is 'h')",
+               "dlls.functions.ordinal > 3 or pid is 1"]
+    # Generators are consumed by the first evaluation.
+    for query in queries[:-1]:
+      expected = objectfilter.Parser(query).Parse().Compile(
+          objectfilter.BaseFilterImplementation)
+      compiled = self.Compile(query)
+      for process in self.processes[:2]:
+        self.assertEqual(expected.Matches(process), compiled.Matches(process),
+                         query)
+
+    self.assertEqual([1, 3], [process.pid for process in self.processes
+                              if self.Compile(queries[-1]).Matches(process)])
+
+  def testIteratesDeclaredLists(self):
+    compiled = self.Compile("dlls.functions.name is 'h'")
+    self.assertEqual([False, False, True],
+                     [compiled.Matches(process)
+                      for process in self.processes])
+
+  def testInvalidPaths(self):
+    for query in ["size > 1",
+                  "dlls.size > 1",
+                  "pid.value is 1",
+                  "tags.name is 'x'",
+                  "dlls.functions.name.first is 'a'",
+                  "@pid(value is 1)",
+                  "@tags(value is 1)",
+                  "@dlls(pid is 1)"]:
+      self.assertRaises(schema.InvalidPathError, self.Compile, query)
+    # Nothing is known below ANY fields.
+    self.Compile("parent.anything.at.all is 1")
+    self.Compile("@parent(anything is 1)")
+
+  def testDictRecords(self):
+    record = schema.Record({"name": str,
+                            "owner": schema.Record({"uid": int},
+                                                   access=schema.ITEM),
+                            "files": schema.ListOf(schema.ANY)},
+                           access=schema.ITEM)
+    compiled = schema.Compile(objectfilter.Parser(
+        "owner.uid is 0 and files.size > 10").Parse(), record)
+    self.assertTrue(compiled.Matches(
+        {"name": "a", "owner": {"uid": 0}, "files": [{"size": 20}]}))
+    self.assertFalse(compiled.Matches(
+        {"name": "a", "owner": {"uid": 0}, "files": [{"size": 5}]}))
+    self.assertFalse(compiled.Matches({"name": "a"}))
+
+  def testSchemaErrors(self):
+    self.assertRaises(schema.SchemaError, schema.Record, {}, access="index")
+    self.assertRaises(schema.SchemaError, schema.Record.FromNamedTuple,
+                      Function, {"size": int})
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,113 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for objectfilter.serialization."""
+
+
+import json
+import marshal
+import os
+import shutil
+import tempfile
+import unittest
+
+from objectfilter import objectfilter
+from objectfilter import serialization
+
+
+class SerializationTest(unittest.TestCase):
+  queries = [
+      "",
+      "name is 'a' and (size > 10 or size < 2.5)",
+      "@imported_dlls(name inset ['a.dll', 'b.dll'] and "
+      "@functions(name regexp '^Reg'))",
+      "data contains '\\x00\\xff' and md5 inset :iocs",
+      "src incidr [cidr('10.0.0.0/8')] and time after date('2013-01-01')",
+      ]
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def testRoundTrip(self):
+    for query in self.queries:
+      expression = objectfilter.Parser(query).Parse()
+      data = serialization.ToData(expression)
+      for copy in [data, marshal.loads(marshal.dumps(data)),
+                   json.loads(json.dumps(data))]:
+        rebuilt = serialization.FromData(copy)
+        self.assertEqual(data, serialization.ToData(rebuilt))
+      rebuilt = serialization.FromData(marshal.loads(marshal.dumps(data)))
+      self.assertEqual(str(expression), str(rebuilt))
+
+    self.assertEqual(["expression", "data", "contains",
+                      [{"bytes": "00ff"}]],
+                     serialization.ToData(objectfilter.Parser(
+                         "data contains '\\x00\\xff'").Parse()))
+    compiled = serialization.FromData(serialization.ToData(
+        objectfilter.Parser(self.queries[1]).Parse())).Compile(
+            objectfilter.DictFilterImplementation)
+    self.assertTrue(compiled.Matches({"name": "a", "size": 11}))
+
+  def testInvalidData(self):
+    for data in [[], ["unknown"], ["binary", "and"],
+                 ["expression", "a", "is", [{"literal": "ip", "text": "x"}]],
+                 ["expression", "a", "is", [{"unknown": 1}]]]:
+      self.assertRaises(serialization.InvalidDataError,
+                        serialization.FromData, data)
+
+  def testFilterCache(self):
+    cache = serialization.FilterCache(self.directory)
+    query = self.queries[2]
+    first = cache.Parse(query)
+    self.assertEqual((0, 1), (cache.hits, cache.misses))
+    second = cache.Parse(query)
+    self.assertEqual((1, 1), (cache.hits, cache.misses))
+    self.assertEqual(str(first), str(second))
+    compiled = cache.Compile(query, objectfilter.DictFilterImplementation)
+    self.assertTrue(compiled.Matches(
+        {"imported_dlls": [{"name": "a.dll",
+                            "functions": [{"name": "RegOpenKey"}]}]}))
+
+    path = os.path.join(self.directory, cache.Key(query)[:2],
+                        cache.Key(query))
+    # Entries of another version are rebuilt.
+    with open(path, "wb") as fd:
+      fd.write(marshal.dumps(["0.0", 1, query, ["identity"]]))
+    self.assertEqual(str(first), str(cache.Parse(query)))
+    self.assertEqual(2, cache.misses)
+    # So are corrupt ones.
+    with open(path, "wb") as fd:
+      fd.write("garbage")
+    self.assertEqual(str(first), str(cache.Parse(query)))
+    self.assertEqual(3, cache.misses)
+    self.assertEqual(str(first), str(cache.Parse(query)))
+    self.assertEqual(3, cache.misses)
+
+    self.assertRaises(objectfilter.ParseError, cache.Parse, "name is")
+
+  def testParseAll(self):
+    cache = serialization.FilterCache(self.directory)
+    expressions = cache.ParseAll(self.queries)
+    self.assertEqual(len(self.queries), cache.misses)
+    again = cache.ParseAll(self.queries)
+    self.assertEqual(len(self.queries), cache.hits)
+    self.assertEqual([str(x) for x in expressions], [str(x) for x in again])
+
+
+if __name__ == "__main__":
+  unittest.main()
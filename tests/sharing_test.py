@@ -0,0 +1,87 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for objectfilter.sharing."""
+
+
+import unittest
+
+from objectfilter import objectfilter
+from objectfilter import sharing
+
+
+class SharedRuleSetTest(unittest.TestCase):
+  queries = [
+      ("a", "os is 'w' and size > 1"),
+      ("b", "OS is 'w' and size < 10"),
+      ("c", "@dlls(name is 'x')"),
+      ("d", "os is 'w' or @dlls(name is 'x')"),
+      ("e", "size > 1.0"),
+      ("f", "@dlls(name is 'x' and size > 1) or @dlls(name is 'x')"),
+  ]
+
+  objects = [
+      {"os": "w", "size": 5, "dlls": [{"name": "x", "size": 1}]},
+      {"os": "l", "size": 50, "dlls": [{"name": "y", "size": 3},
+                                       {"name": "x", "size": 2}]},
+      {"os": "w", "size": 1, "dlls": []},
+      {"size": 0.5},
+  ]
+
+  def Compile(self):
+    expressions = [(name, objectfilter.Parser(query).Parse())
+                   for name, query in self.queries]
+    return sharing.SharedRuleSet(expressions,
+                                 objectfilter.DictFilterImplementation)
+
+  def testStats(self):
+    rules = self.Compile()
+    # "size > 1.0" is the same node as "size > 1", but paths are case
+    # sensitive so "OS is 'w'" is distinct from "os is 'w'".
+    self.assertEqual({"nodes": 20, "unique": 12, "shared": 4},
+                     rules.stats.ToDict())
+
+  def testMatchesLikeSeparateFilters(self):
+    rules = self.Compile()
+    for obj in self.objects:
+      expected = [name for name, query in self.queries
+                  if objectfilter.Parser(query).Parse().Compile(
+                      objectfilter.DictFilterImplementation).Matches(obj)]
+      self.assertEqual(expected, rules.Match(obj))
+
+  def testEvaluatesSharedNodesOnce(self):
+    rules = self.Compile()
+    self.assertEqual(["a", "c", "d", "e", "f"],
+                     rules.Match(self.objects[0]))
+    # "size > 1" is evaluated by a and reused by e, "@dlls(name is 'x')" by c
+    # and reused by d and f, and "name is 'x'" for the only dll by c and
+    # reused by f. f also evaluates "size > 1" on the dll, a different object.
+    self.assertEqual(5, rules.memo.evaluations)
+    self.assertEqual(4, rules.memo.hits)
+    self.assertEqual({}, rules.memo.results)
+
+  def testParameters(self):
+    expressions = [("a", objectfilter.Parser("name inset :names").Parse()),
+                   ("b", objectfilter.Parser("name inset :names").Parse())]
+    rules = sharing.SharedRuleSet(expressions,
+                                  objectfilter.DictFilterImplementation,
+                                  parameters={"names": ["x"]})
+    self.assertEqual(1, rules.stats.shared)
+    self.assertEqual(["a", "b"], rules.Match({"name": "x"}))
+    self.assertEqual([], rules.Match({"name": "y"}))
+
+
+if __name__ == "__main__":
+  unittest.main()
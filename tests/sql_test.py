@@ -0,0 +1,137 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for objectfilter.sql."""
+
+
+import sqlite3
+import unittest
+
+from objectfilter import objectfilter
+from objectfilter import sql
+
+
+class SQLTest(unittest.TestCase):
+  def setUp(self):
+    self.connection = sqlite3.connect(":memory:")
+    self.connection.executescript("""
+CREATE TABLE processes (id INTEGER PRIMARY KEY, name TEXT, size INTEGER,
+                        md5 TEXT);
+CREATE TABLE dlls (id INTEGER PRIMARY KEY, pid INTEGER, name TEXT,
+                   num_imported_functions INTEGER);
+INSERT INTO processes VALUES (1, 'yay.exe', 10, 'abc');
+INSERT INTO processes VALUES (2, 'nay.exe', 20, NULL);
+INSERT INTO processes VALUES (3, 'svchost.exe', 30, 'def');
+INSERT INTO dlls VALUES (1, 1, 'a.dll', 2);
+INSERT INTO dlls VALUES (2, 1, 'b.dll', 1);
+INSERT INTO dlls VALUES (3, 2, 'a.dll', 1);
+""")
+    self.mapping = sql.TableMapping(
+        "processes", columns={"hash.md5": "md5"},
+        contexts={"imported_dlls": sql.TableMapping("dlls",
+                                                    foreign_key="pid")})
+
+  def Query(self, query):
+    expression = objectfilter.Parser(query).Parse()
+    return sorted(row["id"] for row in
+                  sql.Execute(self.connection, expression, self.mapping))
+
+  def testOperators(self):
+    self.assertEqual([1], self.Query("name is 'yay.exe'"))
+    self.assertEqual([2, 3], self.Query("name != 'yay.exe'"))
+    self.assertEqual([2, 3], self.Query("size > 10"))
+    self.assertEqual([1, 2], self.Query("size <= 20"))
+    self.assertEqual([1, 2], self.Query("name contains 'ay'"))
+    self.assertEqual([3], self.Query("name notcontains 'ay'"))
+    self.assertEqual([1, 3], self.Query("size inset [10, 30]"))
+    self.assertEqual([2], self.Query("size notinset [10, 30]"))
+    self.assertEqual([], self.Query("size inset []"))
+    self.assertEqual([3], self.Query("name regexp '^s.*t'"))
+    self.assertEqual([1], self.Query("hash.md5 is 'abc'"))
+    self.assertEqual([2, 3], self.Query(
+        "(name is 'nay.exe' or size > 25) and size > 0"))
+
+  def testContext(self):
+    query = "@imported_dlls(name is 'a.dll' and num_imported_functions == 1)"
+    translation = sql.Translate(objectfilter.Parser(query).Parse(),
+                                self.mapping)
+    self.assertTrue(translation.where.startswith("EXISTS"))
+    self.assertEqual(None, translation.residual)
+    self.assertEqual([2], self.Query(query))
+
+  def testResidual(self):
+    # Unmapped dotted paths and list comparisons stay in Python.
+    query = "size > 15 and name is ['yay.exe'] and other.path is 1"
+    translation = sql.Translate(objectfilter.Parser(query).Parse(),
+                                self.mapping)
+    self.assertEqual("+t0.\"size\" > ?", translation.where)
+    self.assertEqual([15], translation.params)
+    self.assertNotEqual(None, translation.residual)
+
+    self.assertEqual([1], self.Query("hash.md5 is 'abc' and name is 'yay.exe'"
+                                     " and (size is 10 or other.path is 1)"))
+    self.assertEqual([], self.Query("size > 15 and name is ['nay.exe']"))
+
+  def testResidualContext(self):
+    # inset with a string operand tests for a substring, which stays in
+    # Python together with the whole context.
+    query = "size < 15 and @imported_dlls(name inset 'b.dll or c.dll')"
+    translation = sql.Translate(objectfilter.Parser(query).Parse(),
+                                self.mapping)
+    self.assertEqual("+t0.\"size\" < ?", translation.where)
+    self.assertEqual([1], self.Query(query))
+
+    # Child rows of unmapped contexts can't be loaded.
+    self.assertRaises(sql.UntranslatableError, self.Query,
+                      "@unmapped(name is 'a.dll')")
+    self.assertRaises(sql.UntranslatableError, self.Query,
+                      "@imported_dlls(@functions(name inset 'f or g'))")
+
+  def testParameters(self):
+    expression = objectfilter.Parser("size inset :sizes").Parse()
+    rows = sql.Execute(self.connection, expression, self.mapping,
+                       parameters={"sizes": [10, 20]})
+    self.assertEqual([1, 2], sorted(row["id"] for row in rows))
+
+  def testMatchesLikeFilterOnTypedColumns(self):
+    # Column affinity must not convert literals of another type.
+    self.connection.executescript("""
+CREATE TABLE typed (id INTEGER PRIMARY KEY, x INTEGER, t TEXT, r REAL);
+INSERT INTO typed VALUES (1, 1, '1', 1.0);
+INSERT INTO typed VALUES (2, 11, 'a', 1.5);
+INSERT INTO typed VALUES (3, 0, '10', 2.0);
+INSERT INTO typed VALUES (4, NULL, NULL, NULL);
+INSERT INTO typed VALUES (5, 'b', '2', 'c');
+""")
+    mapping = sql.TableMapping("typed")
+    cursor = self.connection.execute("SELECT * FROM typed")
+    names = [description[0] for description in cursor.description]
+    objects = [dict((name, value) for name, value in zip(names, row)
+                    if value is not None) for row in cursor]
+    queries = []
+    for path in ["x", "t", "r"]:
+      for operator in ["is", "!=", ">", ">=", "<", "<="]:
+        for literal in ["1", "'1'", "1.5", "'a'", "'10'"]:
+          queries.append("%s %s %s" % (path, operator, literal))
+      queries.append("%s inset [1, '2', 'a']" % path)
+      queries.append("%s notinset [1, '2', 'a']" % path)
+    for query in queries:
+      expression = objectfilter.Parser(query).Parse()
+      self.assertEqual(None, sql.Translate(expression, mapping).residual)
+      compiled = expression.Compile(objectfilter.DictFilterImplementation)
+      expected = [obj["id"] for obj in objects if compiled.Matches(obj)]
+      self.assertEqual(expected, sorted(
+          row["id"] for row in sql.Execute(self.connection, expression,
+                                           mapping)), query)
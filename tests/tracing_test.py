@@ -0,0 +1,68 @@
+#!/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for objectfilter.tracing."""
+
+
+import unittest
+
+from objectfilter import objectfilter
+from objectfilter import tracing
+
+
+class TracingTest(unittest.TestCase):
+  def setUp(self):
+    self.events = []
+    tracing.SetTracer(self.Record)
+
+  def tearDown(self):
+    tracing.SetTracer(None)
+
+  def Record(self, event, **fields):
+    self.events.append((event, fields))
+
+  def EventNames(self):
+    return [event for event, _ in self.events]
+
+  def testParseTokens(self):
+    objectfilter.Parser("a is 1").Parse()
+    tokens = [(fields["state"], fields["string"])
+              for event, fields in self.events if event == tracing.PARSE_TOKEN]
+    self.assertIn(("ATTRIBUTE", "a"), tokens)
+    self.assertIn(("OPERATOR", "is"), tokens)
+    self.assertIn(("ARG", "1"), tokens)
+
+  def testEvaluationEvents(self):
+    compiled = objectfilter.Parser("a is 1 or a is 2").Parse().Compile(
+        objectfilter.DictFilterImplementation)
+    self.events = []
+    self.assertTrue(compiled.Matches({"a": 1}))
+    self.assertEqual([tracing.NODE_ENTERED,
+                      tracing.NODE_ENTERED,
+                      tracing.VALUE_COMPARED,
+                      tracing.SHORT_CIRCUIT,
+                      tracing.SHORT_CIRCUIT],
+                     self.EventNames())
+    compared = self.events[2][1]
+    self.assertEqual(1, compared["value"])
+    self.assertEqual(1, compared["operand"])
+    self.assertTrue(compared["result"])
+
+  def testNoTracer(self):
+    tracing.SetTracer(None)
+    compiled = objectfilter.Parser("@a(b is 1)").Parse().Compile(
+        objectfilter.DictFilterImplementation)
+    self.assertTrue(compiled.Matches({"a": [{"b": 1}]}))
+    self.assertEqual([], self.events)